@@ -0,0 +1,91 @@
+"""
+Speed and accuracy of the release asset matcher over the corpus of real release
+asset names in tests/fixtures/release_assets.json, compared with the substring
+scoring it replaced.
+
+    uv run python benchmarks/asset_matcher.py --rounds 200
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from pysetmeup.helpers.assets import get_matcher
+
+CORPUS = Path(__file__).parent.parent / "tests" / "fixtures" / "release_assets.json"
+
+LEGACY_OS = {
+    "Linux": ["linux", "ubuntu", "debian"],
+    "Darwin": ["darwin", "mac", "macos"],
+    "Windows": ["windows", "win"],
+}
+LEGACY_ARCH = {
+    "x86_64": ["x86_64", "x64", "amd64"],
+    "aarch64": ["arm64", "aarch64", "arm"],
+    "i386": ["386", "i386", "x86"],
+}
+
+
+def legacy_score(name: str, profile: dict) -> int:
+    """score_asset before the matcher, with substring checks"""
+    name = name.lower()
+    score = 0
+    if any(pattern in name for pattern in LEGACY_OS.get(profile["os"], [])):
+        score += 100
+    if any(pattern in name for pattern in LEGACY_ARCH.get(profile["arch"], [])):
+        score += 50
+    elif profile["is_64bit"] and "64" in name:
+        score += 30
+    if profile["os"] == "Windows" and name.endswith(".zip"):
+        score += 10
+    elif profile["os"] in ["Linux", "Darwin"] and name.endswith(".tar.gz"):
+        score += 10
+    return score
+
+
+def legacy_rank(names: list[str], profile: dict) -> list[str]:
+    return sorted(names, key=lambda name: legacy_score(name, profile), reverse=True)
+
+
+def matcher_rank(names: list[str], profile: dict) -> list[str]:
+    ranked = get_matcher(profile).rank({"name": name} for name in names)
+    return [asset["name"] for asset, _ in ranked]
+
+
+def measure(rank, corpus: dict, rounds: int) -> tuple[float, int, int]:
+    cases = [
+        (data["assets"], corpus["profiles"][profile], expected)
+        for data in corpus["releases"].values()
+        for profile, expected in data["expected"].items()
+    ]
+    right = 0
+    for names, profile, expected in cases:
+        ranked = rank(names, profile)
+        top = ranked[0] if ranked else None
+        right += top in expected if expected else top is None
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for names, profile, _ in cases:
+            rank(names, profile)
+    per_case = (time.perf_counter() - started) / (rounds * len(cases))
+    return per_case, right, len(cases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS.read_text())
+    for label, rank in [("substring", legacy_rank), ("matcher", matcher_rank)]:
+        per_case, right, total = measure(rank, corpus, args.rounds)
+        print(
+            f"{label:10} {per_case * 1e6:8.1f} us/release  "
+            f"accuracy {right}/{total} ({right / total:.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
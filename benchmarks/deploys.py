@@ -0,0 +1,262 @@
+"""
+End to end cost of each deploy: the parts, user.deploy and the setups, run with the
+pyinfra CLI against a host in cold and warm state.
+
+    uv run python benchmarks/deploys.py --image rockylinux:9 --save deploys.json
+    uv run python benchmarks/deploys.py --image rockylinux:9 --baseline deploys.json
+    uv run python benchmarks/deploys.py --inventory @lima/dev --deploy fish --deploy git
+
+With --image every deploy gets a new container: the cold run is the first deploy in
+it and the warm run deploys again. Otherwise the cold run ignores the deploy ledger
+(``--data force=true``) of the inventory hosts.
+
+Each run is a new process that records:
+
+- wall_seconds: from the start of pyinfra to its exit
+- remote_commands: commands run in the hosts, facts included
+- fact_calls and duplicate_fact_calls: facts requested, and how many of them had
+  already been requested with the same arguments
+- bytes_transferred: uploaded and downloaded files, and commands output
+- peak_memory_mb: maximum resident memory of the controller
+
+With --baseline it exits with an error when a metric regressed more than its
+tolerance (relative, plus an absolute slack for noisy metrics).
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# metric: (relative tolerance, absolute slack)
+TOLERANCES = {
+    "wall_seconds": (0.25, 0.5),
+    "remote_commands": (0.0, 0),
+    "fact_calls": (0.0, 0),
+    "duplicate_fact_calls": (0.0, 0),
+    "bytes_transferred": (0.10, 4096),
+    "peak_memory_mb": (0.20, 10),
+}
+
+
+def default_deploys() -> list[str]:
+    """The parts, user.deploy and the setups of the registry"""
+    from pysetmeup import registry
+
+    return [
+        name
+        for name, entry in registry.parts().items()
+        if entry.module.startswith(("pysetmeup.parts.", "pysetmeup.setups."))
+        or entry.module == "pysetmeup.user"
+    ]
+
+
+def file_size(file) -> int:
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file) if os.path.exists(file) else 0
+    if isinstance(file, io.IOBase) and file.seekable():
+        position = file.tell()
+        size = file.seek(0, io.SEEK_END)
+        file.seek(position)
+        return size
+    return 0
+
+
+def measure(argv: list[str], output: Path) -> None:
+    """Runs the pyinfra CLI with `argv` in this process and writes its metrics"""
+    from pyinfra.api import host as host_module
+    from pyinfra.api.host import Host
+    from pyinfra_cli.main import main
+
+    metrics = dict.fromkeys(TOLERANCES, 0)
+    requested = set()
+
+    run_shell_command, put_file, get_file = (
+        Host.run_shell_command,
+        Host.put_file,
+        Host.get_file,
+    )
+    get_fact = host_module.get_fact
+
+    def counted_run_shell_command(self, *args, **kwargs):
+        metrics["remote_commands"] += 1
+        status, command_output = run_shell_command(self, *args, **kwargs)
+        metrics["bytes_transferred"] += sum(
+            len(line.encode()) + 1 for line in command_output.output_lines
+        )
+        return status, command_output
+
+    def counted_put_file(self, filename_or_io, *args, **kwargs):
+        metrics["bytes_transferred"] += file_size(filename_or_io)
+        return put_file(self, filename_or_io, *args, **kwargs)
+
+    def counted_get_file(self, remote_filename, filename_or_io, *args, **kwargs):
+        result = get_file(self, remote_filename, filename_or_io, *args, **kwargs)
+        metrics["bytes_transferred"] += file_size(filename_or_io)
+        return result
+
+    def counted_get_fact(state, host, cls, args=None, kwargs=None, **rest):
+        key = (
+            host.name,
+            cls.__name__,
+            repr(args),
+            repr(sorted((kwargs or {}).items())),
+        )
+        metrics["fact_calls"] += 1
+        metrics["duplicate_fact_calls"] += key in requested
+        requested.add(key)
+        return get_fact(state, host, cls, args=args, kwargs=kwargs, **rest)
+
+    Host.run_shell_command = counted_run_shell_command
+    Host.put_file = counted_put_file
+    Host.get_file = counted_get_file
+    host_module.get_fact = counted_get_fact
+
+    sys.argv = ["pyinfra", *argv]
+    started = time.perf_counter()
+    exit_code = 0
+    try:
+        main()
+    except SystemExit as error:
+        exit_code = error.code if isinstance(error.code, int) else 1
+    finally:
+        metrics["wall_seconds"] = round(time.perf_counter() - started, 3)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes in Linux, bytes in macOS
+        metrics["peak_memory_mb"] = round(
+            peak / 1024**2 if platform.system() == "Darwin" else peak / 1024, 1
+        )
+        metrics["exit_code"] = exit_code
+        output.write_text(json.dumps(metrics))
+
+
+def run(inventory: str, deploy: str, force: bool = False) -> dict:
+    """Metrics of a deploy in a new process"""
+    from pysetmeup import registry
+
+    parts = registry.parts()
+    reference = parts[deploy].value.replace(":", ".") if deploy in parts else deploy
+    with tempfile.TemporaryDirectory() as directory:
+        output = Path(directory) / "metrics.json"
+        argv = [inventory, reference, "-y"] + (
+            ["--data", "force=true"] if force else []
+        )
+        process = subprocess.run(
+            [sys.executable, __file__, "measure", str(output), *argv],
+            capture_output=True,
+            text=True,
+        )
+        if not output.exists():
+            raise RuntimeError(f"Couldn't measure {deploy}:\n{process.stderr[-2000:]}")
+        return json.loads(output.read_text())
+
+
+def start_container(image: str) -> str:
+    return subprocess.run(
+        ["docker", "run", "-d", "--rm", image, "sleep", "infinity"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def benchmark(deploys: list[str], inventory: str, image: str | None) -> dict:
+    results = {}
+    for deploy in deploys:
+        container = start_container(image) if image else None
+        target = f"@docker/{container}" if container else inventory
+        try:
+            results[deploy] = {
+                "cold": run(target, deploy, force=not container),
+                "warm": run(target, deploy),
+            }
+        finally:
+            if container:
+                subprocess.run(["docker", "rm", "-f", container], capture_output=True)
+        for state, metrics in results[deploy].items():
+            print(
+                f"{deploy:20} {state:5} {metrics['wall_seconds']:8.2f}s "
+                f"{metrics['remote_commands']:5} commands "
+                f"{metrics['fact_calls']:5} facts ({metrics['duplicate_fact_calls']} again) "
+                f"{metrics['bytes_transferred'] / 1024:9.1f} KiB "
+                f"{metrics['peak_memory_mb']:7.1f} MB"
+                + (f" exit {metrics['exit_code']}" if metrics["exit_code"] else "")
+            )
+    return results
+
+
+def regressions(baseline: dict, results: dict, tolerances: dict) -> list[str]:
+    """Metrics that got worse than their tolerance allows"""
+    found = []
+    for deploy, states in results.items():
+        for state, metrics in states.items():
+            before = baseline.get("deploys", {}).get(deploy, {}).get(state)
+            if not before:
+                continue
+            for metric, (relative, slack) in tolerances.items():
+                if metric not in before:
+                    continue
+                if metrics[metric] > before[metric] * (1 + relative) + slack:
+                    found.append(
+                        f"{deploy} ({state}) {metric}: {before[metric]} -> {metrics[metric]}"
+                    )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--inventory", default="@local")
+    parser.add_argument("--image", help="Deploys in a new container of this image")
+    parser.add_argument(
+        "--deploy", action="append", help="Part of the registry (default: all of them)"
+    )
+    parser.add_argument("--save", type=Path, help="Writes the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results to compare with")
+    parser.add_argument(
+        "--tolerance",
+        action="append",
+        default=[],
+        metavar="METRIC=RELATIVE",
+        help="e.g. wall_seconds=0.5, can be repeated",
+    )
+    args = parser.parse_args()
+
+    tolerances = dict(TOLERANCES)
+    for override in args.tolerance:
+        metric, _, value = override.partition("=")
+        tolerances[metric] = (float(value), tolerances.get(metric, (0, 0))[1])
+
+    results = benchmark(args.deploy or default_deploys(), args.inventory, args.image)
+    if args.save:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "inventory": args.inventory,
+                    "image": args.image,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "deploys": results,
+                },
+                indent=2,
+            )
+        )
+    if args.baseline:
+        found = regressions(json.loads(args.baseline.read_text()), results, tolerances)
+        for regression in found:
+            print(f"Regression: {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["measure"]:
+        # measure <output> <pyinfra arguments...>, run by `run`
+        measure(sys.argv[3:], Path(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,103 @@
+"""
+Controller startup latency: how long it takes to import what each way of starting a
+deploy needs, measured with ``python -X importtime`` in a new interpreter.
+
+    uv run python benchmarks/importtime.py --rounds 5
+    uv run python benchmarks/importtime.py --save importtime.json
+    uv run python benchmarks/importtime.py --baseline importtime.json --tolerance 0.2
+
+With --baseline it exits with an error when a scenario got slower than the
+tolerance allows.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SCENARIOS = {
+    "list parts": "from pysetmeup import registry; registry.names()",
+    "load one part": "from pysetmeup import registry; registry.load('git')",
+    "user deploy": "import pysetmeup.user",
+    "pyinfra": "import pyinfra.api",
+}
+
+
+def importtime(statement: str) -> dict[str, int]:
+    """Cumulative microseconds of each module imported by `statement`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nested imports keep their indentation
+        modules[name[1:].rstrip()] = int(cumulative)
+    return modules
+
+
+def total(modules: dict[str, int]) -> int:
+    """Microseconds of the top level imports, nested ones are in their cumulative"""
+    return sum(us for name, us in modules.items() if not name.startswith(" "))
+
+
+def measure(statement: str, rounds: int) -> tuple[float, dict[str, int]]:
+    """Median milliseconds of `rounds` runs, and the modules of the last one"""
+    times = []
+    for _ in range(rounds):
+        modules = importtime(statement)
+        times.append(total(modules) / 1000)
+    return statistics.median(times), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules to show")
+    parser.add_argument("--save", type=Path, help="Writes the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {}
+    for scenario, statement in SCENARIOS.items():
+        milliseconds, modules = measure(statement, args.rounds)
+        results[scenario] = milliseconds
+        slowest = sorted(
+            (
+                (name.strip(), us)
+                for name, us in modules.items()
+                if not name.startswith(" ")
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )[: args.top]
+        print(f"{scenario:15} {milliseconds:8.1f} ms")
+        for name, us in slowest:
+            print(f"    {name:40} {us / 1000:8.1f} ms")
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        slower = {
+            scenario: (baseline[scenario], milliseconds)
+            for scenario, milliseconds in results.items()
+            if scenario in baseline
+            and milliseconds > baseline[scenario] * (1 + args.tolerance)
+        }
+        for scenario, (before, after) in slower.items():
+            print(f"{scenario} got slower: {before:.1f} ms -> {after:.1f} ms")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
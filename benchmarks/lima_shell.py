@@ -0,0 +1,59 @@
+"""
+Compares the per command overhead of `LimaConnector.run_shell_command` with a new
+`lima` process per command (what the connector does without a shell session)
+against the long lived shell session it opens when it connects.
+
+    uv run python benchmarks/lima_shell.py dev-deploy-test --count 50
+"""
+
+import argparse
+import time
+
+from pyinfra.api import Config, Inventory, State
+from pyinfra.api.command import StringCommand
+
+from pysetmeup.connectors.lima import LimaConnector
+
+
+def make_connector(instance: str) -> LimaConnector:
+    name = f"@lima/{instance}"
+    inventory = Inventory(([name], {}))
+    state = State(inventory, Config())
+    return LimaConnector(state, inventory.get_host(name))
+
+
+def per_command(connector: LimaConnector, count: int) -> float:
+    """Seconds per command, including the wrapping and parsing of the connector"""
+    command = StringCommand("true")
+    start = time.perf_counter()
+    for _ in range(count):
+        status, _, stderr = connector.run_shell_command(command)
+        if status != 0:
+            raise RuntimeError(f"`true` failed in the VM: {stderr}")
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("instance", help="Name of a lima VM, it's started if needed")
+    parser.add_argument("--count", type=int, default=50)
+    args = parser.parse_args()
+
+    with_session = make_connector(args.instance)
+    with_session.connect()
+    if not with_session.session.alive:
+        raise SystemExit(f"Couldn't open a shell session in {args.instance}")
+    try:
+        # Never connected, so every command runs in a new process
+        per_process = per_command(make_connector(args.instance), args.count)
+        per_session = per_command(with_session, args.count)
+    finally:
+        with_session.disconnect()
+
+    print(f"new process per command: {per_process * 1000:8.2f} ms/command")
+    print(f"shell session:           {per_session * 1000:8.2f} ms/command")
+    print(f"speedup:                 {per_process / per_session:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,15 @@
+import ast
+import fcntl
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from collections.abc import Callable
 import pytest
@@ -6,8 +18,38 @@ import shlex
 import docker
 from loguru import logger
 
+# Python of the deploys run inside the containers
+PYTHON_VERSION = "3.11"
 
-@pytest.fixture
+# Base image of the container pool: the distro with pyinfra and pysetmeup installed
+# from a wheelhouse, so the tests don't download them in every container
+BASE_DOCKERFILE = """\
+FROM {image}
+RUN if command -v apk; then apk add --no-cache bash ca-certificates curl sudo; \\
+    elif command -v dnf; then dnf install -y --allowerasing ca-certificates curl sudo \\
+        && dnf clean all; \\
+    else apt-get update && apt-get install -y --no-install-recommends ca-certificates \\
+        curl sudo && rm -rf /var/lib/apt/lists/*; fi
+COPY --from=ghcr.io/astral-sh/uv:latest /uv /usr/local/bin/uv
+RUN uv python install {python} && uv venv --python {python} /opt/pysetmeup
+ENV PATH=/opt/pysetmeup/bin:$PATH
+COPY wheelhouse /wheelhouse
+RUN uv pip install --python /opt/pysetmeup --no-index --find-links /wheelhouse pysetmeup
+"""
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock shared by the xdist workers"""
+    with path.open("w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@pytest.fixture(scope="session")
 # @functools.lru_cache()
 def top_level() -> Path:
     """Returns the top of the repo"""
@@ -23,7 +65,6 @@ def top_level() -> Path:
 @pytest.fixture()
 def start_container(request) -> Callable[[str], str]:
     def _start_container(image):
-        image = "alpine"
         proc = subprocess.run(
             shlex.split(f"docker run --rm -d {image} -- sh -c 'sleep infinity'"),
             capture_output=True,
@@ -33,12 +74,347 @@ def start_container(request) -> Callable[[str], str]:
     return _start_container
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def docker_env() -> docker.DockerClient:
     """Entry point for docker daemon environment"""
     return docker.from_env()
 
 
+@pytest.fixture(scope="session")
+def shared_dir(tmp_path_factory, worker_id) -> Path:
+    """Temporary directory shared by every xdist worker of the session"""
+    base = tmp_path_factory.getbasetemp()
+    return base if worker_id == "master" else base.parent
+
+
+@pytest.fixture(scope="session")
+def wheelhouse(shared_dir) -> Path:
+    """Wheels of pysetmeup and its dependencies for the containers, built once"""
+    from pysetmeup.bundle import Platform, build_wheelhouse
+
+    path = shared_dir / "wheelhouse"
+    with file_lock(shared_dir / "wheelhouse.lock"):
+        if not (path / "done").exists():
+            shutil.rmtree(path, ignore_errors=True)
+            arch = platform.machine().replace("arm64", "aarch64")
+            build_wheelhouse(path, [Platform("el", "9", arch)], PYTHON_VERSION)
+            (path / "done").touch()
+    return path
+
+
+def build_base_image(client: docker.DockerClient, image: str, wheelhouse: Path) -> str:
+    """Tag of the base image of `image`, built only if the wheels or image changed"""
+    dockerfile = BASE_DOCKERFILE.format(image=image, python=PYTHON_VERSION)
+    digest = hashlib.sha256(dockerfile.encode())
+    for wheel in sorted(wheelhouse.glob("*.whl")):
+        digest.update(wheel.name.encode())
+        digest.update(hashlib.sha256(wheel.read_bytes()).digest())
+    name = image.rsplit("/", 1)[-1].replace(":", "-")
+    tag = f"pysetmeup-test/{name}:{digest.hexdigest()[:12]}"
+    try:
+        client.images.get(tag)
+        return tag
+    except docker.errors.ImageNotFound:
+        pass
+
+    context = wheelhouse.parent / f"context-{name}"
+    shutil.rmtree(context, ignore_errors=True)
+    shutil.copytree(
+        wheelhouse, context / "wheelhouse", ignore=shutil.ignore_patterns("done")
+    )
+    (context / "Dockerfile").write_text(dockerfile)
+    logger.info(f"Building {tag}")
+    client.images.build(path=str(context), tag=tag, rm=True)
+    return tag
+
+
+@pytest.fixture(scope="session")
+def base_images(docker_env, wheelhouse, shared_dir) -> Callable[[str], str]:
+    """Base image of each distro image, built once for all the workers"""
+    built: dict[str, str] = {}
+
+    def _base_image(image: str) -> str:
+        if image not in built:
+            name = image.replace("/", "_").replace(":", "_")
+            with file_lock(shared_dir / f"image-{name}.lock"):
+                built[image] = build_base_image(docker_env, image, wheelhouse)
+        return built[image]
+
+    return _base_image
+
+
+class ContainerPool:
+    """
+    Fresh containers of the base images. The next container of an image is started
+    in the background as soon as one is taken, so tests don't wait for it.
+    """
+
+    def __init__(self, client: docker.DockerClient, base_image: Callable[[str], str]):
+        self.client = client
+        self.base_image = base_image
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.spares: dict[str, Future] = {}
+
+    def start(self, tag: str):
+        """A container of any image, e.g. a snapshot, without a spare"""
+        return self.client.containers.run(
+            tag, ["sleep", "infinity"], detach=True, remove=True
+        )
+
+    def _start(self, image: str):
+        return self.start(self.base_image(image))
+
+    def acquire(self, image: str):
+        spare = self.spares.pop(image, None) or self.executor.submit(self._start, image)
+        container = spare.result()
+        self.spares[image] = self.executor.submit(self._start, image)
+        return container
+
+    def release(self, container) -> None:
+        container.remove(force=True)
+
+    def close(self) -> None:
+        for spare in self.spares.values():
+            try:
+                self.release(spare.result())
+            except docker.errors.APIError:
+                pass
+        self.executor.shutdown()
+
+
+@pytest.fixture(scope="session")
+def container_pool(request) -> ContainerPool:
+    """Containers with pysetmeup installed, one fresh container per test"""
+    try:
+        client = request.getfixturevalue("docker_env")
+        client.ping()
+    except docker.errors.DockerException as error:
+        pytest.skip(f"docker is not available: {error}")
+    pool = ContainerPool(client, request.getfixturevalue("base_images"))
+    yield pool
+    pool.close()
+
+
+SNAPSHOT_REPOSITORY = "pysetmeup-snapshot"
+
+
+def source_closure(module: str) -> list[Path]:
+    """Source files of `module` and of every pysetmeup module it imports"""
+    seen: dict[str, Path] = {}
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        try:
+            spec = importlib.util.find_spec(name)
+        except ModuleNotFoundError:
+            # A name imported from a module, not a submodule
+            continue
+        if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+            continue
+        seen[name] = Path(spec.origin)
+        for node in ast.walk(ast.parse(seen[name].read_bytes())):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                # `from pysetmeup.parts import fish` imports a module too
+                imported = [node.module]
+                imported += [f"{node.module}.{alias.name}" for alias in node.names]
+            else:
+                continue
+            pending.extend(name for name in imported if name.startswith("pysetmeup."))
+    return sorted(seen.values())
+
+
+def part_digest(part: str) -> str:
+    """Hash of the source of a part and everything it uses from pysetmeup"""
+    from pysetmeup import registry
+
+    digest = hashlib.sha256()
+    for path in source_closure(registry.parts()[part].module):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+@dataclass
+class SnapshotRun:
+    container: object
+    # Parts restored from cached layers, and the ones that were deployed
+    resumed: list[str] = field(default_factory=list)
+    deployed: list[str] = field(default_factory=list)
+
+
+class Snapshots:
+    """
+    Layered cache of provisioned containers. A chain of parts is deployed one part at
+    the time and the container is committed after each of them, tagged by a hash of
+    the previous layer, the part's source and its inputs. Later runs start from the
+    deepest layer that is still valid, so iterating on the last part of a chain only
+    deploys that part.
+
+    Layers not used in `max_age` seconds are pruned, then the least recently used
+    until they add up to less than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        pool: ContainerPool,
+        max_age: float = 14 * 24 * 3600,
+        max_bytes: int = 20 * 1024**3,
+        index: Path | None = None,
+    ):
+        from pysetmeup.helpers.cache import cache_home
+
+        self.pool = pool
+        self.client = pool.client
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        # Last use of each layer, docker only knows when they were created
+        self.index = index or cache_home() / "snapshots.json"
+
+    def layer_keys(self, base: str, parts: list[str], inputs: dict) -> list[str]:
+        keys, key = [], base
+        for part in parts:
+            payload = json.dumps([key, part, part_digest(part), inputs], sort_keys=True)
+            key = hashlib.sha256(payload.encode()).hexdigest()
+            keys.append(key)
+        return keys
+
+    def tag(self, key: str) -> str:
+        return f"{SNAPSHOT_REPOSITORY}:{key[:16]}"
+
+    def exists(self, tag: str) -> bool:
+        try:
+            self.client.images.get(tag)
+        except docker.errors.ImageNotFound:
+            return False
+        return True
+
+    def load_index(self) -> dict[str, float]:
+        try:
+            return json.loads(self.index.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def touch(self, tag: str) -> None:
+        from pysetmeup.helpers.cache import write_atomic
+
+        used = self.load_index()
+        used[tag] = time.time()
+        write_atomic(self.index, json.dumps(used, indent=1).encode())
+
+    def deploy(
+        self, image: str, parts: list[str], inputs: dict | None = None
+    ) -> SnapshotRun:
+        """
+        A container of `image` with `parts` deployed in order with `inputs` as
+        pyinfra --data, resumed from the deepest cached layer. The caller releases
+        it with the pool.
+        """
+        inputs = inputs or {}
+        base = self.pool.base_image(image)
+        keys = self.layer_keys(base, parts, inputs)
+        # Number of parts already in a cached layer
+        depth = len(keys)
+        while depth and not self.exists(self.tag(keys[depth - 1])):
+            depth -= 1
+        start = self.tag(keys[depth - 1]) if depth else base
+        if depth:
+            self.touch(start)
+        run = SnapshotRun(self.pool.start(start), resumed=parts[:depth])
+
+        from pysetmeup import registry
+
+        data = [f"--data={key}={value}" for key, value in inputs.items()]
+        for part, key in zip(parts[depth:], keys[depth:]):
+            reference = registry.parts()[part].value.replace(":", ".")
+            result = run.container.exec_run(
+                ["pyinfra", "@local", reference, "-y", *data]
+            )
+            if result.exit_code:
+                self.pool.release(run.container)
+                output = result.output.decode(errors="replace")
+                raise AssertionError(f"{part} failed in {start}:\n{output[-4000:]}")
+            repository, tag = self.tag(key).split(":")
+            run.container.commit(
+                repository=repository,
+                tag=tag,
+                changes=[f"LABEL pysetmeup.snapshot.part={part}"],
+            )
+            self.touch(self.tag(key))
+            run.deployed.append(part)
+        return run
+
+    def prune(self) -> list[str]:
+        """Removes old layers, then the least recently used over `max_bytes`"""
+        used = self.load_index()
+        layers = []
+        for image in self.client.df()["Images"]:
+            tags = [
+                tag
+                for tag in image.get("RepoTags") or []
+                if tag.startswith(f"{SNAPSHOT_REPOSITORY}:")
+            ]
+            if tags:
+                # Only what the layer adds on top of the images it shares layers with
+                size = image["Size"] - max(image.get("SharedSize", 0), 0)
+                layers.append((used.get(tags[0], image["Created"]), tags[0], size))
+
+        removed = []
+        total = sum(size for _, _, size in layers)
+        for last_used, tag, size in sorted(layers):
+            if time.time() - last_used > self.max_age or total > self.max_bytes:
+                try:
+                    self.client.images.remove(tag)
+                except docker.errors.APIError as error:
+                    # e.g. still used by a running container
+                    logger.debug(f"Can't remove {tag}: {error}")
+                    continue
+                total -= size
+                removed.append(tag)
+        return removed
+
+
+@pytest.fixture(scope="session")
+def snapshots(container_pool) -> Snapshots:
+    """
+    Layered snapshots of provisioned containers, pruned after the session by age
+    ($PYSETMEUP_SNAPSHOT_DAYS, 14) and size ($PYSETMEUP_SNAPSHOT_GB, 20)
+    """
+    cache = Snapshots(
+        container_pool,
+        max_age=float(os.environ.get("PYSETMEUP_SNAPSHOT_DAYS", 14)) * 24 * 3600,
+        max_bytes=int(float(os.environ.get("PYSETMEUP_SNAPSHOT_GB", 20)) * 1024**3),
+    )
+    yield cache
+    cache.prune()
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Table of the seconds each part took in each distro"""
+    timings: dict[str, dict[str, float]] = {}
+    for reports in terminalreporter.stats.values():
+        for report in reports:
+            properties = dict(getattr(report, "user_properties", ()))
+            if "matrix" in properties and "seconds" in properties:
+                part, distro = properties["matrix"]
+                timings.setdefault(part, {})[distro] = properties["seconds"]
+    if not timings:
+        return
+    distros = sorted({distro for row in timings.values() for distro in row})
+    terminalreporter.section("part x distro timings")
+    terminalreporter.write_line(
+        f"{'part':20}" + "".join(f"{distro:>12}" for distro in distros)
+    )
+    for part, row in sorted(timings.items()):
+        cells = "".join(
+            f"{row[distro]:>11.1f}s" if distro in row else f"{'-':>12}"
+            for distro in distros
+        )
+        terminalreporter.write_line(f"{part:20}{cells}")
+
+
 @pytest.fixture
 def create_container(
     docker_env,
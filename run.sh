@@ -73,9 +73,62 @@ install_dev_deps() {
   fi
 }
 
+# <distro><major>-<arch> as named in the bundles, e.g. el9-x86_64
+bundle_platform() {
+  . /etc/os-release
+  case " $ID $ID_LIKE " in
+    *" ubuntu "*) distro=ubuntu ;;
+    *" rhel "*|*" fedora "*|*" centos "*) distro=el ;;
+    *" debian "*) distro=debian ;;
+    *" alpine "*) distro=alpine ;;
+    *) distro=$ID ;;
+  esac
+  echo "$distro${VERSION_ID%%.*}-$(uname -m)"
+}
+
+# Deploys from an archive made by `python -m pysetmeup.bundle`, without network
+deploy_from_bundle() {
+  bundle_dir=$(mktemp -d)
+  tar -xzf "$1" -C "$bundle_dir"
+  root="$bundle_dir/pysetmeup-bundle"
+  platform=$(bundle_platform)
+  if [ ! -d "$root/bin/$platform" ]; then
+    echo "The bundle has no $platform files, it was built for:"
+    ls "$root/bin"
+    return 1
+  fi
+
+  packages="$root/packages/$platform"
+  if ls "$packages"/*.rpm > /dev/null 2>&1; then
+    dnf install -y --disablerepo='*' "$packages"/*.rpm
+  elif ls "$packages"/*.deb > /dev/null 2>&1; then
+    apt-get install -y --no-download "$packages"/*.deb
+  elif ls "$packages"/*.apk > /dev/null 2>&1; then
+    apk add --allow-untrusted --no-network "$packages"/*.apk
+  fi
+
+  # The bundled Python, the system one can be too old (el9 has 3.9)
+  mkdir -p "$root/python/$platform"
+  tar -xzf "$root/python/$platform.tar.gz" -C "$root/python/$platform"
+  python="$root/python/$platform/python/bin/python3"
+
+  setup=$(sed -n 's/.*"setup": *"\([^"]*\)".*/\1/p' "$root/manifest.json")
+  PATH="$root/bin/$platform:$PATH" \
+  XDG_CACHE_HOME="$root/cache" \
+  PYSETMEUP_OFFLINE=1 \
+  UV_PYTHON_DOWNLOADS=never \
+    uv tool run --offline --no-index --find-links "$root/wheelhouse" \
+      --python "$python" --with pysetmeup pyinfra @local "pysetmeup.setups.$setup.deploy"
+}
+
+if [ -n "${1:-$PYSETMEUP_BUNDLE}" ]; then
+  deploy_from_bundle "${1:-$PYSETMEUP_BUNDLE}"
+  exit
+fi
+
 install_dev_deps
 install_curl
 install_uv
 install_python3
 
-uv tool run --isolated --with . pyinfra @local pysetmeup.setups.basicdev
+uv tool run --isolated --with . pyinfra @local pysetmeup.setups.basicdev.deploy
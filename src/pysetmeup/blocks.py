@@ -0,0 +1,163 @@
+"""
+Managed blocks: batched edits of text files.
+
+Each ``files.block`` is a remote read-modify-write of its file. Here the blocks are
+collected while the parts run and applied once per file when the outermost
+`managed_blocks` context exits: a single `file_blocks` operation reads the file
+(`FileContents`), applies every block locally and uploads the result only if it
+changed. The file is read when the operation runs, not when the deploy is planned,
+so changes made by earlier operations are kept.
+
+Blocks are delimited by ``# BEGIN PYSETMEUP <name>`` / ``# END PYSETMEUP <name>`` so
+many of them can live in the same file, and a block whose content is already in the
+file (e.g. added by hand) is left alone.
+
+.. code:: python
+
+    with managed_blocks():
+        block("/etc/sudoers.d/dev", "sudo", "dev ALL=(ALL) NOPASSWD: ALL", mode="440")
+        fish.deploy()  # its blocks are applied together with the ones above
+"""
+
+import hashlib
+import io
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from pyinfra import host
+from pyinfra.api import operation
+from pyinfra.facts.files import FileContents
+from pyinfra.operations import files
+
+MARKER = "# {mark} PYSETMEUP {name}"
+
+
+@dataclass
+class Block:
+    name: str
+    content: str
+    # Regex of the line the block goes before when it's added, otherwise at the end
+    before: str | None = None
+
+
+@dataclass
+class ManagedFile:
+    path: str
+    user: str | None = None
+    group: str | None = None
+    mode: str | None = None
+    sudo: bool = False
+    blocks: dict[str, Block] = field(default_factory=dict)
+
+
+def render(current: str, blocks: list[Block]) -> str:
+    """`current` with every block in place"""
+    lines = current.splitlines()
+    for block in blocks:
+        begin = MARKER.format(mark="BEGIN", name=block.name)
+        end = MARKER.format(mark="END", name=block.name)
+        new = [begin, *block.content.strip("\n").splitlines(), end]
+        if begin in lines and end in lines[lines.index(begin) :]:
+            start = lines.index(begin)
+            stop = lines.index(end, start)
+            lines[start : stop + 1] = new
+        elif block.content.strip() and block.content.strip() in "\n".join(lines):
+            continue
+        else:
+            position = len(lines)
+            if block.before:
+                pattern = re.compile(block.before)
+                position = next(
+                    (i for i, line in enumerate(lines) if pattern.search(line)),
+                    position,
+                )
+            lines[position:position] = new
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# Files with pending blocks, per host
+_pending: dict[str, dict[str, ManagedFile]] = {}
+# How many managed_blocks contexts are open, per host
+_depth: dict[str, int] = {}
+
+
+def block(
+    path: str,
+    name: str,
+    content: str | list[str],
+    before: str | None = None,
+    user: str | None = None,
+    group: str | None = None,
+    mode: str | None = None,
+    sudo: bool = False,
+) -> None:
+    """
+    Ensures the block `name` in `path` has `content`, the file is owned by
+    `user`/`group` with `mode` (when given) and is read and written with sudo if
+    `sudo` is set. Outside `managed_blocks` it's applied right away.
+    """
+    if not isinstance(content, str):
+        content = "\n".join(content)
+    files_ = _pending.setdefault(host.name, {})
+    managed = files_.setdefault(path, ManagedFile(path))
+    managed.user = user or managed.user
+    managed.group = group or managed.group
+    managed.mode = mode or managed.mode
+    managed.sudo = sudo or managed.sudo
+    managed.blocks[name] = Block(name, content, before)
+    if not _depth.get(host.name):
+        apply()
+
+
+@operation()
+def file_blocks(
+    path: str,
+    blocks: list[Block],
+    user: str | None = None,
+    group: str | None = None,
+    mode: str | None = None,
+):
+    """
+    Puts `blocks` in the file at `path`, reading it when the operation runs. The
+    file is uploaded only if its content changes.
+    """
+    lines = host.get_fact(FileContents, path=path)
+    current = "\n".join(lines) + "\n" if lines else ""
+    new = render(current, blocks)
+    if lines is not None and _sha256(new) == _sha256(current):
+        host.noop(f"{path} already has {', '.join(block.name for block in blocks)}")
+        return
+    yield from files.put._inner(
+        src=io.StringIO(new), dest=path, user=user, group=group, mode=mode
+    )
+
+
+def apply() -> None:
+    """One read and at most one write for each file with pending blocks"""
+    for managed in _pending.pop(host.name, {}).values():
+        file_blocks(
+            name=f"Update {', '.join(managed.blocks)} in {managed.path}",
+            path=managed.path,
+            blocks=list(managed.blocks.values()),
+            user=managed.user,
+            group=managed.group,
+            mode=managed.mode,
+            _sudo=managed.sudo,
+        )
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+@contextmanager
+def managed_blocks():
+    """Defers the blocks until the outermost context exits"""
+    _depth[host.name] = _depth.get(host.name, 0) + 1
+    try:
+        yield
+    finally:
+        _depth[host.name] -= 1
+    if not _depth[host.name]:
+        apply()
@@ -0,0 +1,374 @@
+"""
+Offline deploy bundles.
+
+A bundle has everything a setup needs to deploy in hosts without network access:
+
+    pysetmeup-bundle/
+        manifest.json
+        wheelhouse/              pysetmeup, pyinfra and their dependencies
+        bin/<platform>/uv
+        python/<platform>.tar.gz standalone CPython that runs the deploy
+        packages/<platform>/     RPM, DEB or APK files of the packages the parts install
+        cache/pysetmeup/         release metadata, release binaries, installers and
+                                 prebuilt artifacts, used as $XDG_CACHE_HOME
+
+The parts of a setup are the ones in its ``REQUIRES``, and the parts they require
+(see `pysetmeup.registry.closure`). Only their packages, tools and artifacts are
+bundled.
+
+Platforms are named ``<distro><major>-<arch>`` (``el9-x86_64``, ``debian12-aarch64``,
+``alpine3-x86_64``...), the same way ``run.sh`` names the host it runs in. Packages
+are downloaded in a container of each platform, so building a bundle needs docker.
+
+    python -m pysetmeup.bundle basicdev --platform el9-x86_64 --platform el9-aarch64
+    ./run.sh pysetmeup-0.1.0-basicdev.tar.gz
+"""
+
+import argparse
+import json
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from dataclasses import dataclass, field
+from importlib.metadata import version
+from pathlib import Path
+
+import requests
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11
+    import tomli as tomllib
+
+from pysetmeup import packages as package_manager
+from pysetmeup import registry
+from pysetmeup.facts import HostProfile
+from pysetmeup.helpers.artifacts import (
+    DOCKER_PLATFORMS,
+    FISH_VERSION,
+    build_fish,
+    find_artifact,
+)
+from pysetmeup.helpers.assets import system_info_of
+from pysetmeup.helpers.cache import cache_home, write_atomic
+from pysetmeup.helpers import download
+from pysetmeup.helpers.github import (
+    asset_cache_key,
+    download_cache,
+    download_release_binary,
+    get_release,
+    get_release_url,
+    github_headers,
+    release_cache,
+    release_sha256,
+)
+from pysetmeup.helpers.mirror import TOOLS, load_pins, mirror_binary, mirror_installer
+
+BUNDLE_FORMAT = 1
+
+# Needed by run.sh itself
+BOOTSTRAP_PACKAGES = ["curl"]
+
+# Standalone CPython builds (the ones `uv python install` uses). The system Python
+# can't run the deploy: el9 has 3.9, and the wheelhouse is built for one version
+PYTHON_BUILDS_REPO = "astral-sh/python-build-standalone"
+# pysetmeup uses `X | None` annotations
+MIN_PYTHON = (3, 10)
+
+DISTROS = {
+    # distro: (family, os-release ID, docker image)
+    "el": ("RedHat", "rocky", "rockylinux:{major}"),
+    "debian": ("Debian", "debian", "debian:{major}"),
+    "ubuntu": ("Debian", "ubuntu", "ubuntu:{major}.04"),
+    "alpine": ("Alpine", "alpine", "alpine:{major}"),
+}
+
+EPEL_RELEASES = (
+    "https://dl.fedoraproject.org/pub/epel/epel-release-latest-{major}.noarch.rpm",
+    "https://dl.fedoraproject.org/pub/epel/epel-next-release-latest-{major}.noarch.rpm",
+)
+
+PROJECT_ROOT = Path(__file__).parents[2]
+
+
+@dataclass(frozen=True)
+class Platform:
+    distro: str
+    major: str
+    arch: str
+
+    @classmethod
+    def parse(cls, name: str) -> "Platform":
+        match = re.fullmatch(r"([a-z]+)(\d+)-(\w+)", name)
+        if not match or match.group(1) not in DISTROS:
+            raise ValueError(
+                f"Invalid platform {name!r}, expected <distro><major>-<arch> "
+                f"with distro one of {', '.join(DISTROS)}"
+            )
+        return cls(*match.groups())
+
+    def __str__(self) -> str:
+        return f"{self.distro}{self.major}-{self.arch}"
+
+    @property
+    def family(self) -> str:
+        return DISTROS[self.distro][0]
+
+    @property
+    def image(self) -> str:
+        return DISTROS[self.distro][2].format(major=self.major)
+
+    def profile(self) -> dict:
+        """HostProfile of a freshly installed host of this platform"""
+        profile = HostProfile.default()
+        profile.update(
+            os="Linux",
+            arch=self.arch,
+            libc="musl" if self.distro == "alpine" else "glibc",
+            family=self.family,
+            os_release={"ID": DISTROS[self.distro][1], "VERSION_ID": self.major},
+        )
+        return profile
+
+
+@dataclass
+class CacheEntries:
+    """What the parts of a bundle read from the cache when they deploy"""
+
+    # Keys of the download cache: release assets and installers
+    downloads: set[str] = field(default_factory=set)
+    # URLs of the cached release metadata
+    releases: set[str] = field(default_factory=set)
+    installers: set[str] = field(default_factory=set)
+    artifacts: set[Path] = field(default_factory=set)
+
+
+def setup_parts(setup: str) -> list[str]:
+    """The parts `setup` deploys, the ones it requires transitively included"""
+    if not registry.entry(setup).module.startswith("pysetmeup.setups."):
+        raise ValueError(f"{setup} is not a module of pysetmeup.setups")
+    return registry.closure([setup])
+
+
+def closure(platform: Platform, setup: str) -> list[str]:
+    """Distro packages of everything the parts of `setup` would install in the platform"""
+    profile = platform.profile()
+    needed = list(BOOTSTRAP_PACKAGES)
+    for name in setup_parts(setup):
+        part = registry.module(name)
+        # Modules can import pysetmeup.packages as `packages` too
+        if not callable(getattr(part, "packages", None)):
+            continue
+        try:
+            needed.extend(part.packages(profile))
+        except LookupError:
+            # The part doesn't support the platform
+            continue
+    names = package_manager.distro_names(needed, platform.family)
+    # Groups can't be downloaded, fish is prebuilt instead
+    return [name for name in names if not name.startswith("@")]
+
+
+def download_packages(platform: Platform, names: list[str], dest: Path) -> None:
+    """Downloads `names` and their dependencies in a container of the platform"""
+    dest.mkdir(parents=True, exist_ok=True)
+    packages = " ".join(names)
+    if platform.family == "RedHat":
+        for url in EPEL_RELEASES:
+            response = requests.get(url.format(major=platform.major), timeout=60)
+            response.raise_for_status()
+            (dest / url.format(major=platform.major).rsplit("/", 1)[-1]).write_bytes(
+                response.content
+            )
+        script = (
+            "dnf install -y epel-release 'dnf-command(download)' && "
+            f"dnf download --resolve --destdir /out {packages}"
+        )
+    elif platform.family == "Debian":
+        script = (
+            "apt-get update && "
+            f"apt-get install -y --download-only {packages} && "
+            "cp /var/cache/apt/archives/*.deb /out/"
+        )
+    else:
+        script = f"apk fetch --recursive -o /out {packages}"
+    subprocess.run(
+        ["docker", "run", "--rm"]
+        + ["--platform", DOCKER_PLATFORMS.get(platform.arch, f"linux/{platform.arch}")]
+        + ["-v", f"{dest.resolve()}:/out", platform.image, "sh", "-c", script],
+        check=True,
+    )
+
+
+def build_wheelhouse(
+    dest: Path, platforms: list[Platform], python_version: str
+) -> None:
+    """Wheels of pysetmeup and its dependencies for the Python of the hosts"""
+    dest.mkdir(parents=True, exist_ok=True)
+    pip = [sys.executable, "-m", "pip"]
+    subprocess.run(
+        pip + ["wheel", "--no-deps", "-w", str(dest), str(PROJECT_ROOT)], check=True
+    )
+
+    pyproject = tomllib.loads((PROJECT_ROOT / "pyproject.toml").read_text())
+    requirements = pyproject["project"]["dependencies"]
+    for arch in sorted({platform.arch for platform in platforms}):
+        tags = [f"manylinux2014_{arch}", f"musllinux_1_1_{arch}", "any"]
+        subprocess.run(
+            pip
+            + ["download", "--only-binary=:all:", "-d", str(dest)]
+            + ["--python-version", python_version]
+            + [argument for tag in tags for argument in ("--platform", tag)]
+            + requirements,
+            check=True,
+        )
+
+
+def fetch_uv(platform: Platform, dest: Path) -> None:
+    """uv for run.sh"""
+    download_release_binary(
+        "astral-sh/uv",
+        output_dir=str(dest),
+        binary_pattern="uv",
+        system_info=system_info_of(platform.profile()),
+    )
+
+
+def fetch_python(platform: Platform, python_version: str, dest: Path) -> Path:
+    """Standalone CPython `python_version` for run.sh, as ``<dest>/<platform>.tar.gz``"""
+    libc = "musl" if platform.distro == "alpine" else "gnu"
+    pattern = re.compile(
+        rf"cpython-{re.escape(python_version)}\.\d+\+\d+-{re.escape(platform.arch)}"
+        rf"-unknown-linux-{libc}-install_only\.tar\.gz"
+    )
+    release = get_release(PYTHON_BUILDS_REPO)
+    asset = next(
+        (asset for asset in release["assets"] if pattern.fullmatch(asset["name"])), None
+    )
+    if asset is None:
+        raise LookupError(f"No standalone Python {python_version} for {platform}")
+
+    key = asset_cache_key(PYTHON_BUILDS_REPO, asset)
+    local_path = download_cache.get(key)
+    if local_path is None:
+        partial = download.fetch(
+            asset["browser_download_url"],
+            download_cache.partial_path(key),
+            headers=github_headers(),
+        )
+        local_path = download_cache.adopt(
+            key, partial, sha256=release_sha256(release, asset)
+        )
+    dest.mkdir(parents=True, exist_ok=True)
+    target = dest / f"{platform}.tar.gz"
+    shutil.copyfile(local_path, target)
+    return target
+
+
+def fetch_binaries(platform: Platform, parts: list[str], entries: CacheEntries) -> None:
+    """
+    Warms the cache with the tools and artifacts `parts` use in the platform, and
+    adds what they resolved to `entries`.
+    """
+    profile = platform.profile()
+    with download_cache.recording() as keys:
+        # Tools are named like the parts that install them
+        for name in parts:
+            tool = TOOLS.get(name)
+            if tool is None:
+                continue
+            if tool.repo:
+                mirror_binary(name, profile)
+                entries.releases.add(get_release_url(tool.repo))
+            mirror_installer(tool.installer)
+            entries.installers.add(tool.installer)
+    entries.downloads |= keys
+
+    if "fish" in parts and platform.family == "RedHat":
+        artifact = find_artifact("fish", FISH_VERSION, profile) or build_fish(
+            FISH_VERSION, major=platform.major, arch=platform.arch
+        )
+        entries.artifacts.add(artifact)
+
+
+def copy_cache(dest: Path, entries: CacheEntries) -> None:
+    """Copies the cache entries in `entries` to the cache in `dest`"""
+    root = dest / "pysetmeup"
+    download_cache.export(entries.downloads, root / "downloads")
+    release_cache.export(sorted(entries.releases), root / "releases")
+    pins = load_pins()
+    mirrored = {url: pins[url] for url in sorted(entries.installers) if url in pins}
+    write_atomic(root / "mirror" / "pins.json", json.dumps(mirrored, indent=2).encode())
+    for artifact in entries.artifacts:
+        target = root / artifact.relative_to(cache_home())
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(artifact, target)
+
+
+def build_bundle(
+    setup: str,
+    platforms: list[Platform],
+    output: Path | None = None,
+    python_version: str = "3.11",
+) -> Path:
+    """Builds the bundle of `setup` (a module of `pysetmeup.setups`) for `platforms`"""
+    if tuple(int(part) for part in python_version.split(".")[:2]) < MIN_PYTHON:
+        raise ValueError(
+            f"pysetmeup needs Python {'.'.join(map(str, MIN_PYTHON))} or newer"
+        )
+    package_version = version("pysetmeup")
+    output = Path(output or f"pysetmeup-{package_version}-{setup}.tar.gz")
+    parts = setup_parts(setup)
+    entries = CacheEntries()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir) / "pysetmeup-bundle"
+        build_wheelhouse(root / "wheelhouse", platforms, python_version)
+        for platform in platforms:
+            print(f"Bundling {platform}")
+            fetch_uv(platform, root / "bin" / str(platform))
+            fetch_python(platform, python_version, root / "python")
+            fetch_binaries(platform, parts, entries)
+            download_packages(
+                platform, closure(platform, setup), root / "packages" / str(platform)
+            )
+        copy_cache(root / "cache", entries)
+
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "version": package_version,
+            "setup": setup,
+            "parts": parts,
+            "platforms": [str(platform) for platform in platforms],
+            "python": python_version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        (root / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        with tarfile.open(output, "w:gz") as tar:
+            tar.add(root, arcname=root.name)
+    return output
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("setup", help="Module of pysetmeup.setups, e.g. basicdev")
+    parser.add_argument(
+        "--platform",
+        action="append",
+        type=Platform.parse,
+        required=True,
+        help="<distro><major>-<arch> of the hosts, can be repeated",
+    )
+    parser.add_argument("--output", type=Path, help="Path of the archive")
+    parser.add_argument("--python-version", default="3.11", help="Python of the hosts")
+    args = parser.parse_args(argv)
+    output = build_bundle(args.setup, args.platform, args.output, args.python_version)
+    print(f"Bundle written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Index of the ``@deploy`` functions in the source tree, for ``invoke list-deploys``
+and ``invoke select``.
+
+The index is kept in ``<cache>/deploy-index/`` with an entry per file. A file is
+parsed again only when its size or modification time changed and its sha256 did
+too, so listing the deploys of an unchanged tree reads a single JSON file.
+
+Only the standard library is imported: the index is read before any deploy runs.
+"""
+
+import ast
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from pysetmeup.helpers.cache import cache_home, write_atomic
+
+INDEX_FORMAT = 1
+
+
+@dataclass
+class DeployEntry:
+    # Importable name, e.g. pysetmeup.parts.git.deploy
+    name: str
+    # Name given to @deploy, if any
+    title: str | None = None
+    doc: str | None = None
+    params: list[str] = field(default_factory=list)
+    line: int = 0
+
+
+def decorator_name(decorator: ast.expr) -> str | None:
+    """`deploy` for @deploy, @deploy(...) and @api.deploy(...)"""
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    if isinstance(decorator, ast.Attribute):
+        return decorator.attr
+    return None
+
+
+def deploy_title(decorator: ast.expr) -> str | None:
+    """First argument (or name=) of @deploy(...) when it's a literal string"""
+    if not isinstance(decorator, ast.Call):
+        return None
+    arguments = decorator.args[:1] + [
+        keyword.value for keyword in decorator.keywords if keyword.arg == "name"
+    ]
+    for argument in arguments:
+        if isinstance(argument, ast.Constant) and isinstance(argument.value, str):
+            return argument.value
+    return None
+
+
+def parse_deploys(
+    source: str | bytes, module: str, filename: str = "<unknown>"
+) -> list[DeployEntry]:
+    """The @deploy decorated functions of a module"""
+    entries = []
+    for node in ast.walk(ast.parse(source, filename=filename)):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if decorator_name(decorator) == "deploy":
+                arguments = node.args
+                positional = arguments.posonlyargs + arguments.args
+                params = [
+                    argument.arg for argument in positional + arguments.kwonlyargs
+                ]
+                entries.append(
+                    DeployEntry(
+                        name=f"{module}.{node.name}",
+                        title=deploy_title(decorator),
+                        doc=ast.get_docstring(node),
+                        params=params,
+                        line=node.lineno,
+                    )
+                )
+                break
+    return entries
+
+
+class DeployIndex:
+    """
+    Persisted index of the deploys under `root`, a directory of the package
+    `package`.
+    """
+
+    def __init__(
+        self, root: Path, package: str = "pysetmeup", path: Path | None = None
+    ):
+        self.root = Path(root).resolve()
+        self.package = package
+        key = hashlib.sha256(str(self.root).encode()).hexdigest()[:16]
+        self.path = Path(path or cache_home() / "deploy-index" / f"{key}.json")
+        self.parsed: list[str] = []
+
+    def load(self) -> dict:
+        try:
+            index = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if index.get("format") != INDEX_FORMAT:
+            return {}
+        return index.get("files", {})
+
+    def module_of(self, file: Path) -> str:
+        dotted = ".".join(file.relative_to(self.root).with_suffix("").parts)
+        return f"{self.package}.{dotted}"
+
+    def update(self) -> list[DeployEntry]:
+        """Every deploy in the tree, parsing only the files that changed"""
+        cached = self.load()
+        files = {}
+        self.parsed = []
+        for file in sorted(self.root.rglob("*.py")):
+            relative = str(file.relative_to(self.root))
+            stat = file.stat()
+            entry = cached.get(relative)
+            unchanged = (stat.st_mtime_ns, stat.st_size)
+            if entry and (entry["mtime_ns"], entry["size"]) == unchanged:
+                files[relative] = entry
+                continue
+
+            data = file.read_bytes()
+            sha256 = hashlib.sha256(data).hexdigest()
+            if entry and entry["sha256"] == sha256:
+                # Touched but not changed
+                deploys = entry["deploys"]
+            else:
+                self.parsed.append(relative)
+                try:
+                    deploys = [
+                        asdict(deploy)
+                        for deploy in parse_deploys(
+                            data, self.module_of(file), str(file)
+                        )
+                    ]
+                except SyntaxError:
+                    deploys = []
+            files[relative] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": sha256,
+                "deploys": deploys,
+            }
+
+        if files != cached:
+            write_atomic(
+                self.path,
+                json.dumps({"format": INDEX_FORMAT, "files": files}, indent=1).encode(),
+            )
+        return [
+            DeployEntry(**deploy)
+            for entry in files.values()
+            for deploy in entry["deploys"]
+        ]
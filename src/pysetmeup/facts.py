@@ -0,0 +1,257 @@
+"""
+pyinfra facts used by the parts in `pysetmeup.parts`.
+"""
+
+import shlex
+from typing import TypedDict
+
+from pyinfra.api import FactBase, Host
+from pyinfra.facts.server import LinuxDistribution
+
+# Commands whose presence the parts check
+COMMANDS = (
+    "apk",
+    "apt-get",
+    "brew",
+    "curl",
+    "direnv",
+    "dnf",
+    "fish",
+    "fzf",
+    "gh",
+    "git",
+    "mosh",
+    "rclone",
+    "starship",
+    "sudo",
+    "tmux",
+    "unzip",
+    "yq",
+    "yum",
+)
+
+# Packages whose installed version the parts check
+PACKAGES = (
+    "epel-next-release",
+    "epel-release",
+    "fish",
+    "fzf",
+    "git",
+    "lvm2",
+    "mosh",
+    "unzip",
+    "yq",
+)
+
+# Distribution families, from /etc/os-release ID and ID_LIKE
+FAMILIES = {
+    "alpine": "Alpine",
+    "debian": "Debian",
+    "ubuntu": "Debian",
+    "rhel": "RedHat",
+    "fedora": "RedHat",
+    "centos": "RedHat",
+    "rocky": "RedHat",
+    "almalinux": "RedHat",
+}
+
+SCRIPT = """
+echo "os=$(uname -s)"
+echo "arch=$(uname -m)"
+echo "user=$(id -un)"
+echo "uid=$(id -u)"
+echo "home=$HOME"
+echo "shell=$SHELL"
+if [ -f /etc/os-release ]; then
+    sed -n 's/^\\([A-Z_]*\\)=["]*\\([^"]*\\)["]*$/os_release.\\1=\\2/p' /etc/os-release
+fi
+if ldd --version 2>&1 | grep -qi musl; then
+    echo "libc=musl"
+elif getconf GNU_LIBC_VERSION >/dev/null 2>&1; then
+    echo "libc=glibc"
+fi
+for command in {commands}; do
+    echo "command.$command=$(command -v $command)"
+done
+if command -v fish >/dev/null; then
+    echo "fish_version=$(fish --version | sed 's/.* //')"
+fi
+if command -v rpm >/dev/null; then
+    rpm -q --qf 'package.%{{NAME}}=%{{VERSION}}\\n' {packages} 2>/dev/null | grep '^package'
+elif command -v dpkg-query >/dev/null; then
+    dpkg-query -W -f='package.${{Package}}=${{Version}}\\n' {packages} 2>/dev/null
+elif command -v apk >/dev/null; then
+    for package in {packages}; do
+        version=$(apk list --installed "$package" 2>/dev/null | cut -d' ' -f1)
+        [ -n "$version" ] && echo "package.$package=${{version#$package-}}"
+    done
+fi
+if command -v getent >/dev/null; then getent passwd; else cat /etc/passwd; fi | sed 's/^/passwd=/'
+true
+"""
+
+
+class UserDict(TypedDict):
+    uid: int
+    home: str
+    shell: str
+
+
+class HostProfileDict(TypedDict):
+    os: str | None
+    arch: str | None
+    libc: str | None
+    linux_name: str | None
+    family: str | None
+    os_release: dict[str, str]
+    user: str | None
+    uid: int | None
+    home: str | None
+    shell: str | None
+    users: dict[str, UserDict]
+    commands: dict[str, str | None]
+    packages: dict[str, str]
+    fish_version: str | None
+
+
+class HostProfile(FactBase[HostProfileDict]):
+    """
+    Everything the parts need to know about a host, collected by a single script
+    so the whole deploy pays one round trip instead of one per `Which`,
+    `LinuxName`, `Kernel`... fact.
+
+    .. code:: python
+
+        {
+            "os": "Linux",
+            "arch": "x86_64",
+            "libc": "glibc",
+            "linux_name": "RedHat",  # same as the LinuxName fact
+            "family": "RedHat",  # RedHat, Debian or Alpine for their derivatives
+            "os_release": {"ID": "rhel", "VERSION_ID": "9.4", ...},
+            "user": "nahuel",
+            "uid": 1000,
+            "home": "/home/nahuel",
+            "shell": "/bin/bash",
+            "users": {"nahuel": {"uid": 1000, "home": "/home/nahuel", "shell": "/bin/bash"}},
+            "commands": {"git": "/usr/bin/git", "fish": None, ...},
+            "packages": {"git": "2.43.5", ...},
+            "fish_version": None,
+        }
+    """
+
+    @staticmethod
+    def default() -> HostProfileDict:
+        return {
+            "os": None,
+            "arch": None,
+            "libc": None,
+            "linux_name": None,
+            "family": None,
+            "os_release": {},
+            "user": None,
+            "uid": None,
+            "home": None,
+            "shell": None,
+            "users": {},
+            "commands": {command: None for command in COMMANDS},
+            "packages": {},
+            "fish_version": None,
+        }
+
+    def command(self) -> str:
+        return SCRIPT.format(
+            commands=" ".join(COMMANDS),
+            packages=" ".join(shlex.quote(package) for package in PACKAGES),
+        )
+
+    def process(self, output) -> HostProfileDict:
+        profile = self.default()
+        for line in output:
+            key, _, value = line.partition("=")
+            if key.startswith("os_release."):
+                profile["os_release"][key.removeprefix("os_release.")] = value
+            elif key.startswith("command."):
+                profile["commands"][key.removeprefix("command.")] = value or None
+            elif key.startswith("package."):
+                profile["packages"][key.removeprefix("package.")] = value
+            elif key == "passwd":
+                name, _, uid, _, _, home, shell = (value.split(":") + [""] * 7)[:7]
+                if name:
+                    profile["users"][name] = {
+                        "uid": int(uid) if uid.isdigit() else -1,
+                        "home": home,
+                        "shell": shell,
+                    }
+            elif key == "uid":
+                profile["uid"] = int(value) if value.isdigit() else None
+            elif key in {"os", "arch", "libc", "user", "home", "shell", "fish_version"}:
+                profile[key] = value or None
+
+        release_id = profile["os_release"].get("ID", "").lower()
+        if release_id:
+            profile["linux_name"] = LinuxDistribution.name_to_pretty_name.get(
+                release_id, profile["os_release"].get("NAME")
+            )
+        for candidate in [
+            release_id,
+            *profile["os_release"].get("ID_LIKE", "").split(),
+        ]:
+            if candidate.lower() in FAMILIES:
+                profile["family"] = FAMILIES[candidate.lower()]
+                break
+        return profile
+
+
+# Arguments that change the user a fact is gathered as
+USER_ARGUMENTS = ("_sudo", "_sudo_user", "_su_user", "_doas", "_doas_user")
+
+# Profile of each host, by host name and the user arguments it was gathered with
+_profiles: dict[tuple, HostProfileDict] = {}
+
+
+def host_profile(host: Host, **kwargs) -> HostProfileDict:
+    """
+    The `HostProfile` of `host`, gathered once per deploy for each user it's gathered
+    as (``_sudo``, ``_su_user``... in `kwargs` or in the current deploy/operation).
+
+    pyinfra doesn't cache facts, so every ``host.get_fact(HostProfile)`` runs the
+    whole script again. The parts read the profile from here instead.
+    """
+    arguments = {
+        **(getattr(host, "current_deploy_kwargs", None) or {}),
+        **(getattr(host, "current_op_global_arguments", None) or {}),
+        **kwargs,
+    }
+    key = (host.name, *(arguments.get(name) or None for name in USER_ARGUMENTS))
+    if key not in _profiles:
+        _profiles[key] = host.get_fact(HostProfile, **kwargs)
+    return _profiles[key]
+
+
+def user_shell(profile: HostProfileDict, user: str | None = None) -> str | None:
+    """Login shell of `user` (or the connecting user) in a host profile"""
+    if user and user in profile["users"]:
+        return profile["users"][user]["shell"]
+    return profile["shell"]
+
+
+def user_home(profile: HostProfileDict, user: str | None = None) -> str | None:
+    """Home of `user` (or the connecting user) in a host profile"""
+    if user and user in profile["users"]:
+        return profile["users"][user]["home"]
+    return profile["home"]
+
+
+class BinaryVersion(FactBase[str | None]):
+    """
+    First line printed by ``<path> --version`` (or `flag`), None when the binary
+    isn't there.
+    """
+
+    def command(self, path: str, flag: str = "--version") -> str:
+        path = shlex.quote(path)
+        return f"! test -x {path} || {path} {flag} 2>&1 | head -n 1"
+
+    def process(self, output) -> str | None:
+        return output[0].strip() if output else None
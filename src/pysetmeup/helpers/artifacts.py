@@ -0,0 +1,109 @@
+"""
+Binaries built once in a local container and reused by every deploy.
+
+Artifacts are tarballs of an install prefix (``bin/``, ``share/``...) stored in
+``<cache>/artifacts/<name>/<version>/<platform>.tar.gz``, where the platform is the
+distro family, its major version and the architecture (e.g. ``el9-x86_64``). A
+deploy pushes the tarball and unpacks it in the prefix instead of compiling in
+the target host.
+"""
+
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from textwrap import dedent
+
+from pysetmeup.helpers.cache import cache_home
+
+# Version of fish built from source in RedHat
+FISH_VERSION = "3.7.0"
+
+# Docker platforms of the architectures reported by `uname -m`
+DOCKER_PLATFORMS = {"x86_64": "linux/amd64", "aarch64": "linux/arm64"}
+
+FISH_DOCKERFILE = dedent(
+    """
+    FROM {image}
+
+    # Install build dependencies
+    RUN dnf groupinstall -y "Development Tools" && \\
+        dnf install -y \\
+        cmake \\
+        ncurses-devel \\
+        python3-devel \\
+        gettext-devel \\
+        which \\
+        git
+
+    # Clone, build and pack fish, it finds its files relative to the binary
+    # so the tarball can be unpacked in any prefix. Hosts may not have
+    # libpcre2-32, so the bundled pcre2 is used instead of the system one
+    WORKDIR /src
+    RUN git clone --depth 1 --branch {version} https://github.com/fish-shell/fish-shell.git && \\
+        cd fish-shell && \\
+        cmake -DCMAKE_INSTALL_PREFIX=/usr/local -DFISH_USE_SYSTEM_PCRE2=OFF . && \\
+        make -j$(nproc) && \\
+        make install DESTDIR=/dist && \\
+        tar -czf /fish.tar.gz -C /dist/usr/local .
+    """
+)
+
+
+def artifacts_home() -> Path:
+    return cache_home() / "artifacts"
+
+
+def platform_of(profile: dict) -> str | None:
+    """Artifact platform of a host profile, None when artifacts are not built for it"""
+    major = profile["os_release"].get("VERSION_ID", "").split(".")[0]
+    if profile["family"] != "RedHat" or not major or not profile["arch"]:
+        return None
+    return f"el{major}-{profile['arch']}"
+
+
+def artifact_path(name: str, version: str, platform: str) -> Path:
+    return artifacts_home() / name / version / f"{platform}.tar.gz"
+
+
+def find_artifact(name: str, version: str, profile: dict) -> Path | None:
+    """Path of the artifact for the host, if it was built"""
+    platform = platform_of(profile)
+    if platform is None:
+        return None
+    path = artifact_path(name, version, platform)
+    return path if path.exists() else None
+
+
+def build_fish(
+    version: str = FISH_VERSION, major: str = "9", arch: str = "x86_64"
+) -> Path:
+    """Builds fish in a Rocky Linux container and stores it in the artifact cache"""
+    path = artifact_path("fish", version, f"el{major}-{arch}")
+    tag = f"pysetmeup-fish:{version}-el{major}-{arch}"
+    dockerfile = FISH_DOCKERFILE.format(image=f"rockylinux:{major}", version=version)
+    subprocess.run(
+        ["docker", "build", "--platform", DOCKER_PLATFORMS.get(arch, f"linux/{arch}")]
+        # The Dockerfile from stdin, without a build context
+        + ["-t", tag, "-"],
+        input=dockerfile.encode(),
+        check=True,
+    )
+    container = subprocess.run(
+        ["docker", "create", tag],
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    ).stdout.strip()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=".partial-")
+    os.close(fd)
+    try:
+        subprocess.run(
+            ["docker", "cp", f"{container}:/fish.tar.gz", temp_name], check=True
+        )
+        os.replace(temp_name, path)
+    finally:
+        Path(temp_name).unlink(missing_ok=True)
+        subprocess.run(["docker", "rm", container], stdout=subprocess.DEVNULL)
+    return path
@@ -0,0 +1,274 @@
+"""
+Selection of the release asset that matches a platform.
+
+Asset names are split into tokens (``fd-v10.2.0-x86_64-unknown-linux-gnu.tar.gz`` ->
+``fd``, ``v10``, ``2``, ``0``, ``x86_64``, ``unknown``, ``linux``, ``gnu``...) and each
+token is looked up in an index built once per platform, so ranking the assets of a
+release is a single pass over their names.
+"""
+
+import fnmatch
+import functools
+import platform
+import re
+import sys
+from collections.abc import Iterable
+
+ARCH_TOKENS = {
+    "x86_64": {"x86_64", "x86-64", "amd64", "x64", "64bit"},
+    "aarch64": {"arm64", "aarch64", "armv8"},
+    "armv7": {"arm", "armv7", "armv7l", "armhf", "armv6", "armel", "gnueabihf"},
+    "i386": {"386", "i386", "i686", "x86", "32bit"},
+    "ppc64le": {"ppc64le", "powerpc64le"},
+    "ppc64": {"ppc64", "powerpc64"},
+    "s390x": {"s390x"},
+    "riscv64": {"riscv64", "riscv64gc"},
+    "mips": {"mips", "mips64", "mipsle", "mips64le"},
+    "loong64": {"loong64", "loongarch64"},
+}
+
+OS_TOKENS = {
+    "Linux": {"linux", "ubuntu", "debian"},
+    "Darwin": {"darwin", "apple", "mac", "macos", "osx"},
+    "Windows": {"windows", "win", "win32", "win64", "msvc"},
+    "FreeBSD": {"freebsd"},
+    "OpenBSD": {"openbsd"},
+    "NetBSD": {"netbsd"},
+    "Android": {"android"},
+    "Illumos": {"illumos", "solaris"},
+}
+
+LIBC_TOKENS = {
+    "glibc": {"gnu", "glibc", "gnueabihf"},
+    "musl": {"musl", "musleabi", "musleabihf", "alpine"},
+}
+
+# Assets that can run on any architecture of their OS, e.g. macOS universal builds
+UNIVERSAL_TOKENS = {"all", "universal"}
+
+# Tokens of assets that are never the binary itself
+EXCLUDED_TOKENS = {
+    "checksums",
+    "checksum",
+    "sha256sums",
+    "sbom",
+    "src",
+    "source",
+    "man",
+}
+
+EXCLUDED_SUFFIXES = (
+    ".sha256",
+    ".sha256sum",
+    ".sha512",
+    ".md5",
+    ".sig",
+    ".asc",
+    ".pem",
+    ".crt",
+    ".sbom",
+    ".spdx",
+    ".json",
+    ".jsonl",
+    ".txt",
+    ".sum",
+    ".sh",
+    ".ps1",
+    ".yaml",
+    ".yml",
+    ".deb",
+    ".rpm",
+    ".apk",
+    ".msi",
+    ".pkg",
+    ".dmg",
+    ".vsix",
+)
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz")
+
+# x86_64 would be split in two tokens by the "_"
+TOKENIZE = re.compile(r"x86[_-]64|[a-z0-9]+")
+
+
+def detect_libc() -> str | None:
+    if platform.system() != "Linux":
+        return None
+    libc, _ = platform.libc_ver()
+    return "glibc" if libc == "glibc" else "musl"
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_info() -> dict:
+    """
+    Get current system's architecture and OS information.
+    Returns a dict with normalized platform information, it's computed once.
+    """
+    system = platform.system()
+    machine = platform.machine().lower()
+    arch = next(
+        (arch for arch, tokens in ARCH_TOKENS.items() if machine in tokens),
+        machine,
+    )
+    return {
+        "os": system,
+        "os_patterns": sorted(OS_TOKENS.get(system, ())),
+        "arch": arch,
+        "arch_patterns": sorted(ARCH_TOKENS.get(arch, ())),
+        "libc": detect_libc(),
+        "is_64bit": sys.maxsize > 2**32,
+    }
+
+
+def system_info_of(profile: dict) -> dict:
+    """Same as `get_system_info` for a remote host, from its `HostProfile`"""
+    machine = (profile["arch"] or "").lower()
+    arch = next(
+        (arch for arch, tokens in ARCH_TOKENS.items() if machine in tokens),
+        machine,
+    )
+    return {
+        "os": profile["os"],
+        "os_patterns": sorted(OS_TOKENS.get(profile["os"], ())),
+        "arch": arch,
+        "arch_patterns": sorted(ARCH_TOKENS.get(arch, ())),
+        "libc": profile["libc"],
+        "is_64bit": "64" in arch or arch == "s390x",
+    }
+
+
+def tokenize(name: str) -> list[str]:
+    return TOKENIZE.findall(name.lower())
+
+
+class AssetMatcher:
+    """
+    Ranks release asset names for a platform (as returned by `get_system_info`).
+
+    Assets for other OSes, architectures or libcs and files that are not binaries
+    (checksums, signatures, packages, sources...) are excluded. `pin` is an optional
+    glob that the asset name must match, to choose a specific flavor of a repo.
+    """
+
+    def __init__(self, system_info: dict, pin: str | None = None):
+        self.os = system_info["os"]
+        self.arch = system_info["arch"]
+        self.libc = system_info.get("libc")
+        self.is_64bit = system_info["is_64bit"]
+        self.pin = pin
+
+        # token -> (kind, matches this platform)
+        self.index: dict[str, tuple[str, bool]] = {}
+        for os_name, tokens in OS_TOKENS.items():
+            for token in tokens:
+                self.index[token] = ("os", os_name == self.os)
+        for arch, tokens in ARCH_TOKENS.items():
+            for token in tokens:
+                self.index.setdefault(token, ("arch", arch == self.arch))
+        # gnueabihf, musleabihf... say something about the arch and the libc
+        self.libc_index = {
+            token: libc == self.libc
+            for libc, tokens in LIBC_TOKENS.items()
+            for token in tokens
+        }
+        for token in UNIVERSAL_TOKENS:
+            self.index[token] = ("universal", True)
+        for token in EXCLUDED_TOKENS:
+            self.index[token] = ("excluded", False)
+
+    def score(self, asset_name: str) -> int | None:
+        """Higher is a better match, None if the asset can't be used at all"""
+        name = asset_name.lower()
+        if name.endswith(EXCLUDED_SUFFIXES):
+            return None
+        if self.pin and not fnmatch.fnmatch(name, self.pin.lower()):
+            return None
+        if name.endswith(".exe") and self.os != "Windows":
+            return None
+
+        score = 0
+        os_match = arch_match = universal = False
+        libc_match = None
+        for token in TOKENIZE.findall(name):
+            if token in self.libc_index:
+                libc_match = self.libc_index[token]
+            kind, matches = self.index.get(token, (None, False))
+            if kind is None:
+                continue
+            if kind == "excluded":
+                return None
+            if kind == "universal":
+                universal = True
+            elif not matches:
+                return None
+            elif kind == "os":
+                os_match = True
+            elif kind == "arch":
+                arch_match = True
+
+        if self.libc == "musl":
+            if libc_match is False:
+                # glibc binaries don't run on musl, the other way around they do
+                return None
+            if libc_match:
+                score += 10
+        elif self.libc == "glibc":
+            # Same libc, then no libc in the name (usually static), then musl
+            score += {True: 5, None: 4, False: 3}[libc_match]
+
+        if os_match:
+            score += 100
+        if arch_match:
+            score += 50
+        elif universal and self.os == "Darwin":
+            score += 40
+        elif self.is_64bit and "64" in name:
+            score += 30
+
+        # Prefer certain formats
+        if self.os == "Windows" and name.endswith(".zip"):
+            score += 10
+        elif name.endswith(TAR_SUFFIXES):
+            score += 10
+        elif name.endswith(".zip"):
+            score += 5
+
+        if self.pin:
+            score += 1000
+        return score
+
+    def rank(self, assets: Iterable[dict]) -> list[tuple[dict, int]]:
+        """GitHub assets that can be used, with their score, best first"""
+        scored = []
+        for asset in assets:
+            score = self.score(asset["name"])
+            if score is not None:
+                scored.append((asset, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+
+@functools.lru_cache(maxsize=None)
+def _matcher(os: str, arch: str, libc: str | None, is_64bit: bool, pin: str | None):
+    return AssetMatcher(
+        {"os": os, "arch": arch, "libc": libc, "is_64bit": is_64bit}, pin=pin
+    )
+
+
+def get_matcher(system_info: dict, pin: str | None = None) -> AssetMatcher:
+    """Matcher for a platform, built once per platform and pin"""
+    return _matcher(
+        system_info["os"],
+        system_info["arch"],
+        system_info.get("libc"),
+        system_info["is_64bit"],
+        pin,
+    )
+
+
+def score_asset(asset_name: str, system_info: dict) -> int | None:
+    """
+    Score an asset based on how well it matches the current system.
+    Higher score means better match, None means the asset can't be used.
+    """
+    return get_matcher(system_info).score(asset_name)
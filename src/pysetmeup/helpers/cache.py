@@ -0,0 +1,177 @@
+"""
+Local cache for downloads, shared by every deploy that runs in this machine.
+
+Files are stored by the sha256 of their contents (``blobs/<sha256>``) and looked up
+by a key (e.g. a release asset id), so the same file downloaded through different
+keys is stored once.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def cache_home() -> Path:
+    """Root of the pysetmeup cache, honors XDG_CACHE_HOME"""
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pysetmeup"
+
+
+def is_offline(offline: bool | None = None) -> bool:
+    """`offline`, or $PYSETMEUP_OFFLINE when it's not given"""
+    if offline is None:
+        return os.environ.get("PYSETMEUP_OFFLINE", "") not in {"", "0"}
+    return offline
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Writes a file so that readers see either the old or the new content"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=".partial-")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+class DownloadCache:
+    """
+    Content addressed cache with LRU eviction once it grows over `max_size` bytes.
+
+    Writes go to a temporary file that is renamed into place, so many deploys can
+    share the cache at the same time.
+    """
+
+    def __init__(self, root: Path | None = None, max_size: int = 2 * 1024**3):
+        self.root = Path(root or cache_home() / "downloads")
+        self.max_size = max_size
+        self.blobs = self.root / "blobs"
+        self.keys = self.root / "keys"
+        # Keys used inside each `recording` block
+        self._recordings: list[set[str]] = []
+
+    def _key_path(self, key: str) -> Path:
+        return self.keys / hashlib.sha256(key.encode()).hexdigest()
+
+    def _used(self, key: str) -> None:
+        for keys in self._recordings:
+            keys.add(key)
+
+    @contextmanager
+    def recording(self) -> Iterator[set[str]]:
+        """The keys looked up or stored while inside the block"""
+        keys: set[str] = set()
+        self._recordings.append(keys)
+        try:
+            yield keys
+        finally:
+            self._recordings.remove(keys)
+
+    def get(self, key: str) -> Path | None:
+        """Path of the cached file for `key`, if any"""
+        try:
+            digest = self._key_path(key).read_text().strip()
+        except FileNotFoundError:
+            return None
+        blob = self.blobs / digest
+        try:
+            # The modification time tracks the last use for the eviction
+            os.utime(blob)
+        except FileNotFoundError:
+            return None
+        self._used(key)
+        return blob
+
+    def put(self, key: str, chunks: Iterable[bytes], sha256: str | None = None) -> Path:
+        """
+        Stores the file made of `chunks` under `key`, when `sha256` is given the
+        content must match it.
+        """
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_name = tempfile.mkstemp(dir=self.blobs, prefix=".partial-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            if sha256 and digest.hexdigest() != sha256:
+                raise ValueError(
+                    f"Checksum mismatch for {key}: {digest.hexdigest()} != {sha256}"
+                )
+            blob = self.blobs / digest.hexdigest()
+            os.replace(temp_name, blob)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+
+        write_atomic(self._key_path(key), digest.hexdigest().encode())
+        self._used(key)
+        self.evict(keep=blob)
+        return blob
+
+    def partial_path(self, key: str) -> Path:
+        """Where an interrupted download of `key` is kept to be resumed later"""
+        return self.root / "partial" / f"{self._key_path(key).name}.partial"
+
+    def adopt(self, key: str, path: Path, sha256: str | None = None) -> Path:
+        """
+        Moves a downloaded file into the cache under `key`, when `sha256` is given
+        the content must match it (otherwise the file is removed).
+        """
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with path.open("rb") as source:
+            while chunk := source.read(1024**2):
+                digest.update(chunk)
+        if sha256 and digest.hexdigest() != sha256:
+            path.unlink(missing_ok=True)
+            raise ValueError(
+                f"Checksum mismatch for {key}: {digest.hexdigest()} != {sha256}"
+            )
+        blob = self.blobs / digest.hexdigest()
+        os.replace(path, blob)
+        write_atomic(self._key_path(key), digest.hexdigest().encode())
+        self._used(key)
+        self.evict(keep=blob)
+        return blob
+
+    def export(self, keys: Iterable[str], root: Path) -> None:
+        """Copies the files of `keys` to the cache in `root`"""
+        other = DownloadCache(root)
+        other.blobs.mkdir(parents=True, exist_ok=True)
+        for key in keys:
+            blob = self.get(key)
+            if blob is None:
+                continue
+            shutil.copyfile(blob, other.blobs / blob.name)
+            write_atomic(other._key_path(key), blob.name.encode())
+
+    def evict(self, keep: Path | None = None) -> None:
+        """
+        Removes the least recently used files until the cache fits `max_size`,
+        except `keep` (e.g. the file just stored).
+        """
+        blobs = []
+        for blob in self.blobs.iterdir():
+            if blob.name.startswith("."):
+                continue
+            try:
+                blobs.append((blob.stat(), blob))
+            except FileNotFoundError:
+                continue
+        blobs.sort(key=lambda item: item[0].st_mtime)
+        total = sum(stat.st_size for stat, _ in blobs)
+        for stat, blob in blobs:
+            if total <= self.max_size:
+                break
+            if blob == keep:
+                continue
+            blob.unlink(missing_ok=True)
+            total -= stat.st_size
@@ -0,0 +1,180 @@
+"""
+Resumable HTTP downloads.
+
+Downloads are written to a ``.partial`` file that survives interruptions. When the
+server advertises ``Accept-Ranges: bytes`` big files are split in segments that are
+downloaded in parallel, and the progress of each segment is kept in a ``.json``
+file next to the ``.partial`` one, so a retry only fetches what's missing. Other
+downloads are sequential (the ``.json`` file says so) and continue from the size of
+the ``.partial`` file. A ``.partial`` file without its ``.json`` one is discarded.
+"""
+
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from pysetmeup.helpers.cache import write_atomic
+
+CHUNK_SIZE = 64 * 1024
+
+# Don't split files smaller than this
+MIN_SEGMENT_SIZE = 8 * 1024**2
+
+# How often (in bytes) the progress of a segment is saved
+SAVE_EVERY = 1024**2
+
+SHA256 = re.compile(r"\b[0-9a-fA-F]{64}\b")
+
+
+def split_segments(size: int, segments: int) -> list[list[int]]:
+    """[start, end (inclusive), bytes done] for each segment of a file of `size`"""
+    length = -(-size // segments)
+    return [
+        [start, min(start + length, size) - 1, 0] for start in range(0, size, length)
+    ]
+
+
+def probe(url: str, session, headers: dict) -> tuple[int, bool]:
+    """Size of the file and whether the server accepts range requests"""
+    response = session.head(url, headers=headers, allow_redirects=True)
+    if not response.ok:
+        return 0, False
+    size = int(response.headers.get("Content-Length") or 0)
+    return size, response.headers.get("Accept-Ranges") == "bytes"
+
+
+def fetch_sequential(url: str, partial: Path, session, headers: dict) -> None:
+    """Downloads `url` into `partial`, continuing from its current size"""
+    offset = partial.stat().st_size if partial.exists() else 0
+    request_headers = dict(headers)
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+
+    response = session.get(url, headers=request_headers, stream=True)
+    if offset and response.status_code == 416:
+        # Nothing left to download
+        return
+    response.raise_for_status()
+    if offset and response.status_code != 206:
+        # The server ignored the range, start over
+        offset = 0
+
+    with partial.open("ab" if offset else "wb") as partial_file:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            partial_file.write(chunk)
+
+
+class SegmentedDownload:
+    """Downloads the segments of a file in parallel into the same `.partial` file"""
+
+    def __init__(self, url: str, partial: Path, session, headers: dict, state: dict):
+        self.url = url
+        self.partial = partial
+        self.session = session
+        self.headers = headers
+        self.state = state
+        self.state_path = partial.with_suffix(".json")
+        self._lock = threading.Lock()
+
+    def save(self) -> None:
+        with self._lock:
+            write_atomic(self.state_path, json.dumps(self.state).encode())
+
+    def fetch_segment(self, segment: list[int]) -> None:
+        start, end, done = segment
+        if start + done > end:
+            return
+        headers = {**self.headers, "Range": f"bytes={start + done}-{end}"}
+        response = self.session.get(self.url, headers=headers, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise ValueError(f"{self.url} doesn't honor range requests")
+
+        unsaved = 0
+        with self.partial.open("r+b") as partial_file:
+            partial_file.seek(start + done)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                chunk = chunk[: end + 1 - start - segment[2]]
+                partial_file.write(chunk)
+                segment[2] += len(chunk)
+                unsaved += len(chunk)
+                if unsaved >= SAVE_EVERY:
+                    partial_file.flush()
+                    self.save()
+                    unsaved = 0
+        self.save()
+
+    def run(self) -> None:
+        segments = self.state["segments"]
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            # list() to raise the errors of the segments
+            list(pool.map(self.fetch_segment, segments))
+
+
+def fetch(
+    url: str,
+    partial: Path,
+    session: requests.Session | None = None,
+    headers: dict | None = None,
+    segments: int = 4,
+) -> Path:
+    """
+    Downloads `url` into `partial`, resuming a previous attempt if there's one,
+    and returns `partial` once it holds the whole file.
+    """
+    session = session or requests
+    headers = headers or {}
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    state_path = partial.with_suffix(".json")
+
+    try:
+        state = json.loads(state_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = None
+    if state and (state.get("url") != url or not partial.exists()):
+        state = None
+
+    if state is None:
+        # Whatever is left can't be trusted, e.g. the sparse file of a segmented
+        # download whose state was lost
+        partial.unlink(missing_ok=True)
+        size, accepts_ranges = probe(url, session, headers)
+        if accepts_ranges and segments > 1 and size >= 2 * MIN_SEGMENT_SIZE:
+            with partial.open("wb") as partial_file:
+                partial_file.truncate(size)
+            state = {
+                "url": url,
+                "size": size,
+                "segments": split_segments(size, segments),
+            }
+        else:
+            state = {"url": url, "sequential": True}
+        write_atomic(state_path, json.dumps(state).encode())
+
+    if state.get("sequential"):
+        fetch_sequential(url, partial, session, headers)
+    else:
+        SegmentedDownload(url, partial, session, headers, state).run()
+    state_path.unlink(missing_ok=True)
+    return partial
+
+
+def parse_sha256(text: str, filename: str) -> str | None:
+    """
+    Finds the sha256 of `filename` in the contents of a `*.sha256` file (just the
+    hash) or a `checksums.txt` file (`<hash>  <filename>` lines).
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    for line in lines:
+        parts = line.split()
+        names = {part.lstrip("*").rsplit("/", 1)[-1] for part in parts[1:]}
+        if filename in names and (match := SHA256.search(line)):
+            return match.group().lower()
+    if len(lines) == 1 and (match := SHA256.search(lines[0])):
+        if len(lines[0].split()) == 1 or filename in lines[0]:
+            return match.group().lower()
+    return None
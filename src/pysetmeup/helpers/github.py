@@ -1,85 +1,269 @@
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
 import requests
+from requests.adapters import HTTPAdapter
 import tarfile
 import zipfile
 import shutil
-import tempfile
-import platform
-import sys
+import hashlib
+import json
+import os
+import posixpath
+import re
+import time
+
+from pysetmeup.helpers.assets import (  # noqa: F401
+    TAR_SUFFIXES,
+    get_matcher,
+    get_system_info,
+    score_asset,
+)
+from pysetmeup.helpers import download
+from pysetmeup.helpers.cache import (
+    DownloadCache,
+    cache_home,
+    is_offline,
+    write_atomic,
+)
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+
+# Release assets downloaded by any deploy in this machine
+download_cache = DownloadCache()
+
+
+def github_headers() -> dict:
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if token := os.environ.get("GITHUB_TOKEN"):
+        headers["Authorization"] = f"token {token}"
+    return headers
+
+
+def get_release_url(repo: str, version: str | None = "latest") -> str:
+    if version in {None, "latest"}:
+        return f"{GITHUB_API_URL}/repos/{repo}/releases/latest"
+    # Remove 'v' prefix if present for consistency
+    version = version.lstrip("v")
+    return f"{GITHUB_API_URL}/repos/{repo}/releases/tags/v{version}"
+
+
+class ReleaseMetadataCache:
+    """
+    On disk cache of GitHub API responses, revalidated with conditional requests.
+
+    GitHub doesn't count `304 Not Modified` responses against the rate limit, so
+    once a release is cached checking it again is free.
+    """
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root or cache_home() / "releases")
+
+    def _path(self, url: str) -> Path:
+        return self.root / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def load(self, url: str) -> dict | None:
+        try:
+            return json.loads(self._path(url).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def export(self, urls: list[str], root: Path) -> None:
+        """Copies the cached responses of `urls` to the cache in `root`"""
+        other = ReleaseMetadataCache(root)
+        for url in urls:
+            if self._path(url).exists():
+                write_atomic(other._path(url), self._path(url).read_bytes())
+
+    def fetch(
+        self,
+        url: str,
+        offline: bool = False,
+        session: requests.Session | None = None,
+    ) -> dict:
+        entry = self.load(url)
+        if offline:
+            if entry is None:
+                raise LookupError(f"{url} is not cached, can't resolve it offline")
+            return entry["data"]
+
+        headers = github_headers()
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = (session or requests).get(url, headers=headers)
+        if response.status_code == 304 and entry:
+            return entry["data"]
+        response.raise_for_status()
+
+        data = response.json()
+        entry = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "data": data,
+        }
+        write_atomic(self._path(url), json.dumps(entry).encode())
+        return data
+
+
+# Release metadata requested by any deploy in this machine
+release_cache = ReleaseMetadataCache()
+
+
+def get_release(
+    repo: str,
+    version: str | None = "latest",
+    offline: bool | None = None,
+    session: requests.Session | None = None,
+) -> dict:
+    """Release information from the GitHub API, or the local cache"""
+    return release_cache.fetch(
+        get_release_url(repo, version), is_offline(offline), session=session
+    )
+
+
+def asset_cache_key(repo: str, asset: dict) -> str:
+    """Assets are identified by their digest when GitHub provides it, or their id"""
+    return asset.get("digest") or f"{repo}#{asset['id']}"
+
+
+def asset_sha256(asset: dict) -> str | None:
+    algorithm, _, digest = (asset.get("digest") or "").partition(":")
+    return digest if algorithm == "sha256" else None
+
+
+def resolution_key(
+    repo: str, version: str | None, system_info: dict, asset_pattern: str | None
+) -> str:
+    """Download cache key of the asset chosen for a release and a platform"""
+    return "resolved:" + json.dumps(
+        [repo, version or "latest", *platform_key(system_info), asset_pattern]
+    )
 
 
-def get_system_info() -> dict:
+def cached_asset(resolution: str) -> tuple[dict, Path] | None:
+    """The asset recorded under `resolution` and its file, when both are cached"""
+    record_path = download_cache.get(resolution)
+    if record_path is None:
+        return None
+    try:
+        record = json.loads(record_path.read_text())
+    except json.JSONDecodeError:
+        return None
+    local_path = download_cache.get(record["key"])
+    return (record, local_path) if local_path else None
+
+
+def release_sha256(
+    release_data: dict, asset: dict, session: requests.Session | None = None
+) -> str | None:
     """
-    Get current system's architecture and OS information.
-    Returns a dict with normalized platform information.
+    Expected sha256 of an asset, from GitHub's digest or from the checksum files
+    published in the release (`<asset>.sha256`, `checksums.txt`...)
     """
-    arch_map = {
-        "x86_64": ["x86_64", "x64", "amd64"],
-        "aarch64": ["arm64", "aarch64", "arm"],
-        "i386": ["386", "i386", "x86"],
-    }
-
-    os_map = {
-        "Linux": ["linux", "ubuntu", "debian"],
-        "Darwin": ["darwin", "mac", "macos"],
-        "Windows": ["windows", "win"],
-    }
-
-    system = platform.system()
-    machine = platform.machine().lower()
-
-    # Determine architecture
-    detected_arch = None
-    for arch, variants in arch_map.items():
-        if any(variant in machine for variant in variants):
-            detected_arch = arch
-            break
-
-    return {
-        "os": system,
-        "os_patterns": os_map.get(system, []),
-        "arch": detected_arch or machine,
-        "arch_patterns": next(
-            (
-                patterns
-                for arch, patterns in arch_map.items()
-                if any(variant in machine for variant in patterns)
-            ),
-            [],
-        ),
-        "is_64bit": sys.maxsize > 2**32,
-    }
-
-
-# import hunter
-
-
-# @hunter.wrap()
-def score_asset(asset_name: str, system_info: dict) -> int:
+    if digest := asset_sha256(asset):
+        return digest
+
+    name = asset["name"]
+    candidates = []
+    for other in release_data["assets"]:
+        other_name = other["name"]
+        if other_name in {f"{name}.sha256", f"{name}.sha256sum"}:
+            candidates.insert(0, other)
+        elif re.search(r"checksums|sha256sums|sha256\.sum", other_name, re.I):
+            candidates.append(other)
+
+    for candidate in candidates:
+        response = (session or requests).get(
+            candidate["browser_download_url"], headers=github_headers()
+        )
+        if not response.ok:
+            continue
+        if sha256 := download.parse_sha256(response.text, name):
+            return sha256
+    return None
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def safe_member_path(name: str) -> PurePosixPath | None:
+    """Archive member name as a relative path, None if it would escape the output"""
+    path = PurePosixPath(posixpath.normpath(name))
+    if path.is_absolute() or path.parts[:1] == ("..",) or str(path) == ".":
+        return None
+    return path
+
+
+def write_member(source: BinaryIO, dest: Path, mode: int) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with dest.open("wb") as dest_file:
+        shutil.copyfileobj(source, dest_file, CHUNK_SIZE)
+    if mode:
+        dest.chmod(mode & 0o777)
+
+
+def iter_archive(archive: Path, asset_name: str):
     """
-    Score an asset based on how well it matches the current system.
-    Higher score means better match.
+    Yields (member path, file object, mode) for every regular file in a tar or
+    zip archive, reading tar files as a stream.
     """
-    name = asset_name.lower()
-    score = 0
-
-    # Check OS match
-    if any(os_pattern in name for os_pattern in system_info["os_patterns"]):
-        score += 100
+    if asset_name.endswith(".zip"):
+        with zipfile.ZipFile(archive) as zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir():
+                    continue
+                with zip_file.open(info) as member:
+                    yield info.filename, member, info.external_attr >> 16
+    else:
+        with tarfile.open(archive, "r|*") as tar:
+            for info in tar:
+                if not info.isfile():
+                    continue
+                yield info.name, tar.extractfile(info), info.mode
 
-    # Check architecture match
-    if any(arch_pattern in name for arch_pattern in system_info["arch_patterns"]):
-        score += 50
-    elif system_info["is_64bit"] and "64" in name:
-        score += 30
 
-    # Prefer certain formats
-    if system_info["os"] == "Windows" and name.endswith(".zip"):
-        score += 10
-    elif system_info["os"] in ["Linux", "Darwin"] and name.endswith(".tar.gz"):
-        score += 10
+def extract_release_asset(
+    archive: Path, asset_name: str, output_path: Path, binary_pattern: str | None
+) -> Path:
+    """
+    Writes the files of a release asset that match `binary_pattern` (or all of them
+    if there's no pattern) into `output_path`, without extracting anything else.
+    """
+    if not asset_name.endswith((".zip", *TAR_SUFFIXES)):
+        # Direct binary download
+        if binary_pattern and binary_pattern not in asset_name:
+            raise ValueError("No suitable binaries found in the release assets")
+        dest = output_path / asset_name
+        with archive.open("rb") as source:
+            write_member(source, dest, 0o755)
+        return dest
+
+    found = None
+    for name, member, mode in iter_archive(archive, asset_name):
+        path = safe_member_path(name)
+        if path is None:
+            continue
+        if binary_pattern:
+            # A file named exactly like the pattern wins over e.g. its man page
+            if path.name == binary_pattern:
+                dest = output_path / path.name
+                write_member(member, dest, mode)
+                return dest
+            if found is None and binary_pattern in path.name:
+                found = output_path / path.name
+                write_member(member, found, mode)
+        else:
+            write_member(member, output_path.joinpath(*path.parts), mode)
+            found = output_path
 
-    return score
+    if found is None:
+        raise ValueError("No suitable binaries found in the release assets")
+    return found
 
 
 def download_release_binary(
@@ -87,9 +271,14 @@ def download_release_binary(
     version: str | None = "latest",
     output_dir: str = "downloads",
     binary_pattern: str | None = None,
+    offline: bool | None = None,
+    session: requests.Session | None = None,
+    asset_pattern: str | None = None,
+    system_info: dict | None = None,
 ) -> Path:
     """
-    Download and extract binaries from GitHub release assets using a temporary directory.
+    Download and extract binaries from GitHub release assets, streaming the archive
+    and writing only the files that are needed.
     Automatically selects the most appropriate binary for the current system.
 
     Args:
@@ -97,56 +286,52 @@ def download_release_binary(
         version: Release version (e.g., "v1.0.0", "latest")
         output_dir: Directory to save the final binary files
         binary_pattern: Optional pattern to match binary files (e.g., '*.exe' or 'program')
+        offline: Use only cached releases and assets, defaults to $PYSETMEUP_OFFLINE
+        session: requests session to reuse connections between downloads
+        asset_pattern: Optional glob to pin the asset of the release (e.g. '*musl*')
+        system_info: Platform to download for, defaults to this machine (see
+            `get_system_info` and `system_info_of`)
 
     Returns:
         Path: Path to the extracted binary file or directory
 
     Raises:
         ValueError: If repo format is invalid or no suitable assets are found
+        LookupError: If running offline and the release or asset are not cached
     """
     # Validate and parse repo format
     if "/" not in repo:
         raise ValueError('Repository must be in format "owner/repo"')
-    owner, repo_name = repo.split("/", 1)
 
     # Create output directory if it doesn't exist
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
     # Get system information
-    system_info = get_system_info()
-
-    # Construct GitHub API URL
-    if version == "latest":
-        release_url = (
-            f"https://api.github.com/repos/{owner}/{repo_name}/releases/latest"
-        )
+    system_info = system_info or get_system_info()
+
+    # The asset of a pinned version doesn't change, so it's used without asking
+    # the API. The latest release is checked, unless the API can't be reached
+    resolution = resolution_key(repo, version, system_info, asset_pattern)
+    cached = cached_asset(resolution)
+    if cached and (version not in {None, "latest"} or is_offline(offline)):
+        release_data = None
     else:
-        # Remove 'v' prefix if present for consistency
-        version = version.lstrip("v")
-        release_url = (
-            f"https://api.github.com/repos/{owner}/{repo_name}/releases/tags/v{version}"
+        try:
+            release_data = get_release(repo, version, offline=offline, session=session)
+        except (requests.RequestException, LookupError):
+            if cached is None:
+                raise
+            release_data = None
+    if release_data is None:
+        record, local_path = cached
+        print(f"Using cached {record['name']}")
+        return extract_release_asset(
+            local_path, record["name"], output_path, binary_pattern
         )
 
-    # Get release information
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        # Add GitHub token if needed:
-        # "Authorization": f"token {os.environ['GITHUB_TOKEN']}"
-    }
-
-    response = requests.get(release_url, headers=headers)
-    response.raise_for_status()
-    release_data = response.json()
-
     # Score and sort assets
-    scored_assets = [
-        (asset, score_asset(asset["name"], system_info))
-        for asset in release_data["assets"]
-        if asset["content_type"]
-        in ["application/x-gzip", "application/zip", "application/octet-stream"]
-    ]
-    scored_assets.sort(key=lambda x: x[1], reverse=True)
+    scored_assets = get_matcher(system_info, asset_pattern).rank(release_data["assets"])
 
     if not scored_assets:
         raise ValueError("No suitable release assets found for your system")
@@ -155,52 +340,146 @@ def download_release_binary(
         f"Selected asset: {scored_assets[0][0]['name']} (score: {scored_assets[0][1]})"
     )
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-        asset = scored_assets[0][0]
+    asset = scored_assets[0][0]
+
+    # Download the asset to the cache, unless some other deploy already did
+    asset_url = asset["browser_download_url"]
+    cache_key = asset_cache_key(repo, asset)
+    local_path = download_cache.get(cache_key)
+    if local_path is None:
+        if is_offline(offline):
+            raise LookupError(
+                f"{asset['name']} is not cached, can't download it offline"
+            )
+        print(f"Downloading {asset_url}...")
+        partial = download.fetch(
+            asset_url,
+            download_cache.partial_path(cache_key),
+            session=session,
+            headers=github_headers(),
+        )
+        local_path = download_cache.adopt(
+            cache_key,
+            partial,
+            sha256=release_sha256(release_data, asset, session=session),
+        )
+    else:
+        print(f"Using cached {asset['name']}")
 
-        # Download the asset to temp directory
-        asset_url = asset["browser_download_url"]
-        local_path = temp_path / asset["name"]
+    record = {"name": asset["name"], "key": cache_key}
+    if cached is None or cached[0] != record:
+        download_cache.put(resolution, [json.dumps(record).encode()])
+    return extract_release_asset(local_path, asset["name"], output_path, binary_pattern)
 
-        print(f"Downloading {asset_url}...")
-        response = requests.get(asset_url, headers=headers, stream=True)
-        response.raise_for_status()
 
-        local_path.write_bytes(response.content)
+@dataclass
+class ReleaseDownload:
+    """Outcome of each tool downloaded by `download_release_binaries`"""
 
-        # Extract the archive in temp directory
-        extract_path = temp_path / "extracted"
-        extract_path.mkdir(exist_ok=True)
+    repo: str
+    path: Path | None = None
+    error: Exception | None = None
+    seconds: float = 0.0
 
-        if asset["name"].endswith(".tar.gz"):
-            with tarfile.open(local_path, "r:gz") as tar:
-                tar.extractall(extract_path)
-        elif asset["name"].endswith(".zip"):
-            with zipfile.ZipFile(local_path, "r") as zip_ref:
-                zip_ref.extractall(extract_path)
-        elif not binary_pattern:  # Direct binary download
-            shutil.copy2(local_path, output_path / local_path.name)
-            return output_path / local_path.name
 
-        # Find and copy the binary to the final output directory
-        if binary_pattern:
-            for file_path in extract_path.rglob("*"):
-                if binary_pattern in file_path.name and file_path.is_file():
-                    dest = output_path / file_path.name
-                    shutil.copy2(file_path, dest)
-                    return dest
-        else:
-            # If no pattern specified, copy all files to output directory
-            for file_path in extract_path.rglob("*"):
-                if file_path.is_file():
-                    rel_path = file_path.relative_to(extract_path)
-                    dest = output_path / rel_path
-                    dest.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(file_path, dest)
-            return output_path
-
-    raise ValueError("No suitable binaries found in the release assets")
+def pooled_session(max_workers: int) -> requests.Session:
+    """Session that keeps a connection per worker, to share between threads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_release_binaries(
+    tools: list[str | dict],
+    output_dir: str = "downloads",
+    max_workers: int = 8,
+    offline: bool | None = None,
+) -> list[ReleaseDownload]:
+    """
+    Downloads many release binaries concurrently, sharing a pool of connections.
+
+    Args:
+        tools: "owner/repo" strings or dicts with the arguments of
+            `download_release_binary` (repo, version, binary_pattern)
+        output_dir: Directory to save the final binary files
+        max_workers: How many tools are resolved and downloaded at the same time
+        offline: Use only cached releases and assets, defaults to $PYSETMEUP_OFFLINE
+
+    Returns:
+        A ReleaseDownload per tool, in the same order. Failures are reported in
+        the `error` field instead of stopping the other downloads.
+    """
+    session = pooled_session(max_workers)
+
+    def fetch_one(tool: str | dict) -> ReleaseDownload:
+        arguments = {"repo": tool} if isinstance(tool, str) else dict(tool)
+        arguments.setdefault("output_dir", output_dir)
+        result = ReleaseDownload(repo=arguments["repo"])
+        started = time.perf_counter()
+        try:
+            result.path = download_release_binary(
+                **arguments, offline=offline, session=session
+            )
+        except Exception as error:
+            result.error = error
+        result.seconds = time.perf_counter() - started
+        return result
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch_one, tools))
+
+
+def platform_key(system_info: dict) -> tuple[str, str, str | None]:
+    """What release assets depend on: (os, arch, libc)"""
+    return (system_info["os"], system_info["arch"], system_info["libc"])
+
+
+@dataclass
+class PlatformBinary:
+    """Release binary downloaded by `download_release_binary_for_platforms`"""
+
+    tag: str
+    path: Path
+
+
+def download_release_binary_for_platforms(
+    repo: str,
+    system_infos: list[dict],
+    version: str | None = "latest",
+    output_dir: str = "downloads",
+    binary_pattern: str | None = None,
+    offline: bool | None = None,
+    max_workers: int = 8,
+) -> dict[tuple[str, str, str | None], PlatformBinary]:
+    """
+    Downloads the release binary once for each distinct platform in `system_infos`
+    (e.g. the `system_info_of` of every host), concurrently.
+
+    Returns:
+        The tag of the release and the binary of each `platform_key`, extracted in
+        ``<output_dir>/<os>-<arch>-<libc>``
+    """
+    platforms = {platform_key(info): info for info in system_infos}
+    tag = get_release(repo, version, offline=offline)["tag_name"]
+
+    session = pooled_session(max_workers)
+
+    def fetch_platform(key: tuple[str, str, str | None]) -> PlatformBinary:
+        path = download_release_binary(
+            repo,
+            version=version,
+            output_dir=str(Path(output_dir, "-".join(str(part) for part in key))),
+            binary_pattern=binary_pattern,
+            offline=offline,
+            session=session,
+            system_info=platforms[key],
+        )
+        return PlatformBinary(tag, path)
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(platforms, pool.map(fetch_platform, platforms)))
 
 
 # Example usage
@@ -2,6 +2,7 @@
 Ensures that all the lima VMs are in SSH
 """
 
+from pyinfra.api import deploy
 from pyinfra.operations import python
 from pyinfra.local import shell
 
@@ -13,4 +14,10 @@ def lima_machines(state, host):
     _out = shell(commands=["limactl ls --json | yq -pj '.name' -o t"], splitlines=True)
 
 
-python.call(name="Find lima machines", function=lima_machines)
+@deploy("Lima machines in SSH")
+def deploy():
+    python.call(name="Find lima machines", function=lima_machines)
+
+
+if __name__ in {"builtins", "__main__"}:
+    deploy()
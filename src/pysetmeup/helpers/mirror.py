@@ -0,0 +1,265 @@
+"""
+Controller side mirror of the tools that are installed with ``curl ... | sh``.
+
+Instead of having every host download the installer and whatever it downloads, the
+controller fetches them once and pushes them to the hosts:
+
+- Tools published as GitHub release binaries are resolved for the platform of each
+  host, downloaded once per platform and the binary is pushed, unless the host
+  already has the same version (`push_release_binary`).
+- Otherwise the installer script is downloaded once, pinned by its sha256 in
+  ``<cache>/mirror/pins.json`` and pushed to the host, where it runs.
+
+Everything is kept in the download cache, so once warmed the mirror works offline.
+"""
+
+import functools
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+from pyinfra import host, logger, state
+from pyinfra.operations import files, server
+
+from pysetmeup.facts import BinaryVersion, host_profile
+from pysetmeup.helpers.assets import system_info_of
+from pysetmeup.helpers.cache import cache_home, write_atomic
+from pysetmeup.helpers.github import (
+    PlatformBinary,
+    download_cache,
+    download_release_binary,
+    download_release_binary_for_platforms,
+    is_offline,
+    platform_key,
+)
+
+
+@dataclass(frozen=True)
+class Tool:
+    binary: str
+    # Installer run in the host when there's no release binary for it
+    installer: str
+    # GitHub repository whose releases have the binary
+    repo: str | None = None
+    shell: str = "sh"
+    arguments: str = ""
+
+
+TOOLS = {
+    "rclone": Tool("rclone", "https://rclone.org/install.sh", repo="rclone/rclone"),
+    "direnv": Tool("direnv", "https://direnv.net/install.sh", repo="direnv/direnv"),
+    "gh": Tool("gh", "https://webi.sh/gh", repo="cli/cli"),
+    "starship": Tool(
+        "starship",
+        "https://starship.rs/install.sh",
+        repo="starship/starship",
+        arguments="--bin-dir $HOME/.local/bin/ --yes",
+    ),
+    "fish": Tool("fish", "https://webi.sh/fish"),
+    "linuxbrew": Tool(
+        "brew",
+        "https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh",
+        shell="bash",
+    ),
+}
+
+
+def mirror_home() -> Path:
+    return cache_home() / "mirror"
+
+
+def load_pins() -> dict[str, str]:
+    try:
+        return json.loads((mirror_home() / "pins.json").read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def mirror_installer(
+    url: str, refresh: bool = False, offline: bool | None = None
+) -> Path:
+    """
+    Local copy of an installer script. It's downloaded only the first time (or when
+    `refresh` is set) and must match its pinned sha256 afterwards.
+    """
+    key = f"installer:{url}"
+    pins = load_pins()
+    cached = download_cache.get(key)
+    if cached and not refresh:
+        if pins.get(url, cached.name) != cached.name:
+            raise ValueError(f"{url} doesn't match its pinned sha256 {pins[url]}")
+        return cached
+    if is_offline(offline):
+        raise LookupError(f"{url} is not mirrored, can't download it offline")
+
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    path = download_cache.put(key, [response.content])
+    if url in pins and pins[url] != path.name:
+        logger.warning(f"{url} changed, pinning the new sha256 {path.name}")
+    pins[url] = path.name
+    write_atomic(mirror_home() / "pins.json", json.dumps(pins, indent=2).encode())
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def _mirror_binary(
+    name: str,
+    os: str,
+    arch: str,
+    libc: str | None,
+    is_64bit: bool,
+    offline: bool | None,
+) -> Path:
+    tool = TOOLS[name]
+    arguments = dict(
+        repo=tool.repo,
+        output_dir=str(mirror_home() / "bin" / name / f"{os}-{arch}-{libc}"),
+        binary_pattern=tool.binary,
+        system_info={"os": os, "arch": arch, "libc": libc, "is_64bit": is_64bit},
+    )
+    try:
+        return download_release_binary(**arguments, offline=offline)
+    except requests.ConnectionError:
+        # Use what's already mirrored
+        return download_release_binary(**arguments, offline=True)
+
+
+def mirror_binary(name: str, profile: dict, offline: bool | None = None) -> Path:
+    """
+    Local copy of the release binary of a tool for the platform of a host, it's
+    downloaded and extracted once per platform.
+    """
+    info = system_info_of(profile)
+    return _mirror_binary(
+        name, info["os"], info["arch"], info["libc"], info["is_64bit"], offline
+    )
+
+
+# Release binaries resolved in this run, by (repo, binary, version, platform)
+_resolved: dict[tuple, PlatformBinary] = {}
+
+
+def release_binaries(
+    repo: str, binary: str | None = None, version: str | None = "latest"
+) -> dict[tuple, PlatformBinary]:
+    """
+    The release binary for the platform of every active host (and the current one),
+    downloaded once per (os, arch, libc) the first time it's needed.
+    """
+    hosts = {other.name: other for other in state.inventory.get_active_hosts()}
+    hosts[host.name] = host
+    infos = {}
+    for other in hosts.values():
+        # Not as the _su_user of the deploy, it would be gathered again for it
+        info = system_info_of(host_profile(other, _su_user=None, _sudo=False))
+        infos[platform_key(info)] = info
+
+    missing = [
+        info
+        for key, info in infos.items()
+        if (repo, binary, version, key) not in _resolved
+    ]
+    if missing:
+        arguments = dict(
+            repo=repo,
+            system_infos=missing,
+            version=version,
+            output_dir=str(mirror_home() / "bin" / (binary or repo.rsplit("/", 1)[-1])),
+            binary_pattern=binary,
+        )
+        try:
+            downloaded = download_release_binary_for_platforms(**arguments)
+        except requests.ConnectionError:
+            # Use what's already mirrored
+            downloaded = download_release_binary_for_platforms(
+                **arguments, offline=True
+            )
+        for key, resolved in downloaded.items():
+            _resolved[(repo, binary, version, key)] = resolved
+    return {key: _resolved[(repo, binary, version, key)] for key in infos}
+
+
+def version_matches(tag: str, output: str | None) -> bool:
+    """Whether the `--version` output of a binary is the one of the release `tag`"""
+    version = tag.lstrip("v")
+    pattern = rf"(?<![\d.]){re.escape(version)}(?![\d.])"
+    return bool(output) and re.search(pattern, output) is not None
+
+
+def push_release_binary(
+    repo: str,
+    dest: str,
+    binary: str | None = None,
+    version: str | None = "latest",
+    version_flag: str = "--version",
+    user: str | None = None,
+    sudo: bool = False,
+    name: str | None = None,
+) -> None:
+    """
+    Installs the GitHub release binary of `repo` for the platform of the current host
+    in `dest`, unless it's already there with the same version.
+
+    The binary is resolved and downloaded in the controller, once for all the hosts
+    with the same (os, arch, libc), and pyinfra pushes it to them in parallel.
+    """
+    profile = host_profile(host, _su_user=None, _sudo=False)
+    key = platform_key(system_info_of(profile))
+    resolved = release_binaries(repo, binary, version)[key]
+    installed = host.get_fact(BinaryVersion, path=dest, flag=version_flag, _sudo=sudo)
+    if version_matches(resolved.tag, installed):
+        host.noop(f"{dest} is already {resolved.tag}")
+        return
+    files.put(
+        name=name or f"Install {binary or repo} {resolved.tag}",
+        src=str(resolved.path),
+        dest=dest,
+        mode="755",
+        user=user,
+        _sudo=sudo,
+    )
+
+
+def push_tool(
+    name: str, bin_dir: str | None = None, user: str | None = None, sudo: bool = False
+) -> None:
+    """
+    Installs a tool in the current host from the mirror: its binary in `bin_dir`
+    when it's available (owned by `user`), otherwise runs its installer as `user`.
+    """
+    tool = TOOLS[name]
+    if tool.repo and bin_dir:
+        try:
+            release_binaries(tool.repo, tool.binary)
+        except (ValueError, LookupError, requests.RequestException) as error:
+            logger.warning(
+                f"Can't mirror the {name} binary ({error}), using its installer"
+            )
+        else:
+            push_release_binary(
+                tool.repo,
+                f"{bin_dir}/{tool.binary}",
+                binary=tool.binary,
+                user=user,
+                sudo=sudo,
+                name=f"Install {name} from the mirror",
+            )
+            return
+
+    script = mirror_installer(tool.installer)
+    remote_script = f"/tmp/pysetmeup-install-{name}.sh"
+    files.put(
+        name=f"Upload the {name} installer",
+        src=str(script),
+        dest=remote_script,
+        mode="644",
+    )
+    server.shell(
+        name=f"Run the {name} installer",
+        commands=[f"{tool.shell} {remote_script} {tool.arguments}".strip()],
+        _su_user=user,
+        _sudo=sudo,
+    )
@@ -0,0 +1,197 @@
+"""
+Per host record of the parts that were deployed, to skip them when nothing changed.
+
+Each part decorated with `skip_unchanged` computes a fingerprint from its version
+(by default a hash of its source), its arguments, the host data it reads and the
+parts of the `HostProfile` it depends on. The fingerprints are kept in the host in
+``~/.cache/pysetmeup/state.json``, read once per deploy with the `DeployLedger`
+fact and written once, after the last operation of the deploy, to the hosts whose
+operations succeeded. When the fingerprint matches the part is skipped without
+gathering any other fact or evaluating its operations.
+
+Run with ``--data force=true`` (or ``PYSETMEUP_FORCE=1``) to deploy everything
+again, or ``--data force=fish,direnv`` for some parts.
+
+.. code:: python
+
+    @deploy("Install git")
+    @skip_unchanged(profile_keys=("commands.git",))
+    def deploy(): ...
+"""
+
+import functools
+import hashlib
+import inspect
+import io
+import json
+import os
+import posixpath
+from pathlib import Path
+from types import ModuleType
+
+from pyinfra import host, logger, state
+from pyinfra.api import FactBase, Host, StringCommand
+from pyinfra.api.state import BaseStateCallback
+
+from pysetmeup.facts import host_profile
+
+LEDGER_PATH = ".cache/pysetmeup/state.json"
+
+# Parts of the host profile every fingerprint depends on
+PROFILE_KEYS = ("os", "arch", "libc", "family", "user", "home")
+
+# The ledger belongs to the connecting user, even for parts run with _su_user/_sudo
+AS_CONNECTING_USER = {"_su_user": None, "_sudo": False}
+
+# Ledger of each host as updated in this run
+_ledgers: dict[str, dict[str, str]] = {}
+
+
+class DeployLedger(FactBase):
+    """
+    Fingerprints of the parts deployed in the host, by part name.
+
+    .. code:: python
+
+        {"pysetmeup.parts.git.deploy": "5f1c...", ...}
+    """
+
+    @staticmethod
+    def default() -> dict:
+        return {}
+
+    def command(self) -> str:
+        return f"cat ~/{LEDGER_PATH} 2>/dev/null || true"
+
+    def process(self, output) -> dict:
+        try:
+            ledger = json.loads("\n".join(output))
+        except json.JSONDecodeError:
+            return {}
+        return ledger if isinstance(ledger, dict) else {}
+
+
+def save(host: Host, home: str) -> None:
+    """Writes the ledger of `host` as the connecting user, without any fact"""
+    path = f"{home}/{LEDGER_PATH}"
+    host.run_shell_command(StringCommand("mkdir", "-p", posixpath.dirname(path)))
+    content = json.dumps(_ledgers[host.name], indent=2, sort_keys=True)
+    host.put_file(io.BytesIO(content.encode()), path)
+
+
+class LedgerWriter(BaseStateCallback):
+    """Saves the changed ledgers once the last operation of the deploy is applied"""
+
+    def __init__(self):
+        # Home of the connecting user of each host whose ledger changed
+        self.homes: dict[str, str] = {}
+
+    def operation_end(self, state, op_hash):
+        op_order = state.get_op_order()
+        if op_order and op_hash == op_order[-1]:
+            self.write(state)
+
+    def write(self, state) -> None:
+        # Failed hosts aren't active, their parts are deployed again the next time
+        for active in state.inventory.get_active_hosts():
+            if active.name in self.homes:
+                save(active, self.homes.pop(active.name))
+
+
+_writers: dict[int, LedgerWriter] = {}
+
+
+def get_writer() -> LedgerWriter:
+    """The ledger writer of the current pyinfra state, registered the first time"""
+    if id(state) not in _writers:
+        writer = LedgerWriter()
+        state.add_callback_handler(writer)
+        _writers[id(state)] = writer
+    return _writers[id(state)]
+
+
+def profile_value(profile: dict, key: str):
+    """Entry of the profile named by a dotted `key`, e.g. ``commands.git``"""
+    value = profile
+    for name in key.split("."):
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+def fingerprint(part: str, version: str, inputs: dict, profile: dict) -> str:
+    payload = {"part": part, "version": version, "inputs": inputs, "profile": profile}
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def is_forced(part: str, module: str) -> bool:
+    """Whether the part must be deployed anyway, `force` can name it or its module"""
+    force = host.data.get("force") or os.environ.get("PYSETMEUP_FORCE", "")
+    if isinstance(force, bool) or str(force).lower() in {"1", "true", "yes"}:
+        return bool(force)
+    names = {name.strip() for name in str(force).split(",")}
+    return bool(names & {part, module, module.rsplit(".", 1)[-1]})
+
+
+def skip_unchanged(
+    version: str | None = None,
+    profile_keys: tuple[str, ...] = (),
+    data_keys: tuple[str, ...] = (),
+    depends_on: tuple[ModuleType | str, ...] = (),
+):
+    """
+    Skips the decorated part when it was already deployed in the host with the same
+    `version` (defaults to a hash of its source and the source of the `depends_on`
+    modules or files, i.e. the parts it calls), arguments, `data_keys` of the host data and
+    `profile_keys` of the `HostProfile` (on top of `PROFILE_KEYS`). Profile keys can be
+    dotted to name a single entry, e.g. ``commands.git`` so the part is deployed again
+    when git is removed from the host.
+    """
+
+    def decorator(function):
+        part = f"{function.__module__}.{function.__qualname__}"
+        if version:
+            part_version = version
+        else:
+            sources = [inspect.getsource(function)]
+            sources += [
+                Path(module).read_text()
+                if isinstance(module, str)
+                else inspect.getsource(module)
+                for module in depends_on
+            ]
+            part_version = hashlib.sha256("\n".join(sources).encode()).hexdigest()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = host_profile(host, **AS_CONNECTING_USER)
+            inputs = {
+                "args": args,
+                "kwargs": kwargs,
+                "data": {key: host.data.get(key) for key in data_keys},
+            }
+            relevant = {
+                key: profile_value(profile, key) for key in PROFILE_KEYS + profile_keys
+            }
+            current = fingerprint(part, part_version, inputs, relevant)
+
+            if host.name not in _ledgers:
+                _ledgers[host.name] = dict(
+                    host.get_fact(DeployLedger, **AS_CONNECTING_USER)
+                )
+            ledger = _ledgers[host.name]
+            if ledger.get(part) == current and not is_forced(part, function.__module__):
+                logger.info(
+                    f"{host.name}: {part} unchanged since the last deploy, skipping"
+                )
+                return None
+
+            result = function(*args, **kwargs)
+            ledger[part] = current
+            get_writer().homes[host.name] = profile["home"]
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,13 +1,13 @@
 # pyinfra deploy.py <hostname>
-from pyinfra.operations import server
-
-
-server.shell(
-    name="Set linuxbrew",
-    commands=[
-        """
-        bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"
-        """
-    ],
-    _su_user="nahuel",
-)
+from pyinfra.api import deploy
+
+from pysetmeup.helpers.mirror import push_tool
+
+
+@deploy("Install linuxbrew")
+def deploy(user: str = "nahuel"):
+    push_tool("linuxbrew", user=user)
+
+
+if __name__ in {"builtins", "__main__"}:
+    deploy()
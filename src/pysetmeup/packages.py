@@ -0,0 +1,109 @@
+"""
+Package installation shared by all the parts.
+
+Parts declare what they need with a ``packages(profile)`` function that returns
+names from `PACKAGE_NAMES`, and install them with `install`. A setup that runs many
+parts can call `plan` first, so everything is installed in a single transaction
+(refreshing the package index once) and the parts' own `install` calls become
+no-ops:
+
+    packages.plan(git, mosh, fish)
+    git.deploy()
+    mosh.deploy()
+    fish.deploy()
+"""
+
+from types import ModuleType
+
+from pyinfra import host
+from pyinfra.operations import apk, apt, brew, dnf, server
+
+from pysetmeup.facts import host_profile
+from pysetmeup.helpers.cache import is_offline
+
+# Name of each package in each family, when it's the same everywhere it's not listed.
+# None means the package is not needed (or not available) in that family.
+PACKAGE_NAMES: dict[str, dict[str, str | None]] = {
+    "development-tools": {
+        "RedHat": "@development",
+        "Debian": "build-essential",
+        "Alpine": "build-base",
+        "Darwin": None,
+    },
+    "ncurses-devel": {"Debian": "libncurses-dev", "Alpine": "ncurses-dev"},
+    "pcre2-devel": {"Debian": "libpcre2-dev", "Alpine": "pcre2-dev"},
+    "python3-devel": {"Debian": "python3-dev", "Alpine": "python3-dev"},
+    "gettext-devel": {"Debian": "gettext", "Alpine": "gettext-dev"},
+    "which": {"Debian": "debianutils", "Darwin": None},
+    "lvm2": {"Darwin": None},
+}
+
+# Packages installed in this run, per host
+_installed: dict[str, set[str]] = {}
+# Hosts whose package index was already refreshed in this run
+_refreshed: set[str] = set()
+
+
+def family_of(profile: dict) -> str | None:
+    return "Darwin" if profile["os"] == "Darwin" else profile["family"]
+
+
+def distro_names(packages: list[str], family: str) -> list[str]:
+    """Maps the names used by the parts to the names in `family`"""
+    names = []
+    for package in packages:
+        name = PACKAGE_NAMES.get(package, {}).get(family, package)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def install(packages: list[str], name: str | None = None) -> None:
+    """
+    Installs `packages` in the current host with a single transaction, skipping
+    the ones already installed by a previous `install` or `plan` in this run.
+    """
+    installed = _installed.setdefault(host.name, set())
+    missing = [package for package in packages if package not in installed]
+    if not missing:
+        return
+
+    profile = host_profile(host)
+    family = family_of(profile)
+    names = distro_names(missing, family)
+    name = name or f"Install {', '.join(names)}"
+    # Offline (e.g. deploying from a bundle) the packages were installed beforehand
+    refresh = host.name not in _refreshed and not is_offline()
+
+    if family == "RedHat":
+        if refresh:
+            server.shell(name="Refresh dnf metadata", commands=["dnf makecache -q"])
+        dnf.packages(name=name, packages=names)
+    elif family == "Debian":
+        apt.packages(name=name, packages=names, update=refresh)
+    elif family == "Alpine":
+        apk.packages(name=name, packages=names, update=refresh)
+    elif family == "Darwin":
+        brew.packages(name=name, packages=names, update=refresh)
+    else:
+        raise LookupError(
+            f"Don't know how to install packages in {profile['linux_name']}"
+        )
+
+    _refreshed.add(host.name)
+    installed.update(missing)
+
+
+def plan(*parts: ModuleType) -> None:
+    """
+    Installs what all `parts` (modules with a `packages(profile)` function) need,
+    in a single transaction per host.
+    """
+    profile = host_profile(host)
+    needed: list[str] = []
+    for part in parts:
+        for package in part.packages(profile):
+            if package not in needed:
+                needed.append(package)
+    if needed:
+        install(needed, name="Install the packages of the selected parts")
@@ -5,8 +5,12 @@ from pyinfra.api import deploy
 from pyinfra.operations import files
 from textwrap import dedent
 
+from pysetmeup.blocks import block
+from pysetmeup.ledger import skip_unchanged
+
 
 @deploy(name="Create ~/.bashrc.d directory")
+@skip_unchanged(data_keys=("user",))
 def deploy():
     user = host.data.get("user", getpass.getuser())
 
@@ -17,10 +21,11 @@ def deploy():
         _su_user=user,
     )
 
-    files.block(
-        name="Ensure ~/.bashrc sources all the files in ~/.bashrc.d/*",
-        path=f"/home/{user}/.bashrc",
-        content=dedent(
+    # Ensure ~/.bashrc sources all the files in ~/.bashrc.d/*
+    block(
+        f"/home/{user}/.bashrc",
+        "bashrc.d",
+        dedent(
             """
             if [ -d ~/.bashrc.d ]; then
                     for file in ~/.bashrc.d/*; do
@@ -29,5 +34,5 @@ def deploy():
             fi
             """
         ),
-        _su_user=user,
+        user=user,
     )
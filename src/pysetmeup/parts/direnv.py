@@ -1,20 +1,35 @@
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts.server import Which, Command, Kernel
 from pyinfra.operations import server
 
+from pysetmeup.facts import host_profile, user_home, user_shell
+from pysetmeup.helpers.mirror import mirror_binary, push_tool
+from pysetmeup.ledger import skip_unchanged
+
+# direnv hooks itself in ~/.bashrc.d
+REQUIRES = ("bashrc_d_directory",)
+KIND = "download"
+
+
+def prepare(profile):
+    if not profile["commands"]["direnv"] and profile["os"] == "Linux":
+        mirror_binary("direnv", profile)
+
 
 @deploy(name="direnv environment manager")
+@skip_unchanged(data_keys=("user",), profile_keys=("commands.direnv", "shell"))
 def deploy(user: str = None):
     user = host.data.get("user", None)
-    kernel = kernel = host.get_fact(Kernel)
+    profile = host_profile(host)
+    kernel = profile["os"]
     # Install
-    if not host.get_fact(Which, "direnv"):
+    if not profile["commands"]["direnv"]:
         if kernel == "Linux":
             # Install Linux
-            server.shell(
-                "curl -sfL https://direnv.net/install.sh | bash", _su_user=user
-            )
+            if user:
+                push_tool("direnv", f"{user_home(profile, user)}/.local/bin", user=user)
+            else:
+                push_tool("direnv", "/usr/local/bin")
         elif kernel == "Darwin":
             server.shell("brew install direnv")
 
@@ -22,9 +37,7 @@ def deploy(user: str = None):
     if kernel == "Linux":
         if user:
             server.shell("direnv hook bash > $HOME/.bashrc.d/direnv.sh", _su_user=user)
-            *_, default_shell = host.get_fact(
-                Command, command="printenv SHELL", _su_user=user
-            ).split("/")
+            *_, default_shell = (user_shell(profile, user) or "").split("/")
             if default_shell == "fish":
                 server.shell(
                     "direnv hook fish > ~/.config/fish/conf.d/direnv.fish",
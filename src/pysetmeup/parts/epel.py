@@ -1,22 +1,37 @@
 # https://docs.fedoraproject.org/en-US/epel/getting-started/
 # dnf config-manager --set-enabled crb && dnf install https://dl.fedoraproject.org/pub/epel/epel{,-next}-release-latest-9.noarch.rpm
+from pyinfra import host
 from pyinfra.operations import server
 from pyinfra.operations import dnf
 from pyinfra.api import deploy
 
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
+
 
 @deploy("Install EPEL")
+@skip_unchanged(profile_keys=("packages.epel-release", "packages.epel-next-release"))
 def install_epel_repositories():
+    profile = host_profile(host)
+    if profile["family"] != "RedHat":
+        # Required by parts whose packages are only in EPEL there
+        host.noop("EPEL only applies to RedHat")
+        return
+
     server.shell(
         name="Set up EPEL 1/3",
         commands=["dnf config-manager --set-enabled crb || true"],
     )
 
-    dnf.rpm(
-        name="Setup EPEL 2/3",
-        src="https://dl.fedoraproject.org/pub/epel/epel-release-latest-9.noarch.rpm",
-    )
-    dnf.rpm(
-        name="Setup EPEL 2/3",
-        src="https://dl.fedoraproject.org/pub/epel/epel-next-release-latest-9.noarch.rpm",
-    )
+    # Already installed, e.g. from an offline bundle
+    installed = profile["packages"]
+    if "epel-release" not in installed:
+        dnf.rpm(
+            name="Setup EPEL 2/3",
+            src="https://dl.fedoraproject.org/pub/epel/epel-release-latest-9.noarch.rpm",
+        )
+    if "epel-next-release" not in installed:
+        dnf.rpm(
+            name="Setup EPEL 3/3",
+            src="https://dl.fedoraproject.org/pub/epel/epel-next-release-latest-9.noarch.rpm",
+        )
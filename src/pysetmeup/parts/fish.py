@@ -2,43 +2,76 @@ from pyinfra import host
 from pyinfra.api import deploy
 
 
-from pyinfra.facts.server import LinuxName, Which, Command
-from pyinfra.operations import dnf, server, apt, apk
+from pyinfra.operations import server
 from pyinfra.operations import files, git
 
+from pysetmeup import packages as package_manager
+from pysetmeup.blocks import block
+from pysetmeup.facts import host_profile
+from pysetmeup.helpers.artifacts import FISH_VERSION, find_artifact
+from pysetmeup.helpers.mirror import push_tool
+from pysetmeup.ledger import skip_unchanged
+
+# Needed to build fish from source in RedHat
+BUILD_PACKAGES = [
+    "development-tools",
+    "cmake",
+    "ncurses-devel",
+    "pcre2-devel",
+    "python3-devel",
+    "gettext-devel",
+    "which",
+    "git",
+]
+
+
+def needs_install(profile, version="3.6.0") -> bool:
+    installed_version = profile["fish_version"] or ""
+    return not profile["commands"]["fish"] or installed_version < version
+
+
+def packages(profile, version="3.6.0") -> list[str]:
+    if not needs_install(profile, version):
+        return []
+    if profile["family"] == "RedHat":
+        return [] if find_artifact("fish", FISH_VERSION, profile) else BUILD_PACKAGES
+    if profile["family"] in {"Debian", "Alpine"}:
+        return ["fish"]
+    return []
+
 
 @deploy(name="Install Fish 🐟 shell")
+@skip_unchanged(profile_keys=("commands.fish", "fish_version", "uid"))
 def deploy(version="3.6.0", user=None):
-    install = True
-    fish_location = host.get_fact(Which, command="fish")
-    if fish_location:
-        *_, installed_version = host.get_fact(Command, command="fish --version").split(
-            " "
-        )
-
-        if installed_version >= version:
-            install = False
+    profile = host_profile(host)
+    fish_location = profile["commands"]["fish"]
 
-    linux_name = host.get_fact(LinuxName)
-    if install:
-        if host.get_fact(LinuxName) == "RedHat":
-            server.shell('dnf groupinstall -y "Development Tools"')
-            dnf.packages(
-                [
-                    "cmake",
-                    "ncurses-devel",
-                    "pcre2-devel",
-                    "python3-devel",
-                    "gettext-devel",
-                    "which",
-                    "git",
+    linux_name = profile["family"]
+    if needs_install(profile, version):
+        artifact = find_artifact("fish", FISH_VERSION, profile)
+        if artifact:
+            files.put(
+                name=f"Upload prebuilt fish {FISH_VERSION}",
+                src=str(artifact),
+                dest=f"/tmp/fish-{FISH_VERSION}.tar.gz",
+            )
+            server.shell(
+                name=f"Unpack prebuilt fish {FISH_VERSION}",
+                commands=[
+                    f"tar -xzf /tmp/fish-{FISH_VERSION}.tar.gz -C /usr/local && "
+                    f"rm /tmp/fish-{FISH_VERSION}.tar.gz"
                 ],
             )
+            fish_location = "/usr/local/bin/fish"
+        elif linux_name == "RedHat":
+            package_manager.install(
+                BUILD_PACKAGES, name="Install fish build dependencies"
+            )
             files.directory("/src")
             git.repo(
                 "https://github.com/fish-shell/fish-shell.git",
                 "/src/fish-shell",
-                branch="3.7.0",
+                branch=FISH_VERSION,
             )
             # Compile and install
             server.shell(
@@ -49,24 +82,16 @@ def deploy(version="3.6.0", user=None):
                     "make install"
                 ],
             )
-        elif linux_name == "Debian":
-            apt.packages(["fish"])
-        elif linux_name == "Alpine":
-            apk.packages(["fish"])
+            fish_location = "/usr/local/bin/fish"
+        elif linux_name in {"Debian", "Alpine"}:
+            package_manager.install(["fish"], name="Install fish")
         else:
-            server.shell(
-                name="Install Recent version of fish 🐟 using WebInstaller for user",
-                commands=["curl -sS https://webi.sh/fish | sh"],
-                _su_user=user,
-            )
-    if not user:
+            # Recent version of fish 🐟 using WebInstaller for user
+            push_tool("fish", user=user)
+    if not user and fish_location:
         # We assume that installation is not in a specific user
         # so we put fish into the available shells
-        files.block(
-            path="/etc/shells",
-            content=fish_location,
-            _su_user="root",
-        )
+        block("/etc/shells", "fish", fish_location, sudo=profile["uid"] != 0)
 
 
 if __name__ in {"builtins", "__main__"}:
@@ -1,27 +1,26 @@
 from pyinfra import host
-from pyinfra.operations import server
-from pyinfra.operations import dnf
 from pyinfra.api import deploy
-from pyinfra.facts.server import LinuxName, Which
 from logging import getLogger
 
+from pysetmeup import packages as package_manager
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
+
 logger = getLogger(__name__)
 
+# In RedHat the package is only in EPEL
+REQUIRES = ("epel",)
+
+
+def packages(profile) -> list[str]:
+    if profile["commands"]["fzf"]:
+        return []
+    if profile["family"] not in {"RedHat", "Debian", "Alpine"}:
+        raise LookupError(f"Can't find fzf for {profile['family']}")
+    return ["fzf"]
+
 
 @deploy("Install fzf")
+@skip_unchanged(profile_keys=("commands.fzf",))
 def install():
-    linux_name = host.get_fact(LinuxName)
-    if not host.get_fact(Which, command="fzf"):
-        return
-
-    if linux_name in {"RedHat", "CentOS"}:
-        dnf.packages(
-            name="Install fzf",
-            packages=["fzf"],
-            # update=True,
-        )
-    elif linux_name == "Debian":
-        server.apt.update()
-        server.apt.packages(packages=["fzf"])
-    else:
-        raise LookupError(f"Can't find unzip for {linux_name}")
+    package_manager.install(packages(host_profile(host)), name="Install fzf")
@@ -1,14 +1,24 @@
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts.server import Which
-from pyinfra.operations import server
+
+from pysetmeup.facts import host_profile
+from pysetmeup.helpers.mirror import mirror_binary, push_tool
+from pysetmeup.ledger import skip_unchanged
+
+KIND = "download"
+
+
+def prepare(profile):
+    if not profile["commands"]["gh"]:
+        mirror_binary("gh", profile)
 
 
 @deploy(name="Install github CLI")
+@skip_unchanged(profile_keys=("commands.gh",))
 def deploy():
-    gh_location = host.get_fact(Which, "gh")
-    if not gh_location:
-        server.shell("curl -sS https://webi.sh/gh | sh")
+    profile = host_profile(host)
+    if not profile["commands"]["gh"]:
+        push_tool("gh", f"{profile['home']}/.local/bin")
 
 
 if __name__ in {"builtins", "__main__"}:
@@ -1,25 +1,18 @@
-from pyinfra.operations import apt, dnf, apk, server
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts.server import LinuxName, Which
+
+from pysetmeup import packages as package_manager
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
+
+
+def packages(profile) -> list[str]:
+    if profile["commands"]["git"] or not package_manager.family_of(profile):
+        return []
+    return ["git"]
 
 
 @deploy("Install git")
+@skip_unchanged(profile_keys=("commands.git",))
 def deploy():
-    if not host.get_fact(Which, command="git"):
-        return
-
-    if host.get_fact(LinuxName) == "RedHat":
-        dnf.packages(
-            name="Install git",
-            packages=["git"],
-            # update=True,
-        )
-    elif host.fact.os == "Darwin":
-        server.shell(name="Install git via Homebrew", commands=["brew install git"])
-    elif host.fact.os_family == "Alpine":
-        apk.packages(name="Install git", packages=["git"])
-    elif host.fact.os_family == "RedHat":
-        dnf.packages(name="Install git", packages=["git"])
-    elif host.fact.os_family == "Debian":
-        apt.packages(name="Install git", packages=["git"])
+    package_manager.install(packages(host_profile(host)), name="Install git")
@@ -27,10 +27,13 @@ import json
 from typing import TypedDict
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts.server import LinuxName, Command
+from pyinfra.facts.server import Command
 from pyinfra.operations import server
 from pyinfra import logger
 
+from pysetmeup import packages as package_manager
+from pysetmeup.facts import host_profile
+
 
 class BlockdeviceChildDict(TypedDict):
     name: str
@@ -58,26 +61,28 @@ class LsblkDict(TypedDict):
     blockdevices: list[BlockdeviceDict]
 
 
-@deploy(name="Install LVM in RedHat")
-def deploy_lvm_in_redhat():
-    if (
-        host.get_fact(Command, command="rpm -qa | grep lvm2 || echo missing")
-        == "missing"
-    ):
-        server.dnf.packages("lvm2")
+def packages(profile) -> list[str]:
+    if "lvm2" in profile["packages"] or profile["family"] not in {"RedHat", "Debian"}:
+        return []
+    return ["lvm2"]
+
+
+def install_lvm2():
+    needed = packages(host_profile(host))
+    if needed:
+        package_manager.install(needed, name="Install lvm2")
     else:
         logger.info("lmv2 already present")
 
 
+@deploy(name="Install LVM in RedHat")
+def deploy_lvm_in_redhat():
+    install_lvm2()
+
+
 @deploy(name="Install LVM in Debian")
 def deploy_lvm_in_debian():
-    if (
-        host.get_fact(Command, command="dpkg -l | grep lvm2 || echo missing")
-        == "missing"
-    ):
-        server.apt.packages("lvm2")
-    else:
-        logger.info("lmv2 already present")
+    install_lvm2()
 
 
 def get_vgcreate_devices() -> list[BlockdeviceDict]:
@@ -103,7 +108,7 @@ def get_vgcreate_devices() -> list[BlockdeviceDict]:
 
 @deploy(name="Install LVM and ensure a VG is available")
 def deploy():
-    linux_name = host.get_fact(LinuxName)
+    linux_name = host_profile(host)["family"]
     if not linux_name:
         logger.warning("Can't install LVM in non linux OS")
         return
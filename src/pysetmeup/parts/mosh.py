@@ -1,24 +1,24 @@
 from pyinfra.api import deploy
 from pyinfra import host
-from pyinfra.operations import dnf, apt
-from pyinfra.facts.server import LinuxName, Which
+
+from pysetmeup import packages as package_manager
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
+
+# In RedHat the package is only in EPEL
+REQUIRES = ("epel",)
+
+
+def packages(profile) -> list[str]:
+    if profile["commands"]["mosh"] or profile["family"] not in {"RedHat", "Debian"}:
+        return []
+    return ["mosh"]
 
 
 @deploy(name="Install mosh")
+@skip_unchanged(profile_keys=("commands.mosh",))
 def deploy():
-    if not host.get_fact(Which, command="mosh"):
-        return
-
-    if host.get_fact(LinuxName) == "RedHat":
-        dnf.packages(
-            name="Install mosh shell",
-            packages=["mosh"],
-        )
-    elif host.get_fact(LinuxName) == "Debian":
-        apt.packages(
-            name="Install mosh shell",
-            packages=["mosh"],
-        )
+    package_manager.install(packages(host_profile(host)), name="Install mosh shell")
 
 
 if __name__ in ("__main__", "builtins"):
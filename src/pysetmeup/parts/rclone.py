@@ -1,24 +1,33 @@
 from pyinfra import host
-from pyinfra.operations import server
 from pyinfra.api import deploy
-from pyinfra.facts.server import Which, Command, User
 from logging import getLogger
-from . import unzip
+from pysetmeup.facts import host_profile
+from pysetmeup.helpers.mirror import mirror_binary, push_tool
+from pysetmeup.ledger import skip_unchanged
 
 logger = getLogger(__name__)
 
+# The installer needs unzip when the release binary can't be used, the scheduler
+# deploys it first
+REQUIRES = ("unzip",)
+KIND = "download"
+
+
+def prepare(profile):
+    if not profile["commands"]["rclone"]:
+        mirror_binary("rclone", profile)
+
 
 @deploy("Install rclone")
+@skip_unchanged(profile_keys=("commands.rclone", "uid"))
 def install():
     """Install rclone"""
-    if host.get_fact(Which, command="rclone"):
+    profile = host_profile(host)
+    if profile["commands"]["rclone"]:
         return
-    unzip.install()
-    user = host.get_fact(User)
-    id = host.get_fact(Command, "id -u")
 
-    if user == "root" or id == "0":
-        prefix = ""
-    else:
-        prefix = "sudo"
-    server.shell(f"curl https://rclone.org/install.sh | {prefix} bash")
+    push_tool(
+        "rclone",
+        bin_dir="/usr/bin",
+        sudo=not (profile["user"] == "root" or profile["uid"] == 0),
+    )
@@ -1,32 +1,24 @@
 from pyinfra import host
-from pyinfra.operations import server
-from pyinfra.operations import dnf
 from pyinfra.api import deploy
-from pyinfra.facts.server import LinuxName, Which
 from logging import getLogger
 
+from pysetmeup import packages as package_manager
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
+
 logger = getLogger(__name__)
 
 
+def packages(profile) -> list[str]:
+    if profile["commands"]["unzip"]:
+        return []
+    if profile["family"] not in {"RedHat", "Alpine", "Debian"}:
+        raise LookupError(f"Can't find unzip for {profile['family']}")
+    return ["unzip"]
+
+
 @deploy("Install unzip")
+@skip_unchanged(profile_keys=("commands.unzip",))
 def install():
     """Install unzip"""
-    if host.get_fact(Which, command="unzip"):
-        return
-
-    linux_name = host.get_fact(LinuxName)
-    if linux_name in {"RedHat", "CentOS"}:
-        if not host.get_fact(Which, command="unzip"):
-            dnf.packages(
-                name="Install unzip",
-                packages=["unzip"],
-                # update=True,
-            )
-    elif linux_name == "Alpine":
-        server.apk.update(packages=["unzip"])
-        server.apk.packages()
-    elif linux_name == "Debian":
-        server.apt.update()
-        server.apt.packages(packages=["unzip"])
-    else:
-        raise LookupError(f"Can't find unzip for {linux_name}")
+    package_manager.install(packages(host_profile(host)), name="Install unzip")
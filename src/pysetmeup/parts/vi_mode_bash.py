@@ -1,10 +1,11 @@
-import io
 from textwrap import dedent
 
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts.server import Command, Home, User
-from pyinfra.operations import files
+
+from pysetmeup.blocks import block
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
 
 CONTENT = dedent(
     """
@@ -24,23 +25,20 @@ CONTENT = dedent(
 
 
 @deploy(name="Set Ctrl+L mode in bash once you're in vi mode")
+@skip_unchanged()
 def deploy():
     """
 
     Source: https://unix.stackexchange.com/questions/104094/is-there-any-way-to-enable-ctrll-to-clear-screen-when-set-o-vi-is-set
     """
-    home = host.get_fact(Home)
-    user = host.get_fact(User)
-    path = f"{home}/.inputrc"
-    file_status = host.get_fact(Command, command=f'test -f {path} || echo "MISSING"')
-    if file_status == "MISSING":
-        inputrc = ""
-    else:
-        inputrc = host.get_fact(Command, command=f"cat {path}")
-    if not inputrc or CONTENT not in inputrc:
-        new_content = f"{inputrc}\n{CONTENT}"
-        src = io.StringIO(new_content)
-        files.put(src=src, dest=path, user=user)
+    profile = host_profile(host)
+    # Left alone if CONTENT is already there, e.g. written by previous versions
+    block(
+        f"{profile['home']}/.inputrc",
+        "vi mode clear screen",
+        CONTENT,
+        user=profile["user"],
+    )
 
     # files.block(
     #     path=f"{home}/.inputrc",
@@ -1,21 +1,24 @@
 from pyinfra import host
 from pyinfra.api import deploy
-from pyinfra.facts import server as server_facts
 
 
 from pyinfra.operations import apt, yum, apk, brew
-from pyinfra.facts import server
+
+from pysetmeup.facts import host_profile
+from pysetmeup.ledger import skip_unchanged
 
 
 @deploy("yq")
+@skip_unchanged(profile_keys=("commands.yq", "os_release"))
 def install():
     # Detect the operating system
-    os = host.get_fact(server.LinuxDistribution)
+    profile = host_profile(host)
+    os = profile["os_release"]
 
-    if host.get_fact(server_facts.Which, "yq"):
+    if profile["commands"]["yq"]:
         return
 
-    if host.get_fact(server_facts.Os) == "Darwin":
+    if profile["os"] == "Darwin":
         # MacOS installation using Homebrew
         brew.packages(
             name="Install yq via Homebrew",
@@ -23,7 +26,7 @@ def install():
         )
 
     elif os:
-        distribution = os.get("name", "").lower()
+        distribution = os.get("ID", "").lower()
 
         if distribution in ["debian", "ubuntu", "raspbian"]:
             apt.packages(
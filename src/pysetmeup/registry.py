@@ -0,0 +1,91 @@
+"""
+Registry of the parts, resolved lazily by name.
+
+Parts are declared as entry points of the ``pysetmeup.parts`` group (see
+pyproject.toml), so other packages can add their own. Listing them only reads
+package metadata, and loading one imports its module and nothing else:
+
+    from pysetmeup import registry
+
+    registry.names()  # ["bashrc_d_directory", "direnv", ...]
+    registry.load("fish")()  # inside a pyinfra deploy
+    registry.closure(["rclone"])  # ["unzip", "rclone"], from their REQUIRES
+
+Editable installs only refresh their metadata when they're reinstalled, so the parts
+declared in the pyproject.toml of a source checkout are read from it directly.
+"""
+
+import functools
+import importlib
+from collections.abc import Callable, Iterable
+from graphlib import TopologicalSorter
+from importlib.metadata import EntryPoint, entry_points
+from pathlib import Path
+from types import ModuleType
+
+GROUP = "pysetmeup.parts"
+
+PYPROJECT = Path(__file__).parents[2] / "pyproject.toml"
+
+
+def checkout_entry_points() -> dict[str, EntryPoint]:
+    """Parts declared in the pyproject.toml of the source checkout, if any"""
+    if not PYPROJECT.is_file():
+        return {}
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11
+        import tomli as tomllib
+
+    pyproject = tomllib.loads(PYPROJECT.read_text())
+    declared = pyproject.get("project", {}).get("entry-points", {}).get(GROUP, {})
+    return {name: EntryPoint(name, value, GROUP) for name, value in declared.items()}
+
+
+@functools.cache
+def parts() -> dict[str, EntryPoint]:
+    """Entry point of every part, by name"""
+    found = checkout_entry_points()
+    found.update((entry.name, entry) for entry in entry_points(group=GROUP))
+    return dict(sorted(found.items()))
+
+
+def names() -> list[str]:
+    return list(parts())
+
+
+def entry(name: str) -> EntryPoint:
+    try:
+        return parts()[name]
+    except KeyError:
+        raise LookupError(
+            f"Unknown part {name!r}, expected one of {', '.join(names())}"
+        ) from None
+
+
+def load(name: str) -> Callable[..., object]:
+    """The deploy function of the part `name`, importing only its module"""
+    return entry(name).load()
+
+
+def module(name: str) -> ModuleType:
+    """The module of the part `name`"""
+    return importlib.import_module(entry(name).module)
+
+
+def requires(name: str) -> tuple[str, ...]:
+    """Parts that `name` needs, declared with a ``REQUIRES`` tuple in its module"""
+    return tuple(getattr(module(name), "REQUIRES", ()))
+
+
+def closure(selected: Iterable[str]) -> list[str]:
+    """`selected` and every part they require, each after the parts it requires"""
+    graph: dict[str, tuple[str, ...]] = {}
+    pending = list(selected)
+    while pending:
+        name = pending.pop()
+        if name not in graph:
+            graph[name] = requires(name)
+            pending.extend(graph[name])
+    return list(TopologicalSorter(graph).static_order())
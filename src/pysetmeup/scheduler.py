@@ -0,0 +1,214 @@
+"""
+Dependency aware scheduling of parts.
+
+Parts declare the parts they need with a module level ``REQUIRES`` tuple, and can
+have a ``prepare(profile)`` function for the slow work done in the controller
+(downloading release binaries, building artifacts...). The scheduler builds a DAG
+of the selected parts and:
+
+- Runs the ``prepare`` of every part for the host concurrently, limited by `kind`
+  (e.g. one build and four downloads at the time).
+- Runs each part once, after the parts it requires. pyinfra applies the operations
+  of a host one after the other, so this is a topological order.
+- Times the operations of each part while they are applied, and logs the critical
+  path (the longest chain of dependent parts) once the deploy finishes.
+
+.. code:: python
+
+    Scheduler([Part.from_module(direnv), Part.from_module(bashrc_d_directory)]).run()
+    Scheduler(Part.from_registry(name) for name in registry.closure(["rclone"])).run()
+"""
+
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from graphlib import CycleError, TopologicalSorter
+from types import ModuleType
+
+from pyinfra import host, logger, state
+from pyinfra.api.state import BaseStateCallback
+
+from pysetmeup import registry
+from pysetmeup.facts import host_profile
+
+# How many prepare functions of each kind run at the same time
+DEFAULT_LIMITS = {"build": 1, "download": 4, "default": 8}
+
+
+@dataclass
+class Part:
+    name: str
+    run: Callable[[], object]
+    requires: tuple[str, ...] = ()
+    prepare: Callable[[dict], object] | None = None
+    kind: str = "default"
+
+    @classmethod
+    def from_module(cls, module: ModuleType, entry: str = "deploy", **kwargs) -> "Part":
+        """Part from a module of `pysetmeup.parts`, named like the module"""
+        return cls(
+            name=module.__name__.rsplit(".", 1)[-1],
+            run=getattr(module, entry),
+            requires=getattr(module, "REQUIRES", ()),
+            prepare=getattr(module, "prepare", None),
+            kind=getattr(module, "KIND", "default"),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_registry(cls, name: str, **kwargs) -> "Part":
+        """Part resolved by its name in `pysetmeup.registry`"""
+        module = registry.module(name)
+        return cls(
+            name=name,
+            run=registry.load(name),
+            requires=getattr(module, "REQUIRES", ()),
+            prepare=getattr(module, "prepare", None),
+            kind=getattr(module, "KIND", "default"),
+            **kwargs,
+        )
+
+
+def critical_path(
+    parts: Iterable[Part], durations: dict[str, float]
+) -> tuple[list[str], float]:
+    """The chain of dependent parts that takes the longest, and its duration"""
+    parts = {part.name: part for part in parts}
+    longest: dict[str, tuple[float, list[str]]] = {}
+    for name in TopologicalSorter(
+        {name: part.requires for name, part in parts.items()}
+    ).static_order():
+        before = max(
+            (
+                longest[required]
+                for required in parts[name].requires
+                if required in longest
+            ),
+            default=(0.0, []),
+            key=lambda item: item[0],
+        )
+        longest[name] = (before[0] + durations.get(name, 0.0), before[1] + [name])
+    seconds, path = max(longest.values(), default=(0.0, []), key=lambda item: item[0])
+    return path, seconds
+
+
+class PartTimer(BaseStateCallback):
+    """Adds up the time each host spends applying the operations of each part"""
+
+    def __init__(self):
+        self.parts: dict[str, dict[str, Part]] = {}
+        self.op_parts: dict[tuple[str, str], str] = {}
+        self.started: dict[tuple[str, str], float] = {}
+        self.durations: dict[str, dict[str, float]] = {}
+
+    def track(self, host_name: str, parts: list[Part], op_parts: dict[str, str]):
+        self.parts[host_name] = {part.name: part for part in parts}
+        for op_hash, part in op_parts.items():
+            self.op_parts[(host_name, op_hash)] = part
+
+    def operation_host_start(self, state, host, op_hash):
+        self.started[(host.name, op_hash)] = time.perf_counter()
+
+    def operation_host_success(self, state, host, op_hash, retry_count=0):
+        key = (host.name, op_hash)
+        if key in self.started and key in self.op_parts:
+            elapsed = time.perf_counter() - self.started.pop(key)
+            durations = self.durations.setdefault(host.name, {})
+            part = self.op_parts[key]
+            durations[part] = durations.get(part, 0.0) + elapsed
+
+    def operation_host_error(self, state, host, op_hash, retry_count=0, max_retries=0):
+        self.operation_host_success(state, host, op_hash)
+
+    def operation_end(self, state, op_hash):
+        op_order = state.get_op_order()
+        if op_order and op_hash == op_order[-1]:
+            self.report()
+
+    def report(self) -> None:
+        for host_name, parts in self.parts.items():
+            path, seconds = critical_path(
+                parts.values(), self.durations.get(host_name, {})
+            )
+            logger.info(
+                f"{host_name}: critical path {' -> '.join(path)} ({seconds:.1f}s)"
+            )
+
+
+_timers: dict[int, PartTimer] = {}
+
+
+def get_timer() -> PartTimer:
+    """The timer of the current pyinfra state, registered the first time"""
+    if id(state) not in _timers:
+        timer = PartTimer()
+        state.add_callback_handler(timer)
+        _timers[id(state)] = timer
+    return _timers[id(state)]
+
+
+class Scheduler:
+    def __init__(self, parts: Iterable[Part], limits: dict[str, int] | None = None):
+        self.parts = {part.name: part for part in parts}
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        for part in self.parts.values():
+            missing = set(part.requires) - set(self.parts)
+            if missing:
+                raise ValueError(f"{part.name} requires {', '.join(sorted(missing))}")
+
+    def order(self) -> list[Part]:
+        """Parts after the ones they require"""
+        graph = {name: part.requires for name, part in self.parts.items()}
+        try:
+            return [
+                self.parts[name] for name in TopologicalSorter(graph).static_order()
+            ]
+        except CycleError as error:
+            raise ValueError(f"Circular requirements between {error.args[1]}") from None
+
+    def levels(self) -> list[list[Part]]:
+        """Groups of parts that don't depend on each other"""
+        sorter = TopologicalSorter(
+            {name: part.requires for name, part in self.parts.items()}
+        )
+        sorter.prepare()
+        levels = []
+        while sorter.is_active():
+            ready = sorted(sorter.get_ready())
+            levels.append([self.parts[name] for name in ready])
+            sorter.done(*ready)
+        return levels
+
+    def prepare(self, profile: dict) -> None:
+        """Runs the prepare function of the parts concurrently, limited by kind"""
+        slots = {
+            kind: threading.BoundedSemaphore(limit)
+            for kind, limit in self.limits.items()
+        }
+
+        def prepare(part: Part) -> None:
+            with slots.get(part.kind, slots["default"]):
+                try:
+                    part.prepare(profile)
+                except Exception as error:
+                    # The part will do the work itself
+                    logger.warning(f"Couldn't prepare {part.name}: {error}")
+
+        preparing = [part for part in self.parts.values() if part.prepare]
+        if not preparing:
+            return
+        with ThreadPoolExecutor(max_workers=len(preparing)) as pool:
+            list(pool.map(prepare, preparing))
+
+    def run(self) -> None:
+        """Prepares and runs the parts in the current host, timing each of them"""
+        self.prepare(host_profile(host))
+        op_parts = {}
+        for part in self.order():
+            before = len(host.op_hash_order)
+            part.run()
+            for op_hash in host.op_hash_order[before:]:
+                op_parts[op_hash] = part.name
+        get_timer().track(host.name, list(self.parts.values()), op_parts)
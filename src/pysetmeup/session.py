@@ -0,0 +1,98 @@
+"""
+Many deploys and inventories in a single pyinfra run.
+
+``pyinfra <inventory> <module.function>`` runs a single deploy, so running several
+of them means starting pyinfra, connecting and gathering the facts once for each.
+`write_session` writes an inventory that combines many inventories and a deploy file
+that calls every selected deploy, so they're all run by the same pyinfra process
+sharing its connections and facts:
+
+    inventory, deploy = write_session(
+        ["pysetmeup.parts.git.deploy", "pysetmeup.parts.fish.deploy"],
+        "inventory.py,@lima/dev-*",
+        directory,
+    )
+    # pyinfra <inventory> <deploy>
+"""
+
+import importlib
+import runpy
+from collections.abc import Iterable
+from pathlib import Path
+
+# Group of the hosts given directly instead of in an inventory file
+HOSTS_GROUP = "hosts"
+
+
+def split_inventories(inventories: str | Iterable[str]) -> list[str]:
+    """Inventory files and hosts (or connectors) in a comma separated list"""
+    if isinstance(inventories, str):
+        inventories = inventories.split(",")
+    return [inventory.strip() for inventory in inventories if inventory.strip()]
+
+
+def load_inventories(inventories: str | Iterable[str]) -> dict[str, list | tuple]:
+    """
+    Groups of hosts of every inventory, as in a pyinfra inventory file. Groups with
+    the same name in many inventories are merged.
+    """
+    groups: dict[str, tuple[list, dict]] = {}
+    for inventory in split_inventories(inventories):
+        if Path(inventory).is_file():
+            found = {
+                name: value
+                for name, value in runpy.run_path(inventory).items()
+                if not name.startswith("_") and isinstance(value, (list, tuple))
+            }
+        else:
+            found = {HOSTS_GROUP: [inventory]}
+
+        for name, value in found.items():
+            # A group is a list of hosts or a (hosts, data) tuple
+            is_with_data = (
+                isinstance(value, tuple)
+                and len(value) == 2
+                and isinstance(value[1], dict)
+            )
+            hosts, data = value if is_with_data else (value, {})
+            merged_hosts, merged_data = groups.setdefault(name, ([], {}))
+            merged_hosts.extend(host for host in hosts if host not in merged_hosts)
+            merged_data.update(data)
+
+    return {
+        name: (hosts, data) if data else hosts for name, (hosts, data) in groups.items()
+    }
+
+
+def run_deploys(names: Iterable[str]) -> None:
+    """Calls the deploys named like ``package.module.function``, in order"""
+    for name in names:
+        module, _, function = name.rpartition(".")
+        getattr(importlib.import_module(module), function)()
+
+
+def write_session(
+    deploys: list[str], inventories: str | Iterable[str], directory: Path
+) -> tuple[Path, Path]:
+    """
+    Writes the inventory and deploy files to run all the `deploys` against all the
+    `inventories` in a single pyinfra run.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    resolved = [
+        str(Path(inventory).resolve()) if Path(inventory).is_file() else inventory
+        for inventory in split_inventories(inventories)
+    ]
+
+    inventory_file = directory / "inventory.py"
+    inventory_file.write_text(
+        "from pysetmeup.session import load_inventories\n\n"
+        f"globals().update(load_inventories({resolved!r}))\n"
+    )
+    deploy_file = directory / "deploy.py"
+    deploy_file.write_text(
+        "from pysetmeup.session import run_deploys\n\n"
+        f"run_deploys({list(deploys)!r})\n"
+    )
+    return inventory_file, deploy_file
@@ -0,0 +1,37 @@
+from pyinfra.api import deploy
+
+from pysetmeup import packages as package_manager
+from pysetmeup import registry
+from pysetmeup.scheduler import Part, Scheduler
+
+# Parts of the registry, the parts they require are deployed too
+REQUIRES = ("git", "mosh", "fzf", "unzip", "fish", "direnv", "vi_mode_bash")
+
+
+@deploy("Setup a basic development host")
+def deploy():
+    parts = [Part.from_registry(name) for name in registry.closure(REQUIRES)]
+    installing = [
+        part
+        for part in parts
+        if callable(getattr(registry.module(part.name), "packages", None))
+    ]
+    # A single package transaction for every part, after the parts it needs (e.g.
+    # EPEL, where mosh and fzf come from in RedHat)
+    names = {part.name for part in installing}
+    transaction = Part(
+        "packages",
+        lambda: package_manager.plan(
+            *[registry.module(part.name) for part in installing]
+        ),
+        requires=tuple(
+            sorted({name for part in installing for name in part.requires} - names)
+        ),
+    )
+    for part in installing:
+        part.requires += (transaction.name,)
+    Scheduler([*parts, transaction]).run()
+
+
+if __name__ in {"builtins", "__main__"}:
+    deploy()
@@ -1,4 +1,15 @@
+from pyinfra.api import deploy
+
 from pysetmeup.parts.epel import install_epel_repositories
 
+# Parts of the registry this setup deploys
+REQUIRES = ("epel",)
+
+
+@deploy("Setup a RHEL host")
+def deploy():
+    install_epel_repositories()
+
 
-install_epel_repositories()
+if __name__ in {"builtins", "__main__"}:
+    deploy()
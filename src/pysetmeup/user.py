@@ -3,20 +3,24 @@ from pyinfra.operations import server
 from pyinfra.operations import git
 from pyinfra.operations import files
 from pyinfra import host
-from pyinfra.facts.server import Command
 
 from pyinfra.api import deploy
+from pysetmeup import packages
+from pysetmeup.blocks import block, managed_blocks
+from pysetmeup.facts import host_profile
 from pysetmeup.parts import bashrc_d_directory, fish, direnv
+from pysetmeup.parts import git as git_part
+from pysetmeup.helpers.mirror import mirror_binary, push_tool
+from pysetmeup.ledger import skip_unchanged
+from pysetmeup.scheduler import Part, Scheduler
 
 
-@deploy("setup a user")
-def deploy():
-    user = host.data.get("user", getpass.getuser())
-    direnv.deploy()
-    bashrc_d_directory.deploy(user=user)
+def get_user() -> str:
+    return host.data.get("user", getpass.getuser())
 
-    fish.deploy(_su_user=user)
 
+def tmux_configuration():
+    user = get_user()
     git.repo(
         name="tmux configuration from gpakosz",
         src="https://github.com/gpakosz/.tmux.git",
@@ -40,9 +44,14 @@ def deploy():
         _su_user=user,
     )
 
+
+def fish_shell():
+    user = get_user()
+    fish.deploy(_su_user=user)
+
     # TODO: Should we do it only in interactive sessions like
     # in the ArchLinux wiki?
-    shell = host.get_fact(Command, "which fish")
+    shell = host_profile(host)["commands"]["fish"]
     server.user(
         name="Set the shell",
         user=user,
@@ -56,41 +65,75 @@ def deploy():
         _su_user=user,
     )
 
-    files.block(
-        name="Ensure ~/.local/bin is in the path",
-        path=f"/home/{user}/.config/fish/config.fish",
-        content=[f"fish_add_path /home/{user}/.local/bin"],
+    block(
+        f"/home/{user}/.config/fish/config.fish",
+        "local bin",
+        f"fish_add_path /home/{user}/.local/bin",
+        user=user,
     )
 
-    server.shell(
-        name="Install starship 🚀",
-        commands=[
-            'which starship || sh -c "$(curl -fsSL https://starship.rs/install.sh)" -- --bin-dir $HOME/.local/bin/ --yes',
-        ],
-        _su_user=user,
-    )
 
-    files.block(
-        name="Starship 🚀 shell initialization for fish 🐟",
-        content="starship init fish | source",
-        before=True,
-        line="end",
-        path=f"/home/{user}/.config/fish/config.fish",
-        _su_user=user,
-    )
+def prepare_starship(profile):
+    if not profile["commands"]["starship"]:
+        mirror_binary("starship", profile)
 
-    files.block(
-        name="Add sudo config file",
-        path=f"/etc/sudoers.d/sudo_{user}",
-        content=f"{user} ALL=(ALL) NOPASSWD: ALL",
+
+def starship():
+    user = get_user()
+    if not host_profile(host)["commands"]["starship"]:
+        # Install starship 🚀
+        push_tool("starship", f"/home/{user}/.local/bin", user=user)
+
+    # Starship 🚀 shell initialization for fish 🐟, inside `if status is-interactive`
+    block(
+        f"/home/{user}/.config/fish/config.fish",
+        "starship",
+        "starship init fish | source",
+        before=r"^end\b",
+        user=user,
     )
 
-    server.shell(
-        name="Set sudoers file permissions",
-        commands=f"chmod 0440 /etc/sudoers.d/sudo_{user}",
-        # sudo=True
+
+def sudoers():
+    user = get_user()
+    block(
+        f"/etc/sudoers.d/sudo_{user}",
+        "sudo",
+        f"{user} ALL=(ALL) NOPASSWD: ALL",
+        user="root",
+        mode="440",
     )
 
 
+PARTS = [
+    Part.from_module(bashrc_d_directory),
+    Part.from_module(direnv),
+    Part("tmux", tmux_configuration),
+    Part("fish", fish_shell),
+    Part(
+        "starship",
+        starship,
+        requires=("fish",),
+        prepare=prepare_starship,
+        kind="download",
+    ),
+    Part("sudoers", sudoers),
+]
+
+
+@deploy("setup a user")
+@skip_unchanged(
+    data_keys=("user",),
+    profile_keys=("commands", "fish_version"),
+    depends_on=(__file__, direnv, bashrc_d_directory, fish, git_part),
+)
+def deploy():
+    # A single package transaction for everything below
+    packages.plan(git_part, fish)
+    # A single read and write for each file edited by the parts
+    with managed_blocks():
+        Scheduler(PARTS, limits=host.data.get("scheduler_limits")).run()
+
+
 if __name__ in {"builtins", "__main__"}:
     deploy()
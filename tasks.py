@@ -13,12 +13,10 @@ with `./tasks.py`.
 # ]
 # ///
 
-import ast
 import subprocess
 import sys
-from io import StringIO
+import tempfile
 from pathlib import Path
-from textwrap import dedent
 
 from invoke import Context, Task, task
 from invoke.collection import Collection
@@ -39,72 +37,73 @@ def vm_up(ctx: Context, vm_name: str = "") -> None:
     ctx.run(f"limactl start {vm_name}")
 
 
-DOCKERFILE_CONTENTS = dedent(
-    """
-    # Dockerfile
-    FROM rockylinux:9 as builder
-
-    # Install build dependencies
-    RUN dnf groupinstall -y "Development Tools" && \
-        dnf install -y \
-        cmake \
-        ncurses-devel \
-        pcre2-devel \
-        python3-devel \
-        gettext-devel \
-        which \
-        git
-
-    # Clone and build fish
-    WORKDIR /src
-    RUN git clone https://github.com/fish-shell/fish-shell.git && \
-        cd fish-shell && \
-        git checkout 3.7.0 && \
-        cmake -DCMAKE_INSTALL_PREFIX=/usr/local . && \
-        make -j$(nproc)
-    """
+@task(
+    help={
+        "version": "fish version (git tag) to build",
+        "major": "RHEL major version, the build runs in rockylinux:<major>",
+        "arch": "Architecture as reported by uname -m",
+    }
 )
+def build_fish_in_rhel(ctx: Context, version="", major="9", arch="x86_64"):
+    """Builds fish once and stores it in the artifact cache used by fish.deploy"""
+    from pysetmeup.helpers.artifacts import FISH_VERSION, build_fish
 
+    path = build_fish(version or FISH_VERSION, major=major, arch=arch)
+    print(f"fish artifact stored in {path}")
 
-@task()
-def build_fish_in_rhel(ctx: Context):
-    ctx.run(
-        "docker build -f /dev/stdin -t fish_builder .",
-        in_stream=StringIO(DOCKERFILE_CONTENTS),
-    )
+
+@task(
+    help={
+        "setup": "Module of pysetmeup.setups to bundle",
+        "platform": "<distro><major>-<arch> of the hosts, e.g. el9-x86_64 (repeatable)",
+        "output": "Path of the archive",
+    },
+    iterable=["platform"],
+)
+def bundle(ctx: Context, setup="basicdev", platform=None, output=""):
+    """Builds an archive to deploy a setup without network, see run.sh"""
+    arguments = [setup] + [f"--platform={name}" for name in platform or ["el9-x86_64"]]
+    if output:
+        arguments.append(f"--output={output}")
+    ctx.run(f"uv run python -m pysetmeup.bundle {' '.join(arguments)}", pty=True)
+
+
+def ensure_pysetmeup() -> None:
+    """Makes pysetmeup importable even when invoke runs from uvx"""
+    try:
+        import pysetmeup  # noqa: F401
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+
+def deploy_index(where: str):
+    ensure_pysetmeup()
+    from pysetmeup.deploy_index import DeployIndex
+
+    return DeployIndex(Path(where))
 
 
 @task(
     autoprint=True,
+    help={
+        "where": "Directory of the pysetmeup package",
+        "details": "Adds the @deploy name, parameters and docstring, tab separated",
+    },
 )
-def list_deploys(ctx: Context, where="./src/pysetmeup", query="") -> str:
+def list_deploys(ctx: Context, where="./src/pysetmeup", query="", details=False) -> str:
     """Find all the @deploy decorated functions inside this module, helps"""
-    path = Path(where)
-
-    files = list(path.rglob("*.py"))
+    index = deploy_index(where)
+    deploys = index.update()
+    debug(f"Parsed {index.parsed} for {index.path}")
     output = []
-    for file in files:
-        debug(file)
-
-        with file.open("r") as f:
-            tree = ast.parse(f.read(), filename=file)
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                if not node.decorator_list:
-                    continue
-                try:
-                    decorators = {dec.func.id for dec in node.decorator_list}
-                except AttributeError:
-                    continue
-                if {"deploy"} & decorators:
-                    relative = file.relative_to(path)
-                    dotted = str(relative).replace("/", ".").removesuffix(".py")
-                    importable_name = f"pysetmeup.{dotted}.{node.name}"
-                    debug(f"{file=}")
-                    debug(f"{dotted=}")
-                    output.append(importable_name)
-                    continue
+    for entry in deploys:
+        if details:
+            summary = (entry.doc or "").strip().split("\n")[0]
+            output.append(
+                f"{entry.name}\t{entry.title or ''}\t({', '.join(entry.params)})\t{summary}"
+            )
+        else:
+            output.append(entry.name)
     return "\n".join(output)
 
 
@@ -117,21 +116,25 @@ def select(
     one_line: bool = False,
 ) -> str:
     """Selects a deploy using fzf"""
-    arguments = ""
+    arguments = ["fzf", "--delimiter", "\t", "--with-nth", "1,2"]
     if query:
-        arguments = f"{arguments} --query {query}"
+        arguments += ["--query", query]
     if multi:
-        arguments = f"{arguments} --multi"
+        arguments.append("--multi")
     if select_1:
-        arguments = f"{arguments} -1"
+        arguments.append("-1")
 
+    # The index is read in-process, no need to start another invoke for it
     fzf = subprocess.run(
-        f"uvx invoke list-deploys | fzf {arguments}",
-        shell=True,
+        arguments,
+        input=list_deploys(ctx, details=True),
         stdout=subprocess.PIPE,
+        text=True,
     )
 
-    selection = fzf.stdout.decode().strip()
+    selection = "\n".join(
+        line.split("\t", 1)[0] for line in fzf.stdout.strip().splitlines()
+    )
     if not selection:
         sys.exit("No task selected")
     if one_line:
@@ -142,7 +145,8 @@ def select(
 
 @task(
     help={
-        "inventory": "Where to run the commands, defaults to @local",
+        "inventory": "Where to run the commands, defaults to @local. Comma separated "
+        "inventory files and hosts with --session",
         "debug": "Enables pyinfra DEBUG",
         "yes": "Applies operations without confirmation",
         "operation_": "Operations to perform, if not provided will provide a list",
@@ -150,6 +154,10 @@ def select(
         "multiple": "Allows to select multiple operations using [Tab] the selector is displayed.",
         "uv_args": "Pass arguments to uv",
         "refresh": "Shorthand for --uv-args --isolated, to force refresh the code",
+        "force": "Deploy the parts even if the host's ledger says they're unchanged",
+        "session": "Runs all the operations in a single pyinfra run, sharing connections "
+        "and facts, instead of one run per operation",
+        "parallel": "Number of hosts pyinfra deploys to at the same time",
     }
 )
 def run_deploy(
@@ -162,6 +170,9 @@ def run_deploy(
     multiple=False,
     refresh=False,
     uv_args=[],
+    force=False,
+    session=False,
+    parallel=0,
 ) -> None:
     """Runs the operation by default in @local host, and the in"""
     if not operation_:
@@ -171,9 +182,27 @@ def run_deploy(
         arguments = f"{arguments} --debug"
     if yes:
         arguments = f"{arguments} --yes"
+    if force:
+        arguments = f"{arguments} --data force=true"
+    if parallel:
+        arguments = f"{arguments} --parallel {parallel}"
     if refresh and "--refresh" not in uv_args:
         uv_args.append("--refresh")
     uv_args_ = " ".join(uv_args)
+    if session:
+        ensure_pysetmeup()
+        from pysetmeup.session import write_session
+
+        with tempfile.TemporaryDirectory(prefix="pysetmeup-session-") as directory:
+            inventory_file, deploy_file = write_session(
+                operation_, inventory, Path(directory)
+            )
+            ctx.run(
+                f"uv tool run {uv_args_} --with . pyinfra {inventory_file} {deploy_file} "
+                f"{arguments}",
+                pty=True,
+            )
+        return
     for operation in operation_:
         ctx.run(
             f"uv tool run {uv_args_} --with . pyinfra {inventory} {operation} {arguments}",
@@ -0,0 +1,56 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from pysetmeup.facts import HostProfile
+from pysetmeup.helpers import artifacts
+from pysetmeup.parts import fish
+
+
+def rocky_profile(version_id="9.4", arch="aarch64"):
+    profile = HostProfile.default()
+    profile.update(os="Linux", family="RedHat", arch=arch)
+    profile["os_release"]["VERSION_ID"] = version_id
+    return profile
+
+
+def test_platform_of():
+    assert artifacts.platform_of(rocky_profile()) == "el9-aarch64"
+    assert artifacts.platform_of(rocky_profile("8.10", "x86_64")) == "el8-x86_64"
+
+    debian = HostProfile.default()
+    debian.update(family="Debian", arch="x86_64")
+    assert artifacts.platform_of(debian) is None
+
+
+def test_fish_skips_build_packages_when_the_artifact_exists(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    profile = rocky_profile()
+    assert fish.packages(profile) == fish.BUILD_PACKAGES
+
+    path = artifacts.artifact_path("fish", artifacts.FISH_VERSION, "el9-aarch64")
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"tarball")
+
+    assert artifacts.find_artifact("fish", artifacts.FISH_VERSION, profile) == path
+    assert fish.packages(profile) == []
+
+
+def test_fish_is_built_without_a_build_context(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append((command, kwargs))
+        if command[:2] == ["docker", "cp"]:
+            Path(command[-1]).write_bytes(b"tarball")
+        return SimpleNamespace(stdout="container\n")
+
+    monkeypatch.setattr(artifacts.subprocess, "run", run)
+    path = artifacts.build_fish(major="9", arch="x86_64")
+
+    (build, kwargs), *_ = commands
+    # The Dockerfile is read from stdin, the working directory isn't sent
+    assert build[-1] == "-" and "." not in build
+    # The prebuilt fish doesn't need libpcre2-32 in the hosts
+    assert b"-DFISH_USE_SYSTEM_PCRE2=OFF" in kwargs["input"]
+    assert path.read_bytes() == b"tarball"
@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from pysetmeup.helpers.assets import AssetMatcher, get_system_info, tokenize
+
+CORPUS = json.loads(
+    (Path(__file__).parent / "fixtures" / "release_assets.json").read_text()
+)
+
+CASES = [
+    pytest.param(release, profile, expected, id=f"{release}-{profile}")
+    for release, data in CORPUS["releases"].items()
+    for profile, expected in data["expected"].items()
+]
+
+
+@pytest.mark.parametrize("release, profile, expected", CASES)
+def test_matcher_picks_the_expected_asset(release, profile, expected):
+    matcher = AssetMatcher(CORPUS["profiles"][profile])
+    assets = [{"name": name} for name in CORPUS["releases"][release]["assets"]]
+    ranked = matcher.rank(assets)
+    if not expected:
+        assert ranked == []
+    else:
+        assert ranked[0][0]["name"] in expected
+
+
+def test_tokenize_keeps_x86_64_together():
+    assert tokenize("tkn_0.39.0_Linux_x86_64.tar.gz") == [
+        "tkn", "0", "39", "0", "linux", "x86_64", "tar", "gz",
+    ]  # fmt: skip
+
+
+def test_matcher_pin():
+    profile = CORPUS["profiles"]["linux-x86_64"]
+    assets = [
+        {"name": name} for name in CORPUS["releases"]["sharkdp/fd@v10.2.0"]["assets"]
+    ]
+    ranked = AssetMatcher(profile, pin="*musl*").rank(assets)
+    assert ranked[0][0]["name"] == "fd-v10.2.0-x86_64-unknown-linux-musl.tar.gz"
+    assert all("musl" in asset["name"] for asset, _ in ranked)
+
+
+def test_system_info_is_computed_once():
+    assert get_system_info() is get_system_info()
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pysetmeup import blocks
+from pysetmeup.blocks import Block, render
+
+CONFIG_FISH = """\
+if status is-interactive
+    # Commands to run in interactive sessions can go here
+end
+"""
+
+
+def test_blocks_are_added_and_updated_in_place():
+    new = render(
+        CONFIG_FISH,
+        [
+            Block("local bin", "fish_add_path ~/.local/bin"),
+            Block("starship", "starship init fish | source", before=r"^end\b"),
+        ],
+    )
+    assert new.splitlines() == [
+        "if status is-interactive",
+        "    # Commands to run in interactive sessions can go here",
+        "# BEGIN PYSETMEUP starship",
+        "starship init fish | source",
+        "# END PYSETMEUP starship",
+        "end",
+        "# BEGIN PYSETMEUP local bin",
+        "fish_add_path ~/.local/bin",
+        "# END PYSETMEUP local bin",
+    ]
+
+    updated = render(new, [Block("local bin", "fish_add_path ~/bin")])
+    assert "fish_add_path ~/bin" in updated
+    assert "fish_add_path ~/.local/bin" not in updated
+    assert render(updated, [Block("local bin", "fish_add_path ~/bin")]) == updated
+
+
+def test_content_already_in_the_file_is_left_alone():
+    assert render("set editing-mode vi\n", [Block("vi", "set editing-mode vi")]) == (
+        "set editing-mode vi\n"
+    )
+
+
+@pytest.fixture
+def fake_host(monkeypatch):
+    contents = {"/home/dev/.config/fish/config.fish": CONFIG_FISH.splitlines()}
+    reads = []
+
+    def get_fact(fact, path, **kwargs):
+        reads.append(path)
+        return contents.get(path)
+
+    host = SimpleNamespace(name="dev", get_fact=get_fact, noop=lambda message: None)
+    writes = []
+
+    def put(**kwargs):
+        writes.append(kwargs)
+        yield from ()
+
+    # Runs the operation right away, as pyinfra does when it executes it
+    run_operation = blocks.file_blocks._inner
+
+    def file_blocks(name, _sudo=False, **kwargs):
+        list(run_operation(**kwargs))
+
+    monkeypatch.setattr(blocks, "host", host)
+    monkeypatch.setattr(
+        blocks, "files", SimpleNamespace(put=SimpleNamespace(_inner=put))
+    )
+    monkeypatch.setattr(blocks, "file_blocks", file_blocks)
+    return SimpleNamespace(
+        contents=contents, reads=reads, writes=writes, run_operation=run_operation
+    )
+
+
+def test_one_read_and_write_per_file(fake_host):
+    with blocks.managed_blocks():
+        blocks.block("/home/dev/.config/fish/config.fish", "a", "set -x A 1")
+        with blocks.managed_blocks():
+            blocks.block("/home/dev/.config/fish/config.fish", "b", "set -x B 1")
+            blocks.block(
+                "/etc/sudoers.d/sudo_dev", "sudo", "dev ALL=(ALL) ALL", mode="440"
+            )
+        assert fake_host.writes == []
+
+    assert fake_host.reads == [
+        "/home/dev/.config/fish/config.fish",
+        "/etc/sudoers.d/sudo_dev",
+    ]
+    assert [write["dest"] for write in fake_host.writes] == fake_host.reads
+    assert fake_host.writes[1]["mode"] == "440"
+
+
+def test_unchanged_files_are_not_written(fake_host):
+    path = "/home/dev/.config/fish/config.fish"
+    fake_host.contents[path] = render(
+        CONFIG_FISH, [Block("a", "set -x A 1")]
+    ).splitlines()
+
+    blocks.block(path, "a", "set -x A 1")
+
+    assert fake_host.writes == []
+
+
+def test_the_file_is_read_when_the_operation_runs(fake_host):
+    path = "/home/dev/.config/fish/config.fish"
+    operation = fake_host.run_operation(path=path, blocks=[Block("a", "set -x A 1")])
+    # An earlier operation of the deploy changes the file before this one runs
+    fake_host.contents[path] = CONFIG_FISH.splitlines() + ["set -x EARLIER 1"]
+
+    list(operation)
+
+    (write,) = fake_host.writes
+    assert "set -x EARLIER 1\n# BEGIN PYSETMEUP a\n" in write["src"].getvalue()
@@ -0,0 +1,110 @@
+import pytest
+
+from pysetmeup import bundle
+from pysetmeup.bundle import BOOTSTRAP_PACKAGES, Platform, closure, setup_parts
+from pysetmeup.helpers.cache import DownloadCache
+from pysetmeup.helpers.github import ReleaseMetadataCache
+
+
+def test_platform_names():
+    platform = Platform.parse("el9-aarch64")
+
+    assert platform == Platform("el", "9", "aarch64")
+    assert str(platform) == "el9-aarch64"
+    assert platform.image == "rockylinux:9"
+    assert platform.profile()["family"] == "RedHat"
+
+    with pytest.raises(ValueError):
+        Platform.parse("windows11-x86_64")
+
+
+def test_closure_of_a_fresh_host(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    rhel = closure(Platform.parse("el9-x86_64"), "basicdev")
+    debian = closure(Platform.parse("debian12-x86_64"), "basicdev")
+    alpine = closure(Platform.parse("alpine3-x86_64"), "basicdev")
+
+    # Without a prebuilt fish, its build dependencies (but not groups)
+    assert {"curl", "git", "mosh", "unzip", "cmake", "ncurses-devel"} <= set(rhel)
+    assert not [name for name in rhel if name.startswith("@")]
+    assert {"fish", "fzf", "unzip"} <= set(debian)
+    assert "build-essential" not in debian
+    assert {"curl", "unzip", "fish", "fzf"} <= set(alpine)
+    # basicdev doesn't deploy lvm
+    assert "lvm2" not in rhel + debian + alpine
+
+
+def test_closure_follows_the_setup():
+    assert setup_parts("rhel") == ["epel", "rhel"]
+    assert {"unzip", "epel", "bashrc_d_directory", "basicdev"} <= set(
+        setup_parts("basicdev")
+    )
+    assert closure(Platform.parse("el9-x86_64"), "rhel") == BOOTSTRAP_PACKAGES
+
+    with pytest.raises(ValueError):
+        setup_parts("fish")
+
+
+def test_only_resolved_cache_entries_are_bundled(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    cache = DownloadCache(tmp_path / "cache" / "pysetmeup" / "downloads")
+    monkeypatch.setattr(bundle, "download_cache", cache)
+    monkeypatch.setattr(bundle, "release_cache", ReleaseMetadataCache())
+    cache.put("starship", [b"not bundled"])
+    with cache.recording() as keys:
+        cache.put("direnv", [b"direnv"])
+
+    bundle.copy_cache(tmp_path / "bundle", bundle.CacheEntries(downloads=keys))
+
+    copied = DownloadCache(tmp_path / "bundle" / "pysetmeup" / "downloads")
+    assert keys == {"direnv"}
+    assert copied.get("direnv").read_bytes() == b"direnv"
+    assert copied.get("starship") is None
+    assert len(list(copied.blobs.iterdir())) == 1
+
+
+def test_bundled_python_matches_the_platform(tmp_path, monkeypatch):
+    cache = DownloadCache(tmp_path / "cache")
+    monkeypatch.setattr(bundle, "download_cache", cache)
+    names = [
+        "cpython-3.11.10+20241016-x86_64-unknown-linux-gnu-install_only_stripped.tar.gz",
+        "cpython-3.11.10+20241016-x86_64_v2-unknown-linux-gnu-install_only.tar.gz",
+        "cpython-3.11.10+20241016-x86_64-unknown-linux-gnu-install_only.tar.gz",
+        "cpython-3.11.10+20241016-x86_64-unknown-linux-musl-install_only.tar.gz",
+        "cpython-3.12.7+20241016-x86_64-unknown-linux-gnu-install_only.tar.gz",
+    ]
+    assets = [
+        {
+            "id": index,
+            "name": name,
+            "browser_download_url": f"https://example.com/{name}",
+        }
+        for index, name in enumerate(names)
+    ]
+    monkeypatch.setattr(bundle, "get_release", lambda repo: {"assets": assets})
+    for asset in assets:
+        cache.put(
+            bundle.asset_cache_key(bundle.PYTHON_BUILDS_REPO, asset),
+            [asset["name"].encode()],
+        )
+
+    rhel = bundle.fetch_python(
+        Platform.parse("el9-x86_64"), "3.11", tmp_path / "python"
+    )
+    alpine = bundle.fetch_python(
+        Platform.parse("alpine3-x86_64"), "3.11", tmp_path / "python"
+    )
+
+    assert rhel.name == "el9-x86_64.tar.gz"
+    assert rhel.read_text() == names[2]
+    assert alpine.read_text() == names[3]
+    with pytest.raises(LookupError):
+        bundle.fetch_python(Platform.parse("el9-aarch64"), "3.11", tmp_path / "python")
+
+
+def test_bundles_need_a_python_that_runs_pysetmeup():
+    with pytest.raises(ValueError):
+        bundle.build_bundle(
+            "basicdev", [Platform.parse("el9-x86_64")], python_version="3.9"
+        )
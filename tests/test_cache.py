@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from pysetmeup.helpers.cache import DownloadCache
+
+
+def test_cache_stores_by_content(tmp_path):
+    cache = DownloadCache(tmp_path)
+    assert cache.get("sharkdp/fd#1") is None
+
+    first = cache.put("sharkdp/fd#1", [b"fd ", b"binary"])
+    second = cache.put("sharkdp/fd#2", [b"fd binary"])
+
+    assert first == second == cache.get("sharkdp/fd#1")
+    assert first.read_bytes() == b"fd binary"
+
+
+def test_cache_rejects_checksum_mismatch(tmp_path):
+    cache = DownloadCache(tmp_path)
+    with pytest.raises(ValueError):
+        cache.put("mikefarah/yq#1", [b"yq"], sha256="0" * 64)
+    assert cache.get("mikefarah/yq#1") is None
+    assert list(cache.blobs.iterdir()) == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DownloadCache(tmp_path, max_size=10)
+    old = cache.put("old", [b"12345"])
+    os.utime(old, (0, 0))
+    cache.put("new", [b"67890"])
+    cache.put("newest", [b"abcde"])
+
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert cache.get("newest") is not None
+
+
+def test_cache_keeps_the_file_just_stored(tmp_path):
+    cache = DownloadCache(tmp_path, max_size=10)
+    cache.put("old", [b"12345"])
+
+    # Bigger than the whole cache, the caller still gets it
+    big = cache.put("big", [b"0123456789abcdef"])
+
+    assert big.read_bytes() == b"0123456789abcdef"
+    assert cache.get("big") == big
+    assert cache.get("old") is None
@@ -0,0 +1,42 @@
+import os
+
+from pysetmeup.deploy_index import DeployIndex
+
+GIT = '''
+from pyinfra.api import deploy
+
+
+@deploy("Install git")
+def deploy(version="latest", *, user=None):
+    """Installs git from the distro packages"""
+'''
+
+
+def test_only_changed_files_are_parsed(tmp_path):
+    package = tmp_path / "pysetmeup"
+    (package / "parts").mkdir(parents=True)
+    (package / "parts" / "git.py").write_text(GIT)
+    (package / "helpers.py").write_text("def helper(): ...\n")
+    index = DeployIndex(package, path=tmp_path / "index.json")
+
+    [entry] = index.update()
+    assert entry.name == "pysetmeup.parts.git.deploy"
+    assert entry.title == "Install git"
+    assert entry.params == ["version", "user"]
+    assert entry.doc == "Installs git from the distro packages"
+    assert index.parsed == ["helpers.py", "parts/git.py"]
+
+    assert index.update() == [entry]
+    assert index.parsed == []
+
+    # Touched without changes
+    os.utime(package / "parts" / "git.py", ns=(0, 0))
+    index.update()
+    assert index.parsed == []
+
+    (package / "helpers.py").write_text("@api.deploy\ndef helper(): ...\n")
+    assert [entry.name for entry in index.update()] == [
+        "pysetmeup.helpers.helper",
+        "pysetmeup.parts.git.deploy",
+    ]
+    assert index.parsed == ["helpers.py"]
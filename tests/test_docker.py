@@ -1,39 +1,70 @@
+import time
+
 import pytest
-import subprocess
 from loguru import logger
-from functools import partial
+
+from pysetmeup import registry
 
 images_to_test = {
     "centos": "quay.io/centos/centos:stream9",
+    "debian": "debian:12",
     "alpine": "alpine",
 }
 
+# Parts that can be deployed in a bare container of every distro, after the parts
+# they require (e.g. epel for mosh in RedHat). lvm needs block devices
+parts_to_test = [
+    "bashrc_d_directory",
+    "direnv",
+    "fish",
+    "fzf",
+    "gh",
+    "git",
+    "mosh",
+    "rclone",
+    "unzip",
+    "vi_mode_bash",
+    "yq",
+]
 
-def dispose_container(container_id: str) -> None:
-    logger.info(f"Disposing container {container_id}")
-    subprocess.call(f"docker rm -f {container_id}".split())
 
+def deploy_reference(part: str) -> str:
+    """pysetmeup.parts.git:deploy -> pysetmeup.parts.git.deploy, as pyinfra expects"""
+    return registry.parts()[part].value.replace(":", ".")
 
+
+@pytest.mark.parametrize("part", parts_to_test)
 @pytest.mark.parametrize("image", images_to_test.values(), ids=images_to_test.keys())
-def test_multiple_distros(request, image, top_level):
-    command = (
-        # f"docker run -d --rm -ti -w /code -v {top_level}:/code {image}  sh -c 'sleep infinity'",
-        f"docker run -d --rm -ti {image}  sh -c 'sleep infinity'",
-    )
-    logger.debug(f"{command=}")
-    docker_detached = subprocess.run(
-        command,
-        shell=True,
-        cwd=top_level,
-        capture_output=True,
-    )
-    assert docker_detached.returncode == 0, f"{command} failed"
-
-    container_id = docker_detached.stdout.decode().strip()
-    request.addfinalizer(partial(dispose_container, container_id))
-    proc = subprocess.run(
-        f"uv run pyinfra @docker/{container_id} pysetmeup.deploys.rclone.install --debug-all -y",
-        shell=True,
-        cwd=top_level,
-    )
-    assert proc.returncode == 0
+def test_multiple_distros(image, part, container_pool, record_property):
+    distro = next(name for name, value in images_to_test.items() if value == image)
+    record_property("matrix", (part, distro))
+    container = container_pool.acquire(image)
+    started = time.perf_counter()
+    try:
+        for name in registry.closure([part]):
+            result = container.exec_run(
+                ["pyinfra", "@local", deploy_reference(name), "-y"],
+                environment={"USER": "root"},
+            )
+            if result.exit_code != 0:
+                break
+    finally:
+        record_property("seconds", time.perf_counter() - started)
+        container_pool.release(container)
+    output = result.output.decode(errors="replace")
+    logger.debug(output)
+    assert result.exit_code == 0, output[-4000:]
+
+
+def test_user_deploy_from_snapshots(snapshots):
+    chain = ["epel", "fish", "direnv", "bashrc_d_directory", "user"]
+    image = images_to_test["centos"]
+
+    first = snapshots.deploy(image, chain, {"user": "root"})
+    snapshots.pool.release(first.container)
+    assert first.resumed + first.deployed == chain
+
+    # Every layer is cached now
+    again = snapshots.deploy(image, chain, {"user": "root"})
+    snapshots.pool.release(again.container)
+    assert (again.resumed, again.deployed) == (chain, [])
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pysetmeup.helpers import download
+from pysetmeup.helpers.cache import DownloadCache
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD honoring (single) range requests"""
+
+    requests = []
+
+    def send_payload(self, body=True):
+        data, status = PAYLOAD, 200
+        if requested := self.headers.get("Range"):
+            self.requests.append(requested)
+            start, _, end = requested.removeprefix("bytes=").partition("-")
+            data = PAYLOAD[int(start) : int(end) + 1 if end else None]
+            status = 206
+        self.send_response(status)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.send_payload(body=False)
+
+    def do_GET(self):
+        self.send_payload()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    RangeHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/oc.tar.gz"
+    server.shutdown()
+
+
+def test_segmented_download(monkeypatch, url, tmp_path):
+    monkeypatch.setattr(download, "MIN_SEGMENT_SIZE", 128 * 1024)
+    partial = download.fetch(url, tmp_path / "oc.partial", segments=4)
+
+    assert partial.read_bytes() == PAYLOAD
+    assert sorted(RangeHandler.requests) == [
+        "bytes=0-262143",
+        "bytes=262144-524287",
+        "bytes=524288-786431",
+        "bytes=786432-1048575",
+    ]
+    assert not partial.with_suffix(".json").exists()
+
+
+def test_segmented_download_resumes_each_segment(monkeypatch, url, tmp_path):
+    monkeypatch.setattr(download, "MIN_SEGMENT_SIZE", 128 * 1024)
+    partial = tmp_path / "oc.partial"
+    segments = download.split_segments(len(PAYLOAD), 2)
+    segments[0][2] = 1000
+    segments[1][2] = segments[1][1] - segments[1][0] + 1  # already complete
+    half = len(PAYLOAD) // 2
+    partial.write_bytes(PAYLOAD[:1000] + bytes(half - 1000) + PAYLOAD[half:])
+    state = {"url": url, "size": len(PAYLOAD), "segments": segments}
+    partial.with_suffix(".json").write_text(json.dumps(state))
+
+    download.fetch(url, partial)
+
+    assert RangeHandler.requests == [f"bytes=1000-{half - 1}"]
+    assert partial.read_bytes() == PAYLOAD
+
+
+def test_sequential_download_resumes_partial_file(url, tmp_path):
+    partial = tmp_path / "oc.partial"
+    partial.write_bytes(PAYLOAD[:5000])
+    partial.with_suffix(".json").write_text(
+        json.dumps({"url": url, "sequential": True})
+    )
+
+    download.fetch(url, partial)
+
+    assert RangeHandler.requests == ["bytes=5000-"]
+    assert partial.read_bytes() == PAYLOAD
+    assert not partial.with_suffix(".json").exists()
+
+
+def test_partial_file_without_state_is_discarded(url, tmp_path):
+    # e.g. a segmented download that lost its state: only its first bytes are right
+    partial = tmp_path / "oc.partial"
+    partial.write_bytes(PAYLOAD[:5000] + bytes(len(PAYLOAD) - 5000))
+
+    download.fetch(url, partial)
+
+    assert RangeHandler.requests == []
+    assert partial.read_bytes() == PAYLOAD
+
+
+def test_checksum_is_verified_when_adopted(url, tmp_path):
+    cache = DownloadCache(tmp_path / "cache")
+    partial = download.fetch(url, cache.partial_path("oc"))
+    with pytest.raises(ValueError):
+        cache.adopt("oc", partial, sha256="0" * 64)
+    assert not partial.exists()
+
+    partial = download.fetch(url, cache.partial_path("oc"))
+    blob = cache.adopt("oc", partial, sha256=hashlib.sha256(PAYLOAD).hexdigest())
+    assert cache.get("oc") == blob
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        f"{'a' * 64}\n",
+        f"{'a' * 64}  oc.tar.gz\n",
+        f"{'b' * 64}  other.tar.gz\n{'a' * 64} *oc.tar.gz\n",
+        f"SHA256 (oc.tar.gz) = {'a' * 64}\n",
+    ],
+)
+def test_parse_sha256(text):
+    assert download.parse_sha256(text, "oc.tar.gz") == "a" * 64
+
+
+def test_parse_sha256_missing():
+    assert download.parse_sha256(f"{'b' * 64}  other.tar.gz\n", "oc.tar.gz") is None
@@ -0,0 +1,82 @@
+import subprocess
+
+from pyinfra.api import Config, Inventory, State
+from pyinfra.api.connect import connect_all
+from pyinfra.api.deploy import add_deploy
+
+from pysetmeup import facts, ledger, packages
+from pysetmeup.facts import HostProfile, user_home, user_shell
+from pysetmeup.parts import git, mosh, unzip
+
+ROCKY_OUTPUT = """\
+os=Linux
+arch=aarch64
+user=nahuel
+uid=1000
+home=/home/nahuel
+shell=/bin/bash
+os_release.NAME=Rocky Linux
+os_release.ID=rocky
+os_release.ID_LIKE=rhel centos fedora
+os_release.VERSION_ID=9.4
+libc=glibc
+command.git=/usr/bin/git
+command.fish=
+package.git=2.43.5
+passwd=root:x:0:0:root:/root:/bin/bash
+passwd=nahuel:x:1000:1000::/home/nahuel:/usr/local/bin/fish
+"""
+
+
+def test_host_profile_parses_the_script_output():
+    profile = HostProfile().process(ROCKY_OUTPUT.splitlines())
+
+    assert profile["os"] == "Linux"
+    assert profile["arch"] == "aarch64"
+    assert profile["linux_name"] == "Rocky Linux"
+    assert profile["family"] == "RedHat"
+    assert profile["uid"] == 1000
+    assert profile["commands"]["git"] == "/usr/bin/git"
+    assert profile["commands"]["fish"] is None
+    assert profile["commands"]["mosh"] is None
+    assert profile["packages"] == {"git": "2.43.5"}
+    assert user_shell(profile, "nahuel") == "/usr/local/bin/fish"
+    assert user_home(profile, "root") == "/root"
+    assert user_shell(profile) == "/bin/bash"
+
+
+def test_host_profile_script_runs_in_sh():
+    fact = HostProfile()
+    output = subprocess.run(
+        ["sh", "-c", fact.command()], capture_output=True, text=True, check=True
+    )
+    profile = fact.process(output.stdout.splitlines())
+    assert profile["os"] == "Linux"
+    assert profile["user"] in profile["users"]
+
+
+def test_host_profile_is_gathered_once_per_host(monkeypatch):
+    runs = []
+    process = HostProfile.process
+    monkeypatch.setattr(
+        HostProfile,
+        "process",
+        lambda self, output: runs.append(1) or process(self, output),
+    )
+    for module, name, value in [
+        (facts, "_profiles", {}),
+        (packages, "_installed", {}),
+        (packages, "_refreshed", set()),
+        (ledger, "_ledgers", {}),
+        (ledger, "_writers", {}),
+    ]:
+        monkeypatch.setattr(module, name, value)
+    monkeypatch.setenv("PYSETMEUP_FORCE", "1")
+    inventory = Inventory((["@local"], {}))
+    state = State(inventory, Config())
+    connect_all(state)
+
+    for part in (git.deploy, mosh.deploy, unzip.install):
+        add_deploy(state, part)
+
+    assert len(runs) == 1
@@ -0,0 +1,280 @@
+import io
+import json
+import tarfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+import pytest
+
+from pysetmeup.helpers import github
+from pysetmeup.helpers.assets import ARCH_TOKENS
+from pysetmeup.helpers.cache import DownloadCache
+from pysetmeup.helpers.github import (
+    ReleaseMetadataCache,
+    download_release_binaries,
+    download_release_binary_for_platforms,
+    extract_release_asset,
+    get_release,
+)
+
+
+def make_tar(path, files):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def fd_tarball(tmp_path):
+    archive = tmp_path / "fd-v10.2.0-x86_64-unknown-linux-musl.tar.gz"
+    make_tar(
+        archive,
+        {
+            "fd-v10.2.0-x86_64-unknown-linux-musl/README.md": b"readme",
+            "fd-v10.2.0-x86_64-unknown-linux-musl/fd": b"binary",
+            "../escape": b"nope",
+        },
+    )
+    return archive
+
+
+def test_extract_only_the_matching_binary(tmp_path, fd_tarball):
+    output = tmp_path / "bin"
+    binary = extract_release_asset(fd_tarball, fd_tarball.name, output, "fd")
+
+    assert binary == output / "fd"
+    assert binary.read_bytes() == b"binary"
+    assert binary.stat().st_mode & 0o111
+    assert [path.name for path in output.iterdir()] == ["fd"]
+
+
+def test_extract_all_files_stays_inside_output(tmp_path, fd_tarball):
+    output = tmp_path / "out"
+    assert extract_release_asset(fd_tarball, fd_tarball.name, output, None) == output
+    assert sorted(str(p.relative_to(output)) for p in output.rglob("*.md")) == [
+        "fd-v10.2.0-x86_64-unknown-linux-musl/README.md"
+    ]
+    assert not (tmp_path / "escape").exists()
+
+
+def test_extract_from_zip(tmp_path):
+    archive = tmp_path / "rclone-v1.68.2-linux-amd64.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("rclone-v1.68.2-linux-amd64/rclone", b"rclone")
+    binary = extract_release_asset(archive, archive.name, tmp_path / "bin", "rclone")
+    assert binary.read_bytes() == b"rclone"
+
+
+RELEASE = {"tag_name": "v4.44.6", "assets": []}
+
+
+class ReleaseHandler(BaseHTTPRequestHandler):
+    """Stand-in for api.github.com that supports ETag revalidation"""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == '"v4.44.6"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(RELEASE).encode()
+        self.send_response(200)
+        self.send_header("ETag", '"v4.44.6"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github_api(monkeypatch, tmp_path):
+    server = HTTPServer(("127.0.0.1", 0), ReleaseHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ReleaseHandler.requests = []
+    monkeypatch.setattr(
+        github, "GITHUB_API_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(github, "release_cache", ReleaseMetadataCache(tmp_path))
+    yield ReleaseHandler.requests
+    server.shutdown()
+
+
+def test_release_metadata_is_revalidated_with_etag(github_api):
+    assert get_release("mikefarah/yq") == RELEASE
+    assert get_release("mikefarah/yq") == RELEASE
+    assert github_api == [
+        ("/repos/mikefarah/yq/releases/latest", None),
+        ("/repos/mikefarah/yq/releases/latest", '"v4.44.6"'),
+    ]
+
+
+def test_offline_resolves_latest_from_cache(github_api):
+    with pytest.raises(LookupError):
+        get_release("mikefarah/yq", offline=True)
+    get_release("mikefarah/yq")
+    assert get_release("mikefarah/yq", offline=True) == RELEASE
+    assert len(github_api) == 1
+
+
+class ToolboxHandler(BaseHTTPRequestHandler):
+    """Serves a release with a single linux binary for every repo, slowly"""
+
+    def do_GET(self):
+        time.sleep(0.3)
+        if self.path.startswith("/repos/missing/"):
+            self.send_error(404)
+            return
+        if self.path.startswith("/repos/"):
+            repo = self.path.split("/")[3]
+            asset = {
+                "id": hash(repo),
+                "name": f"{repo}_linux_amd64",
+                "content_type": "application/octet-stream",
+                "browser_download_url": f"{github.GITHUB_API_URL}/assets/{repo}",
+            }
+            body = json.dumps({"assets": [asset]}).encode()
+        else:
+            body = b"binary"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_download_release_binaries_concurrently(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ToolboxHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        github, "GITHUB_API_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(github, "release_cache", ReleaseMetadataCache(tmp_path / "r"))
+    monkeypatch.setattr(github, "download_cache", DownloadCache(tmp_path / "d"))
+
+    tools = ["helm/helm", "derailed/k9s", "kubernetes-sigs/kind", "missing/tool"]
+    started = time.perf_counter()
+    results = download_release_binaries(tools, output_dir=str(tmp_path / "bin"))
+    server.shutdown()
+
+    # Every tool needs two requests of 0.3s, one after the other
+    assert time.perf_counter() - started < 1.2
+    assert [result.repo for result in results] == tools
+    assert results[0].path == tmp_path / "bin" / "helm_linux_amd64"
+    assert results[0].seconds >= 0.6
+    assert results[3].path is None and results[3].error is not None
+
+
+class PlatformsHandler(BaseHTTPRequestHandler):
+    """Serves a release of yq with linux amd64 and arm64 binaries"""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.path.startswith("/repos/"):
+            assets = [
+                {
+                    "id": index,
+                    "name": f"yq_linux_{arch}",
+                    "content_type": "application/octet-stream",
+                    "browser_download_url": f"{github.GITHUB_API_URL}/assets/{arch}",
+                }
+                for index, arch in enumerate(["amd64", "arm64"])
+            ]
+            body = json.dumps({"tag_name": "v4.44.6", "assets": assets}).encode()
+        else:
+            body = self.path.rsplit("/", 1)[-1].encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def linux_info(arch):
+    return {
+        "os": "Linux",
+        "os_patterns": ["linux"],
+        "arch": arch,
+        "arch_patterns": sorted(ARCH_TOKENS[arch]),
+        "libc": "glibc",
+        "is_64bit": True,
+    }
+
+
+def test_download_once_per_target_platform(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlatformsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    PlatformsHandler.requests = []
+    monkeypatch.setattr(
+        github, "GITHUB_API_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(github, "release_cache", ReleaseMetadataCache(tmp_path / "r"))
+    monkeypatch.setattr(github, "download_cache", DownloadCache(tmp_path / "d"))
+
+    hosts = [
+        linux_info("x86_64"),
+        linux_info("aarch64"),
+        linux_info("x86_64"),
+        linux_info("aarch64"),
+    ]
+    binaries = download_release_binary_for_platforms(
+        "mikefarah/yq", hosts, output_dir=str(tmp_path / "bin"), binary_pattern="yq"
+    )
+    server.shutdown()
+
+    assert {key: binary.path.read_bytes() for key, binary in binaries.items()} == {
+        ("Linux", "x86_64", "glibc"): b"amd64",
+        ("Linux", "aarch64", "glibc"): b"arm64",
+    }
+    assert {binary.tag for binary in binaries.values()} == {"v4.44.6"}
+    assert sorted(
+        path for path in PlatformsHandler.requests if path.startswith("/assets")
+    ) == [
+        "/assets/amd64",
+        "/assets/arm64",
+    ]
+
+
+def test_cached_asset_is_used_without_the_api(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlatformsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        github, "GITHUB_API_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(github, "release_cache", ReleaseMetadataCache(tmp_path / "r"))
+    monkeypatch.setattr(github, "download_cache", DownloadCache(tmp_path / "d"))
+    arguments = dict(
+        output_dir=str(tmp_path / "bin"),
+        binary_pattern="yq",
+        system_info=linux_info("x86_64"),
+    )
+    github.download_release_binary("mikefarah/yq", version="v4.44.6", **arguments)
+    github.download_release_binary("mikefarah/yq", **arguments)
+    server.shutdown()
+    server.server_close()
+    PlatformsHandler.requests = []
+
+    # A pinned version doesn't ask the API, the latest one can't reach it and
+    # uses the asset it resolved last time
+    pinned = github.download_release_binary(
+        "mikefarah/yq", version="v4.44.6", **arguments
+    )
+    latest = github.download_release_binary("mikefarah/yq", **arguments)
+
+    assert pinned.read_bytes() == latest.read_bytes() == b"amd64"
+    assert PlatformsHandler.requests == []
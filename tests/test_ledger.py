@@ -0,0 +1,142 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from pysetmeup import facts, ledger
+from pysetmeup.facts import HostProfile
+
+
+@pytest.fixture
+def fake_host(monkeypatch):
+    profile = HostProfile.default()
+    profile.update(os="Linux", arch="x86_64", family="Debian", home="/home/dev")
+    gathered = {HostProfile: profile, ledger.DeployLedger: {}}
+    writes = []
+    host = SimpleNamespace(
+        name="dev",
+        data={},
+        get_fact=lambda fact, **kwargs: gathered[fact],
+        run_shell_command=lambda command: (True, []),
+        put_file=lambda src, dest: writes.append({"src": src, "dest": dest}),
+    )
+    handlers = []
+    state = SimpleNamespace(
+        add_callback_handler=handlers.append,
+        inventory=SimpleNamespace(get_active_hosts=lambda: [host]),
+    )
+    monkeypatch.setattr(ledger, "host", host)
+    monkeypatch.setattr(ledger, "state", state)
+    monkeypatch.setattr(ledger, "_writers", {})
+    monkeypatch.setattr(ledger, "_ledgers", {})
+    monkeypatch.setattr(facts, "_profiles", {})
+    monkeypatch.delenv("PYSETMEUP_FORCE", raising=False)
+    return SimpleNamespace(
+        host=host, profile=profile, facts=gathered, writes=writes, state=state
+    )
+
+
+def make_part(calls):
+    @ledger.skip_unchanged(data_keys=("user",))
+    def deploy(version="1"):
+        calls.append(version)
+
+    return deploy
+
+
+def end_deploy(fake_host):
+    """What pyinfra does once the last operation is applied"""
+    ledger.get_writer().write(fake_host.state)
+
+
+def next_run(fake_host):
+    """The ledger written by the last run, as read by the next one"""
+    end_deploy(fake_host)
+    fake_host.facts[ledger.DeployLedger] = json.loads(
+        fake_host.writes[-1]["src"].getvalue()
+    )
+    ledger._ledgers.clear()
+    # A new process, with the profile gathered again
+    facts._profiles.clear()
+
+
+def test_unchanged_parts_are_skipped(fake_host):
+    calls = []
+    deploy = make_part(calls)
+
+    deploy()
+    next_run(fake_host)
+    deploy()
+
+    assert calls == ["1"]
+
+
+def test_changed_inputs_deploy_again(fake_host):
+    calls = []
+    deploy = make_part(calls)
+
+    deploy()
+    next_run(fake_host)
+    deploy(version="2")
+    fake_host.host.data["user"] = "other"
+    deploy(version="2")
+
+    assert calls == ["1", "2", "2"]
+
+
+@pytest.mark.parametrize("force", [True, "1", "fish,test_ledger", "test_ledger"])
+def test_force(fake_host, force):
+    calls = []
+    deploy = make_part(calls)
+
+    deploy()
+    next_run(fake_host)
+    fake_host.host.data["force"] = force
+    deploy()
+
+    assert calls == ["1", "1"]
+
+
+def test_the_ledger_is_written_once_per_deploy(fake_host):
+    @ledger.skip_unchanged()
+    def git(): ...
+
+    @ledger.skip_unchanged()
+    def mosh(): ...
+
+    git()
+    mosh()
+    assert fake_host.writes == []
+    end_deploy(fake_host)
+    end_deploy(fake_host)
+
+    assert len(fake_host.writes) == 1
+    assert fake_host.writes[0]["dest"] == "/home/dev/.cache/pysetmeup/state.json"
+    assert len(json.loads(fake_host.writes[0]["src"].getvalue())) == 2
+
+
+def test_failed_hosts_keep_their_ledger(fake_host):
+    make_part([])()
+    fake_host.state.inventory.get_active_hosts = lambda: []
+
+    end_deploy(fake_host)
+
+    assert fake_host.writes == []
+
+
+def test_parts_deploy_again_when_their_profile_entries_change(fake_host):
+    calls = []
+
+    @ledger.skip_unchanged(profile_keys=("commands.git",))
+    def deploy():
+        calls.append(fake_host.profile["commands"]["git"])
+
+    fake_host.profile["commands"]["git"] = "/usr/bin/git"
+    deploy()
+    next_run(fake_host)
+    deploy()
+    fake_host.profile["commands"]["git"] = None
+    next_run(fake_host)
+    deploy()
+
+    assert calls == ["/usr/bin/git", None]
@@ -0,0 +1,190 @@
+import io
+import os
+import subprocess
+import tarfile
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pysetmeup.connectors import lima
+from pysetmeup.connectors.lima import (
+    InstancesCache,
+    LimaConnector,
+    ShellSession,
+    local_digest,
+    write_tar,
+)
+
+
+@pytest.fixture
+def session():
+    # A local sh speaks the same protocol as `limactl shell <vm> sh`
+    session = ShellSession(["sh"])
+    session.start()
+    yield session
+    session.close()
+
+
+def test_session_separates_exit_code_stdout_and_stderr(session):
+    assert session.run("echo out; echo err >&2; exit 3") == (3, "out\n", "err\n")
+    assert session.run("printf 'no newline'") == (0, "no newline", "")
+
+
+def test_session_passes_stdin(session):
+    assert session.run("cat", stdin="hello\nworld") == (0, "hello\nworld", "")
+
+
+def test_session_commands_do_not_leak_state(session):
+    session.run("cd /tmp && export FOO=bar")
+    assert session.run("echo ${FOO:-unset}") == (0, "unset\n", "")
+
+
+def test_session_timeout_kills_the_shell(session):
+    with pytest.raises(TimeoutError):
+        session.run("sleep 5", timeout=0.2)
+    assert not session.alive
+
+
+LIMACTL_LIST = (
+    '{"name": "default", "status": "Running", "address": "127.0.0.1"}\n'
+    '{"name": "dev-deploy-test", "status": "Stopped"}\n'
+)
+
+
+@pytest.fixture
+def limactl_list(monkeypatch):
+    calls = []
+
+    def fake_run(argv, **kwargs):
+        calls.append(argv)
+        return subprocess.CompletedProcess(argv, 0, stdout=LIMACTL_LIST, stderr="")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    return calls
+
+
+def test_instances_cache_runs_limactl_list_once(limactl_list):
+    cache = InstancesCache(ttl=60)
+    assert cache.find("default")["status"] == "Running"
+    assert cache.find("dev-deploy-test")["status"] == "Stopped"
+    assert cache.find("missing") is None
+    assert len(limactl_list) == 1
+
+    cache.refresh()
+    assert len(limactl_list) == 2
+
+
+def test_instances_cache_expires(limactl_list):
+    cache = InstancesCache(ttl=0)
+    cache.get()
+    cache.get()
+    assert len(limactl_list) == 2
+
+
+def test_write_tar_streams_files_and_buffers(tmp_path):
+    dotfile = tmp_path / "bashrc"
+    dotfile.write_text("source ~/.bashrc.d/*\n")
+    archive = io.BytesIO()
+
+    write_tar(
+        archive,
+        {
+            "/home/user/.bashrc": str(dotfile),
+            "/home/user/.inputrc": io.StringIO("set editing-mode vi"),
+        },
+    )
+
+    archive.seek(0)
+    with tarfile.open(fileobj=archive) as tar:
+        assert tar.getnames() == ["home/user/.bashrc", "home/user/.inputrc"]
+        inputrc = tar.extractfile("home/user/.inputrc").read()
+    assert inputrc == b"set editing-mode vi"
+
+
+def test_local_digest_matches_for_paths_and_buffers(tmp_path):
+    dotfile = tmp_path / "inputrc"
+    dotfile.write_text("set editing-mode vi")
+    assert local_digest(str(dotfile)) == local_digest(
+        io.StringIO("set editing-mode vi")
+    )
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        (None, ["@lima/default", "@lima/dev-deploy-test"]),
+        ("dev-*", ["@lima/dev-deploy-test"]),
+        ("default", ["@lima/default"]),
+    ],
+)
+def test_make_names_data_expands_globs(monkeypatch, limactl_list, name, expected):
+    monkeypatch.setattr(lima, "instances_cache", InstancesCache())
+    names = [host for host, *_ in LimaConnector.make_names_data(name)]
+    assert names == expected
+
+
+def test_globs_start_the_stopped_vms(monkeypatch, limactl_list):
+    monkeypatch.setattr(lima, "instances_cache", InstancesCache())
+    list(LimaConnector.make_names_data("*"))
+    list(LimaConnector.make_names_data("default"))
+
+    assert ["limactl", "start", "dev-deploy-test"] in limactl_list
+    assert ["limactl", "start", "default"] not in limactl_list
+
+
+def test_start_instances_in_parallel(monkeypatch):
+    def slow_start(argv, **kwargs):
+        time.sleep(0.2)
+        return subprocess.CompletedProcess(argv, 0)
+
+    monkeypatch.setattr(subprocess, "run", slow_start)
+    started = time.monotonic()
+    latencies = lima.start_instances(["vm1", "vm2", "vm3", "vm4"])
+
+    assert time.monotonic() - started < 0.6
+    assert set(latencies) == {"vm1", "vm2", "vm3", "vm4"}
+    assert all(latency >= 0.2 for latency in latencies.values())
+
+
+@pytest.fixture
+def local_connector(monkeypatch):
+    """Connector whose "VM" is the local machine"""
+    connector = LimaConnector(None, SimpleNamespace(name="@lima/dev", data={}))
+    connector.session = ShellSession(["sh"])
+    connector.session.start()
+    spawned = []
+
+    def remote_process(command, **kwargs):
+        spawned.append(command)
+        return subprocess.Popen(["sh", "-c", command], **kwargs)
+
+    monkeypatch.setattr(connector, "_remote_process", remote_process)
+    yield SimpleNamespace(connector=connector, spawned=spawned)
+    connector.disconnect()
+
+
+def test_small_files_go_through_the_session(local_connector, tmp_path):
+    connector = local_connector.connector
+    inputrc = tmp_path / "home" / ".inputrc"
+
+    assert connector.put_file(io.StringIO("set editing-mode vi"), str(inputrc))
+    os.utime(inputrc, (0, 0))
+    assert connector.put_file(io.StringIO("set editing-mode vi"), str(inputrc))
+
+    assert inputrc.read_text() == "set editing-mode vi"
+    # Not written again
+    assert inputrc.stat().st_mtime == 0
+    assert local_connector.spawned == []
+
+
+def test_big_files_are_streamed_with_tar(local_connector, monkeypatch, tmp_path):
+    monkeypatch.setattr(lima, "SESSION_UPLOAD_LIMIT", 4)
+    connector = local_connector.connector
+    inputrc = tmp_path / "home" / ".inputrc"
+
+    assert connector.put_file(io.StringIO("set editing-mode vi"), str(inputrc))
+    assert connector.put_file(io.StringIO("set editing-mode vi"), str(inputrc))
+
+    assert inputrc.read_text() == "set editing-mode vi"
+    assert local_connector.spawned == ["tar -xf - -C /"]
@@ -0,0 +1,133 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from pysetmeup import facts
+from pysetmeup.facts import HostProfile
+from pysetmeup.helpers import mirror
+from pysetmeup.helpers.assets import system_info_of
+from pysetmeup.helpers.cache import DownloadCache
+from pysetmeup.helpers.github import PlatformBinary
+
+
+class InstallerHandler(BaseHTTPRequestHandler):
+    script = b"#!/bin/sh\necho installing\n"
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.script)))
+        self.end_headers()
+        self.wfile.write(self.script)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def installer_url(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(mirror, "download_cache", DownloadCache(tmp_path / "d"))
+    InstallerHandler.requests = 0
+    server = HTTPServer(("127.0.0.1", 0), InstallerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/install.sh"
+    server.shutdown()
+
+
+def test_installer_is_downloaded_once_and_pinned(installer_url):
+    first = mirror.mirror_installer(installer_url)
+    second = mirror.mirror_installer(installer_url, offline=True)
+
+    assert first == second
+    assert first.read_bytes() == InstallerHandler.script
+    assert InstallerHandler.requests == 1
+    assert mirror.load_pins() == {installer_url: first.name}
+
+
+def test_installer_must_match_its_pin(installer_url):
+    mirror.mirror_installer(installer_url)
+    (mirror.mirror_home() / "pins.json").write_text(f'{{"{installer_url}": "0000"}}')
+
+    with pytest.raises(ValueError):
+        mirror.mirror_installer(installer_url)
+
+
+def test_offline_installer_must_be_mirrored(installer_url):
+    with pytest.raises(LookupError):
+        mirror.mirror_installer(installer_url, offline=True)
+
+
+def test_system_info_of_a_host():
+    profile = HostProfile.default()
+    profile.update(os="Linux", arch="arm64", libc="musl")
+
+    info = system_info_of(profile)
+
+    assert info["arch"] == "aarch64"
+    assert info["libc"] == "musl"
+    assert info["is_64bit"]
+
+
+@pytest.mark.parametrize(
+    ("output", "expected"),
+    [
+        ("rclone v1.68.2", True),
+        ("gh version 2.63.0 (2024-11-27)", False),
+        ("starship 1.68.2.1", False),
+        (None, False),
+    ],
+)
+def test_version_matches(output, expected):
+    assert mirror.version_matches("v1.68.2", output) is expected
+
+
+def test_release_binary_is_resolved_once_per_platform(monkeypatch, tmp_path):
+    def fake_host(name, arch, installed):
+        profile = HostProfile.default()
+        profile.update(os="Linux", arch=arch, libc="glibc")
+        facts = {HostProfile: profile, mirror.BinaryVersion: installed}
+        return SimpleNamespace(
+            name=name,
+            get_fact=lambda fact, **kwargs: facts[fact],
+            noop=lambda description: None,
+        )
+
+    hosts = [
+        fake_host("vm", "aarch64", None),
+        fake_host("container", "x86_64", "rclone v1.68.2"),
+        fake_host("other", "x86_64", "rclone v1.60.0"),
+    ]
+    downloads = []
+
+    def download(repo, system_infos, **kwargs):
+        downloads.append(sorted(info["arch"] for info in system_infos))
+        return {
+            mirror.platform_key(info): PlatformBinary(
+                "v1.68.2", tmp_path / info["arch"]
+            )
+            for info in system_infos
+        }
+
+    puts = []
+    monkeypatch.setattr(mirror, "_resolved", {})
+    monkeypatch.setattr(facts, "_profiles", {})
+    monkeypatch.setattr(mirror, "download_release_binary_for_platforms", download)
+    monkeypatch.setattr(
+        mirror, "files", SimpleNamespace(put=lambda **kw: puts.append(kw))
+    )
+    inventory = SimpleNamespace(get_active_hosts=lambda: hosts)
+    monkeypatch.setattr(mirror, "state", SimpleNamespace(inventory=inventory))
+    for current in hosts:
+        monkeypatch.setattr(mirror, "host", current)
+        mirror.push_release_binary("rclone/rclone", "/usr/bin/rclone", binary="rclone")
+
+    assert downloads == [["aarch64", "x86_64"]]
+    # The container already has v1.68.2
+    assert [put["src"] for put in puts] == [
+        str(tmp_path / "aarch64"),
+        str(tmp_path / "x86_64"),
+    ]
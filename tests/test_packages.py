@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pysetmeup import facts, packages
+from pysetmeup.facts import HostProfile
+from pysetmeup.parts import fish, fzf, git, mosh, unzip
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, operation):
+        return lambda **kwargs: self.calls.append((operation, kwargs))
+
+
+def rocky_profile():
+    profile = HostProfile.default()
+    profile.update(os="Linux", family="RedHat", linux_name="Rocky Linux")
+    profile["commands"]["git"] = "/usr/bin/git"
+    return profile
+
+
+@pytest.fixture
+def fake_host(monkeypatch):
+    profile = rocky_profile()
+    host = SimpleNamespace(name="rocky", get_fact=lambda fact: profile)
+    recorders = {name: Recorder() for name in ("apk", "apt", "brew", "dnf", "server")}
+    monkeypatch.setattr(packages, "host", host)
+    monkeypatch.setattr(facts, "_profiles", {})
+    for name, recorder in recorders.items():
+        monkeypatch.setattr(packages, name, recorder)
+    monkeypatch.setattr(packages, "_installed", {})
+    monkeypatch.setattr(packages, "_refreshed", set())
+    return recorders
+
+
+def test_distro_names_maps_and_deduplicates():
+    names = ["development-tools", "ncurses-devel", "git", "which"]
+
+    assert packages.distro_names(names, "RedHat") == [
+        "@development",
+        "ncurses-devel",
+        "git",
+        "which",
+    ]
+    assert packages.distro_names(names, "Debian") == [
+        "build-essential",
+        "libncurses-dev",
+        "git",
+        "debianutils",
+    ]
+    assert packages.distro_names(names + ["git"], "Darwin") == ["ncurses-devel", "git"]
+
+
+def test_parts_declare_only_what_is_missing():
+    profile = rocky_profile()
+
+    assert git.packages(profile) == []
+    assert mosh.packages(profile) == ["mosh"]
+    assert fzf.packages(profile) == ["fzf"]
+    assert unzip.packages(profile) == ["unzip"]
+    assert "cmake" in fish.packages(profile)
+
+
+def test_fzf_is_installed_from_apk_in_alpine():
+    profile = rocky_profile()
+    profile.update(family="Alpine", linux_name="Alpine")
+
+    assert fzf.packages(profile) == ["fzf"]
+    assert packages.distro_names(fzf.packages(profile), "Alpine") == ["fzf"]
+
+    profile.update(family="Darwin")
+    with pytest.raises(LookupError):
+        fzf.packages(profile)
+
+
+def test_plan_runs_a_single_transaction(fake_host):
+    packages.plan(git, mosh, fzf, unzip, fish)
+    # The parts' own installs are already covered
+    packages.install(["mosh"])
+    packages.install(["fzf", "unzip"])
+
+    assert [call[0] for call in fake_host["server"].calls] == ["shell"]
+    ((operation, kwargs),) = fake_host["dnf"].calls
+    assert operation == "packages"
+    assert kwargs["packages"][:3] == ["mosh", "fzf", "unzip"]
+    assert "@development" in kwargs["packages"]
+
+
+def test_index_is_refreshed_once(fake_host):
+    packages.install(["mosh"])
+    packages.install(["fzf"])
+
+    assert len(fake_host["server"].calls) == 1
+    assert len(fake_host["dnf"].calls) == 2
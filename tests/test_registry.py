@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+from pysetmeup import registry
+
+
+def imported_after(statement: str) -> set[str]:
+    """Modules a new interpreter has imported after running `statement`"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{statement}\nimport sys\nprint('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stdout.split())
+
+
+def test_listing_parts_imports_none_of_them():
+    modules = imported_after("from pysetmeup import registry\nregistry.names()")
+    assert not {
+        name for name in modules if name.startswith(("pyinfra", "pysetmeup.parts"))
+    }
+
+
+def test_loading_a_part_imports_only_that_part():
+    modules = imported_after("from pysetmeup import registry\nregistry.load('git')")
+    parts = {name for name in modules if name.startswith("pysetmeup.parts.")}
+    assert parts == {"pysetmeup.parts.git"}
+
+
+def test_modules_have_no_import_side_effects():
+    # Operations called outside of a deploy would fail
+    imported_after(
+        "import pysetmeup.linuxbrew, pysetmeup.setups.rhel, pysetmeup.helpers.lima_ssh"
+    )
+
+
+def test_unknown_part():
+    assert {"fish", "git", "user"} <= set(registry.names())
+    with pytest.raises(LookupError, match="fish"):
+        registry.load("fsh")
+
+
+def test_closure_puts_required_parts_first():
+    assert registry.closure(["mosh"]) == ["epel", "mosh"]
+    assert registry.closure(["git"]) == ["git"]
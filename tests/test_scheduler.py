@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from pysetmeup.scheduler import Part, Scheduler, critical_path
+
+
+def noop():
+    pass
+
+
+PARTS = [
+    Part("bashrc_d", noop),
+    Part("direnv", noop, requires=("bashrc_d",)),
+    Part("fish", noop),
+    Part("starship", noop, requires=("fish",)),
+    Part("sudoers", noop),
+]
+
+
+def test_parts_run_after_their_requirements():
+    order = [part.name for part in Scheduler(PARTS).order()]
+
+    assert order.index("bashrc_d") < order.index("direnv")
+    assert order.index("fish") < order.index("starship")
+    assert [[part.name for part in level] for level in Scheduler(PARTS).levels()] == [
+        ["bashrc_d", "fish", "sudoers"],
+        ["direnv", "starship"],
+    ]
+
+
+def test_invalid_requirements():
+    with pytest.raises(ValueError, match="requires zsh"):
+        Scheduler([Part("starship", noop, requires=("zsh",))])
+    with pytest.raises(ValueError, match="Circular"):
+        Scheduler(
+            [Part("a", noop, requires=("b",)), Part("b", noop, requires=("a",))]
+        ).order()
+
+
+def test_critical_path():
+    durations = {"bashrc_d": 1, "direnv": 2, "fish": 30, "starship": 5, "sudoers": 40}
+
+    assert critical_path(PARTS, durations) == (["sudoers"], 40)
+    assert critical_path(PARTS, {**durations, "sudoers": 1}) == (
+        ["fish", "starship"],
+        35,
+    )
+
+
+def test_prepare_runs_concurrently_within_limits():
+    running = {"build": 0, "download": 0}
+    peak = {"build": 0, "download": 0}
+    lock = threading.Lock()
+
+    def slow(kind):
+        def prepare(profile):
+            with lock:
+                running[kind] += 1
+                peak[kind] = max(peak[kind], running[kind])
+            time.sleep(0.05)
+            with lock:
+                running[kind] -= 1
+
+        return prepare
+
+    parts = [
+        Part(f"build{i}", noop, prepare=slow("build"), kind="build") for i in range(3)
+    ]
+    parts += [
+        Part(f"get{i}", noop, prepare=slow("download"), kind="download")
+        for i in range(6)
+    ]
+    started = time.perf_counter()
+    Scheduler(parts, limits={"download": 3}).prepare({})
+
+    assert peak == {"build": 1, "download": 3}
+    # The 3 builds one after the other dominate
+    assert time.perf_counter() - started < 0.3
+
+
+def test_failed_prepare_is_left_to_the_part():
+    def fail(profile):
+        raise ValueError("no network")
+
+    Scheduler([Part("gh", noop, prepare=fail)]).prepare({})
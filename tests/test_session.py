@@ -0,0 +1,46 @@
+import sys
+
+from pysetmeup.session import load_inventories, run_deploys, write_session
+
+
+def test_inventories_are_merged(tmp_path):
+    (tmp_path / "vms.py").write_text(
+        'dev = ["@lima/dev-1", "@lima/dev-2"]\n_private = ["ignored"]\n'
+    )
+    (tmp_path / "containers.py").write_text(
+        'dev = (["@docker/rocky:9", "@lima/dev-1"], {"user": "dev"})\n'
+    )
+
+    groups = load_inventories(
+        f"{tmp_path / 'vms.py'}, {tmp_path / 'containers.py'},@local"
+    )
+
+    assert groups == {
+        "dev": (["@lima/dev-1", "@lima/dev-2", "@docker/rocky:9"], {"user": "dev"}),
+        "hosts": ["@local"],
+    }
+
+
+def test_session_files(tmp_path, monkeypatch):
+    (tmp_path / "parts.py").write_text(
+        "calls = []\n"
+        "def git(): calls.append('git')\n"
+        "def fish(): calls.append('fish')\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "inventory.py").write_text('servers = ["web-1"]\n')
+
+    inventory, deploy = write_session(
+        ["parts.fish", "parts.git"], "inventory.py,@local", tmp_path / "session"
+    )
+
+    namespace = {}
+    exec(inventory.read_text(), namespace)
+    assert namespace["servers"] == ["web-1"]
+    assert namespace["hosts"] == ["@local"]
+
+    exec(deploy.read_text(), {})
+    assert sys.modules["parts"].calls == ["fish", "git"]
+    run_deploys(["parts.git"])
+    assert sys.modules["parts"].calls == ["fish", "git", "git"]